@@ -0,0 +1,100 @@
+"""
+Upload-bytes benchmark for local clipping.
+
+Runs VideoDescriptionPipeline on a local video against FakeBackend once per clip
+mode (none, copy, transcode) and reports the number of uploads and the bytes
+uploaded, relative to uploading the original once. Without --video, a synthetic
+720p test video is generated with ffmpeg, which must be on PATH.
+
+Usage:
+    python -m benchmarks.bench_clips --duration 120 --level1-interval 10 --level2-interval 30
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.backends import FakeBackend, UploadedFile
+from src.media.clips import ffmpeg_available
+from src.pipelines.video_description_pipeline import VideoDescriptionPipeline
+
+
+class UploadCountingBackend(FakeBackend):
+    """FakeBackend that adds up the size of every uploaded file"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.upload_bytes = 0
+        self._bytes_lock = threading.Lock()
+
+    def upload_file(self, path: str) -> UploadedFile:
+        with self._bytes_lock:
+            self.upload_bytes += os.path.getsize(path)
+        return super().upload_file(path)
+
+
+def make_test_video(path: str, duration: float):
+    """Write a 720p, 30 fps test pattern with a tone, encoded like a typical camera upload"""
+    subprocess.run(["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=30:duration={duration}",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-b:v", "4M", "-g", "60",
+                    "-c:a", "aac", "-b:a", "128k", "-shortest", path], check=True)
+
+
+def bench_mode(video: str, clip_mode: Optional[str], level1_interval: int, level2_interval: int) -> Dict:
+    backend = UploadCountingBackend()
+    with tempfile.TemporaryDirectory() as clip_dir:
+        pipeline = VideoDescriptionPipeline(level1_interval=level1_interval, level2_interval=level2_interval,
+                                            backend=backend, level1_mode="parallel", clip_mode=clip_mode,
+                                            clip_dir=clip_dir)
+        pipeline.process_video(video)
+    return {"clip_mode": clip_mode or "none", "uploads": len(backend.uploads), "upload_bytes": backend.upload_bytes,
+            "calls": backend.calls}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload bytes per clip mode")
+    parser.add_argument("--video", help="Local video to benchmark (a synthetic test video if omitted)")
+    parser.add_argument("--duration", type=float, default=120.0, help="Length of the synthetic video in seconds")
+    parser.add_argument("--level1-interval", type=int, default=10)
+    parser.add_argument("--level2-interval", type=int, default=30)
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, force=True)
+    if not ffmpeg_available():
+        sys.exit("ffmpeg not found on PATH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if video is None:
+            video = os.path.join(tmp, "test.mp4")
+            make_test_video(video, args.duration)
+        original = os.path.getsize(video)
+        rows = [bench_mode(video, clip_mode, args.level1_interval, args.level2_interval)
+                for clip_mode in (None, "copy", "transcode")]
+
+    header = f"{'clip mode':<12}{'uploads':>9}{'MB uploaded':>13}{'x original':>12}{'calls':>7}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        row["ratio"] = row["upload_bytes"] / original
+        print(f"{row['clip_mode']:<12}{row['uploads']:>9}{row['upload_bytes'] / 1e6:>13.2f}{row['ratio']:>12.2f}"
+              f"{row['calls']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
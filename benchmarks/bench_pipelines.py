@@ -0,0 +1,224 @@
+"""
+Offline throughput benchmark for VideoDescriptionPipeline and QAPipeline.
+
+Runs both pipelines against FakeBackend (or a recorded session via --replay) across
+video lengths, level-1 intervals, concurrency levels and QA modes (one request per
+level, or one schema-constrained request for all levels), and reports calls/sec,
+wall time per video minute and p50/p95 call latency.
+
+Usage:
+    python -m benchmarks.bench_pipelines --lengths 60,300 --intervals 10,30 --concurrency 1,4
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.backends import CachedContent, FakeBackend, ModelBackend, RateLimiter, ReplayBackend, UploadedFile
+from src.pipelines.qa_pipeline import QAPipeline
+from src.pipelines.video_description_pipeline import VideoDescriptionPipeline
+
+
+class TimingBackend(ModelBackend):
+    """Backend wrapper that records the latency of every call"""
+
+    def __init__(self, inner: ModelBackend):
+        self.inner = inner
+        self.latencies: List[float] = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        started = time.perf_counter()
+        try:
+            return self.inner.generate_content(model=model, contents=contents, config=config)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.latencies.append(elapsed)
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        self.inner.invalidate(model, contents, config)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        return self.inner.upload_file(path)
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self.inner.get_file(name)
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        return self.inner.create_cache(model, contents, ttl_seconds, display_name)
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return self.inner.update_cache(name, ttl_seconds)
+
+    def delete_cache(self, name: str):
+        self.inner.delete_cache(name)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(name: str, params: Dict, timing: TimingBackend, wall: float,
+              video_minutes: float, failed_videos: int, tokens: int = 0) -> Dict:
+    calls = len(timing.latencies)
+    return {
+        "pipeline": name,
+        **params,
+        "calls": calls,
+        "call_failures": timing.failures,
+        "failed_videos": failed_videos,
+        "wall_seconds": wall,
+        "calls_per_sec": calls / wall if wall else 0.0,
+        "wall_per_video_minute": wall / video_minutes if video_minutes else 0.0,
+        "p50_latency": percentile(timing.latencies, 0.50),
+        "p95_latency": percentile(timing.latencies, 0.95),
+        "tokens": tokens,
+        "tokens_per_video_minute": tokens / video_minutes if video_minutes else 0.0,
+    }
+
+
+def bench_description(make_backend, length: float, interval: int, level2_interval: int,
+                      concurrency: int, videos: int, level1_mode: str = "sequential",
+                      max_concurrency: int = 4) -> Dict:
+    timing = TimingBackend(make_backend())
+    pipeline = VideoDescriptionPipeline(
+        level1_interval=interval,
+        level2_interval=level2_interval,
+        backend=timing,
+        level1_mode=level1_mode,
+        max_concurrency=max_concurrency,
+        rate_limiter=RateLimiter(),
+    )
+    sources = [f"https://bench.local/video-{index}.mp4" for index in range(videos)]
+
+    started = time.perf_counter()
+    results = pipeline.process_videos(sources, max_workers=concurrency, durations=[length] * videos)
+    wall = time.perf_counter() - started
+    failed = sum(1 for result in results if "error" in result)
+
+    params = {"length": length, "level1_interval": interval, "concurrency": concurrency, "videos": videos,
+              "level1_mode": level1_mode, "max_concurrency": max_concurrency}
+    return summarize("description", params, timing, wall, videos * length / 60.0, failed,
+                     tokens=pipeline.usage.total_tokens())
+
+
+def bench_qa(make_backend, length: float, interval: int, concurrency: int, videos: int,
+             single_call: bool = False) -> Dict:
+    timing = TimingBackend(make_backend())
+    pipeline = QAPipeline(backend=timing, rate_limiter=RateLimiter())
+    segments = max(1, int(length // interval))
+    video_analysis = {
+        "duration": length,
+        "level1_interval": interval,
+        "level1_descriptions": [{"content": f"Segment {i} description."} for i in range(segments)],
+        "level2_descriptions": [{"content": "Plot summary."}],
+        "level3_description": {"content": "Overview."},
+    }
+
+    def _run(index: int):
+        if single_call:
+            # One schema-constrained request for all three levels
+            return pipeline.process_video_analysis_all_levels(video_analysis)
+        return [pipeline.process_video_analysis(level, video_analysis) for level in (1, 2, 3)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_run, range(videos)))
+    wall = time.perf_counter() - started
+
+    params = {"length": length, "level1_interval": interval, "concurrency": concurrency, "videos": videos,
+              "qa_mode": "single_call" if single_call else "per_level"}
+    return summarize("qa", params, timing, wall, videos * length / 60.0, 0,
+                     tokens=pipeline.usage.total_tokens())
+
+
+def parse_list(value: str, cast=float) -> List:
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline throughput benchmark")
+    parser.add_argument("--lengths", default="60,300", help="Comma-separated video lengths in seconds")
+    parser.add_argument("--intervals", default="10,30", help="Comma-separated level-1 intervals in seconds")
+    parser.add_argument("--level2-interval", type=int, default=30)
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated numbers of concurrent videos")
+    parser.add_argument("--level1-modes", default="sequential",
+                        help="Comma-separated level-1 modes (sequential, parallel, anchor, two_pass)")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Concurrent model calls per video")
+    parser.add_argument("--videos", type=int, default=4, help="Videos processed per configuration")
+    parser.add_argument("--latency", type=float, default=0.02, help="Fake backend mean latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="Fake backend latency jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fake backend error probability")
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="Replay a RecordingBackend JSONL session instead of the fake backend")
+    parser.add_argument("--skip-qa", action="store_true")
+    parser.add_argument("--qa-modes", default="per_level,single_call",
+                        help="Comma-separated QA modes (per_level: one request per level, single_call: one for all levels)")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    qa_modes = parse_list(args.qa_modes, str)
+    unknown = [mode for mode in qa_modes if mode not in ("per_level", "single_call")]
+    if unknown:
+        parser.error(f"Unknown QA modes {unknown}, expected per_level or single_call")
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    logging.getLogger("src").setLevel(logging.WARNING)
+
+    if args.replay:
+        def make_backend():
+            return ReplayBackend(args.replay, replay_latency=True)
+    else:
+        def make_backend():
+            return FakeBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                               output_tokens=args.output_tokens, seed=args.seed)
+
+    rows = []
+    for length in parse_list(args.lengths):
+        for interval in parse_list(args.intervals, int):
+            for concurrency in parse_list(args.concurrency, int):
+                for level1_mode in parse_list(args.level1_modes, str):
+                    rows.append(bench_description(make_backend, length, interval, args.level2_interval,
+                                                  concurrency, args.videos, level1_mode, args.max_concurrency))
+                if not args.skip_qa:
+                    for qa_mode in qa_modes:
+                        rows.append(bench_qa(make_backend, length, interval, concurrency, args.videos,
+                                             single_call=qa_mode == "single_call"))
+
+    header = f"{'pipeline':<12}{'mode':>11}{'length':>8}{'l1':>5}{'conc':>6}{'calls':>7}{'calls/s':>10}{'s/vmin':>9}{'p50':>8}{'p95':>8}{'fail':>6}{'tok/vmin':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        mode = row.get("level1_mode", row.get("qa_mode", "-"))
+        print(f"{row['pipeline']:<12}{mode:>11}{row['length']:>8.0f}{row['level1_interval']:>5}{row['concurrency']:>6}"
+              f"{row['calls']:>7}{row['calls_per_sec']:>10.1f}{row['wall_per_video_minute']:>9.3f}"
+              f"{row['p50_latency']:>8.3f}{row['p95_latency']:>8.3f}{row['failed_videos']:>6}"
+              f"{row['tokens_per_video_minute']:>10.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
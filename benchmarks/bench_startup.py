@@ -0,0 +1,148 @@
+"""
+Cold-start benchmark for the pipeline modules and CLIs.
+
+Imports each entry module in a fresh interpreter under ``python -X importtime``,
+reports its cumulative import time and the slowest imports it pulls in, and times
+the first useful action of short-lived CLI commands (e.g. a worker's queue status).
+Heavy optional modules (google.genai, moviepy, ...) must only be imported on first use,
+so finding one among the imports counts as a regression, as does an import or command
+slower than its threshold. The exit status is 1 on any regression.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5 --max-import-ms 300 --max-command-ms 500
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules a worker, a CLI or a notebook imports first
+ENTRY_MODULES = (
+    "src.backends",
+    "src.pipelines.qa_pipeline",
+    "src.pipelines.video_description_pipeline",
+    "src.pipelines.video_qa_pipeline",
+    "src.pipelines.worker",
+)
+
+# Modules that are slow to import and only needed once a video is fetched, cut or described
+HEAVY_MODULES = ("google.genai", "moviepy", "pytube", "yt_dlp", "requests", "numpy")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """
+    Parse the ``-X importtime`` report
+
+    Returns:
+        One {"module", "self_us", "cumulative_us", "depth"} entry per imported module
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        entries.append({
+            "module": name.strip(),
+            "self_us": int(fields[0]),
+            "cumulative_us": int(fields[1]),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return entries
+
+
+def bench_import(module: str, runs: int, top: int = 5) -> Dict[str, Any]:
+    """Import a module in fresh interpreters and keep the fastest run"""
+    best = None
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                   cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+        entries = parse_importtime(completed.stderr)
+        total = next(e["cumulative_us"] for e in reversed(entries) if e["module"] == module)
+        if best is None or total < best[0]:
+            best = (total, entries)
+
+    total, entries = best
+    imported = {e["module"] for e in entries}
+    return {
+        "module": module,
+        "import_ms": total / 1000,
+        "heavy": sorted(m for m in HEAVY_MODULES if m in imported),
+        "slowest": [{"module": e["module"], "self_ms": e["self_us"] / 1000}
+                    for e in sorted(entries, key=lambda e: e["self_us"], reverse=True)[:top]],
+    }
+
+
+def bench_command(name: str, argv: Sequence[str], runs: int) -> Dict[str, Any]:
+    """Run a CLI command in fresh interpreters and keep the fastest wall time"""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, *argv], cwd=ROOT, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name} failed:\n{completed.stderr[-2000:]}")
+        best = elapsed if best is None else min(best, elapsed)
+    return {"command": name, "wall_ms": best * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--modules", default=",".join(ENTRY_MODULES), help="Comma-separated modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement (fastest is kept)")
+    parser.add_argument("--max-import-ms", type=float, default=300.0, help="Regression threshold per module import")
+    parser.add_argument("--max-command-ms", type=float, default=500.0,
+                        help="Regression threshold per CLI command, interpreter startup included")
+    parser.add_argument("--skip-commands", action="store_true")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    imports = [bench_import(module, args.runs) for module in args.modules.split(",") if module]
+    commands = []
+    if not args.skip_commands:
+        with tempfile.TemporaryDirectory() as tmp:
+            commands.append(bench_command(
+                "worker status", ["-m", "src.pipelines.worker", "--queue", str(Path(tmp) / "jobs.sqlite"), "status"],
+                args.runs))
+            commands.append(bench_command(
+                "search query", ["-m", "src.pipelines.search", "--index", str(Path(tmp) / "search.sqlite"),
+                                 "query", "cat"],
+                args.runs))
+
+    regressions = []
+    header = f"{'module':<44}{'import ms':>10}  slowest imports"
+    print(header)
+    print("-" * len(header))
+    for row in imports:
+        slowest = ", ".join(f"{e['module']} {e['self_ms']:.1f}" for e in row["slowest"][:3])
+        print(f"{row['module']:<44}{row['import_ms']:>10.1f}  {slowest}")
+        if row["import_ms"] > args.max_import_ms:
+            regressions.append(f"importing {row['module']} took {row['import_ms']:.0f} ms (> {args.max_import_ms:.0f})")
+        if row["heavy"]:
+            regressions.append(f"importing {row['module']} loads {', '.join(row['heavy'])}")
+    for row in commands:
+        print(f"{row['command']:<44}{row['wall_ms']:>10.1f}  (wall time)")
+        if row["wall_ms"] > args.max_command_ms:
+            regressions.append(f"{row['command']} took {row['wall_ms']:.0f} ms (> {args.max_command_ms:.0f})")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"imports": imports, "commands": commands, "regressions": regressions}, f, indent=2)
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from datetime import datetime
+from src.pipelines.jsonl import JsonlWriter
 from src.pipelines.video_description_pipeline import VideoDescriptionPipeline
 import logging
 
@@ -17,29 +17,36 @@ def main():
         level2_interval=30,
         model_name=os.environ["MODEL_NAME"],
         google_api_key=os.environ["GOOGLE_API_KEY"],
+        cache_path=os.environ.get("RESPONSE_CACHE_PATH"),
+        upload_registry_path=os.environ.get("UPLOAD_REGISTRY_PATH"),
+        journal_dir=os.environ.get("JOURNAL_DIR"),
     )
     
     # Process YouTube video directly
     youtube_url = "https://www.youtube.com/shorts/-LcVzSYBDD8"
     
     try:
-        results = pipeline.process_video(youtube_url)
+        # Stream every description to JSONL as soon as it is generated
+        with JsonlWriter('youtube_video_analysis.jsonl', mode='w') as writer:
+            results = pipeline.process_video(
+                youtube_url,
+                on_description=lambda description: writer.write_description(description, youtube_url),
+            )
+            # The descriptions are already in the file; only the other result fields are added
+            described = ("level1_descriptions", "level2_descriptions", "level3_description")
+            writer.write({"run": {key: value for key, value in results.items() if key not in described}})
         
         # Print results
         print(f"Processed YouTube video: {youtube_url}")
         print(f"Duration: {results['duration']:.2f} seconds")
         print(f"Generated {len(results['level1_descriptions'])} detailed descriptions")
         print(f"Generated {len(results['level2_descriptions'])} plot summaries")
+        print(f"Used {results['usage']['total']['total_token_count']} tokens in {results['usage']['total']['calls']} calls")
         
         if results['level3_description']:
             print(f"\nFinal Overview:")
             print(results['level3_description']['content'])
         
-        # Save results to JSON
-        results['timestamp'] = datetime.now().isoformat()
-        with open('youtube_video_analysis.json', 'w') as f:
-            import json
-            json.dump(results, f, indent=4)
         logger.info("YouTube video processed successfully.")
             
     except Exception as e:
@@ -0,0 +1,16 @@
+# Model backends used by the pipelines
+from src.backends.base import (
+    BackendError,
+    CachedContent,
+    ModelBackend,
+    ModelResponse,
+    UploadedFile,
+    UsageMetadata,
+    request_key,
+)
+from src.backends.cache import CACHE_MODES, CachingBackend
+from src.backends.fake import FakeBackend
+from src.backends.ratelimit import RateLimitedBackend, RateLimiter, default_rate_limiter
+from src.backends.gemini import GeminiBackend
+from src.backends.replay import RecordingBackend, ReplayBackend, ReplayMissError
+from src.backends.uploads import UploadRegistry
@@ -0,0 +1,345 @@
+import hashlib
+import json
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# Approximate Gemini video tokenisation at default resolution (frames + audio)
+VIDEO_TOKENS_PER_SECOND = 263
+
+# Rough characters per text token, good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class UsageMetadata:
+    """Token usage reported for a single model call (mirrors Gemini's usage_metadata)"""
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    total_token_count: int = 0
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class ModelResponse:
+    """Minimal response object returned by non-Gemini backends"""
+    text: Optional[str]
+    usage_metadata: Optional[UsageMetadata] = None
+
+
+@dataclass
+class UploadedFile:
+    """Backend-independent view of an uploaded media file"""
+    name: str
+    uri: str
+    mime_type: Optional[str] = None
+    state: str = "ACTIVE"
+    expiration_time: Optional[datetime] = None
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+@dataclass
+class CachedContent:
+    """Backend-independent view of an explicit context cache"""
+    name: str
+    model: str
+    expire_time: Optional[datetime] = None
+    token_count: Optional[int] = None
+
+
+class BackendError(Exception):
+    """Error raised by a backend call, carrying the HTTP-like status code when known"""
+
+    def __init__(self, message: str, code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+class ModelBackend(ABC):
+    """
+    Interface for every model call made by the pipelines.
+
+    Pipelines only talk to a backend, never to ``genai.Client`` directly, so the
+    live Gemini API can be swapped for a local stand-in or a recorded session.
+    """
+
+    @abstractmethod
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        """
+        Generate content for the given request
+
+        Args:
+            model: Model name
+            contents: Request contents (string or ``types.Content``)
+            config: Optional ``types.GenerateContentConfig``
+
+        Returns:
+            Response object exposing ``text`` and ``usage_metadata``
+        """
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        """
+        Generate content as a stream of partial responses
+
+        The chunks' texts concatenate to the full response text; usage is reported
+        on the last chunk. Backends without streaming yield the whole response as a
+        single chunk.
+
+        Args:
+            model: Model name
+            contents: Request contents (string or ``types.Content``)
+            config: Optional ``types.GenerateContentConfig``
+
+        Yields:
+            Response objects exposing ``text`` and ``usage_metadata``
+        """
+        yield self.generate_content(model=model, contents=contents, config=config)
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        """
+        Forget any stored response for a request (e.g. one that could not be parsed)
+
+        Backends without stored responses ignore this; wrappers forward it.
+        """
+
+    @abstractmethod
+    def upload_file(self, path: str) -> UploadedFile:
+        """
+        Upload a local media file
+
+        Args:
+            path: Path to the local file
+
+        Returns:
+            UploadedFile describing the remote file
+        """
+
+    def get_file(self, name: str) -> UploadedFile:
+        """
+        Look up the current state of an uploaded file
+
+        Args:
+            name: Remote file name returned by upload_file
+
+        Returns:
+            UploadedFile describing the remote file
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot look up uploaded files")
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        """
+        Create an explicit context cache that later requests reference by name
+
+        Args:
+            model: Model the cache is created for (caches are model-specific)
+            contents: Contents to cache (e.g. the video file part)
+            ttl_seconds: Seconds until the cache expires
+            display_name: Optional human-readable name
+
+        Returns:
+            CachedContent describing the cache
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support context caching")
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        """Extend a context cache to expire ttl_seconds from now"""
+        raise NotImplementedError(f"{type(self).__name__} does not support context caching")
+
+    def delete_cache(self, name: str):
+        """Delete a context cache"""
+        raise NotImplementedError(f"{type(self).__name__} does not support context caching")
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert request objects (pydantic models, lists, dicts) into plain JSON values"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
+
+
+def request_fingerprint(model: str, contents: Any, config: Any = None) -> Dict[str, Any]:
+    """Build a canonical, JSON-serialisable description of a generate_content request"""
+    return {
+        "model": model,
+        "contents": to_jsonable(contents),
+        "config": to_jsonable(config) if config is not None else None,
+    }
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    """Streamed SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def request_key(model: str, contents: Any, config: Any = None) -> str:
+    """Stable SHA-256 key for a generate_content request"""
+    payload = json.dumps(request_fingerprint(model, contents, config), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RequestKeys:
+    """
+    Content-addressed keys of generate_content requests.
+
+    Uploaded file URIs and context cache names differ on every run. Once registered,
+    a file URI is keyed by the file's content hash and a cache name by a hash of the
+    cached contents, so the same request gets the same key in every run. Requests
+    without registered files or caches get the same key as ``request_key``.
+    """
+
+    def __init__(self):
+        # Uploaded file URI -> "sha256:<content hash>"
+        self._file_aliases: Dict[str, str] = {}
+        # Context cache name -> "sha256:<hash of the cached contents>"
+        self._cache_aliases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add_file(self, uri: str, sha256: str):
+        """Key requests referencing an uploaded file by its content hash"""
+        with self._lock:
+            self._file_aliases[uri] = f"sha256:{sha256}"
+
+    def add_cache(self, name: str, contents: Any) -> str:
+        """
+        Key requests referencing a context cache by what it holds
+
+        Returns:
+            The content hash standing for the cache in keys
+        """
+        payload = json.dumps(self._replace_file_uris(to_jsonable(contents)), sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        with self._lock:
+            self._cache_aliases[name] = f"sha256:{digest}"
+        return digest
+
+    def key(self, model: str, contents: Any, config: Any = None) -> str:
+        """Content-addressed key of a request"""
+        fingerprint = request_fingerprint(model, contents, config)
+        fingerprint["contents"] = self._replace_file_uris(fingerprint["contents"])
+        config_data = fingerprint["config"]
+        if isinstance(config_data, dict) and config_data.get("cached_content") in self._cache_aliases:
+            config_data["cached_content"] = self._cache_aliases[config_data["cached_content"]]
+        payload = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _replace_file_uris(self, node: Any) -> Any:
+        if isinstance(node, list):
+            return [self._replace_file_uris(item) for item in node]
+        if isinstance(node, dict):
+            node = {key: self._replace_file_uris(value) for key, value in node.items()}
+            file_uri = node.get("file_uri")
+            if isinstance(file_uri, str) and file_uri in self._file_aliases:
+                node["file_uri"] = self._file_aliases[file_uri]
+            return node
+        return node
+
+
+def iter_request_text(contents: Any) -> List[str]:
+    """Collect all text parts of a request"""
+    data = to_jsonable(contents)
+    texts: List[str] = []
+
+    def _walk(node: Any):
+        if isinstance(node, str):
+            texts.append(node)
+        elif isinstance(node, list):
+            for item in node:
+                _walk(item)
+        elif isinstance(node, dict):
+            if isinstance(node.get("text"), str):
+                texts.append(node["text"])
+            for part in node.get("parts", []) or []:
+                _walk(part)
+
+    _walk(data)
+    return texts
+
+
+def iter_video_spans(contents: Any) -> List[Dict[str, Any]]:
+    """Collect ``file_uri`` and offsets of every file part in a request"""
+    data = to_jsonable(contents)
+    spans: List[Dict[str, Any]] = []
+
+    def _walk(node: Any):
+        if isinstance(node, list):
+            for item in node:
+                _walk(item)
+        elif isinstance(node, dict):
+            if "file_data" in node:
+                metadata = node.get("video_metadata") or {}
+                spans.append({
+                    "file_uri": node["file_data"].get("file_uri"),
+                    "start_offset": metadata.get("start_offset"),
+                    "end_offset": metadata.get("end_offset"),
+                })
+            for part in node.get("parts", []) or []:
+                _walk(part)
+
+    _walk(data)
+    return spans
+
+
+def response_usage(response: Any) -> Dict[str, int]:
+    """Extract token counts from any backend response as a plain dict"""
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "prompt_token_count": int(getattr(usage, "prompt_token_count", 0) or 0),
+        "candidates_token_count": int(getattr(usage, "candidates_token_count", 0) or 0),
+        "total_token_count": int(getattr(usage, "total_token_count", 0) or 0),
+        "cached_content_token_count": int(getattr(usage, "cached_content_token_count", 0) or 0),
+    }
+
+
+def _parse_offset(offset: Optional[str]) -> Optional[float]:
+    if not offset:
+        return None
+    return float(str(offset).rstrip("s"))
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Fast local token estimate for a piece of text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_prompt_tokens(contents: Any, config: Any = None,
+                           video_tokens_per_second: int = VIDEO_TOKENS_PER_SECOND,
+                           default_video_duration: float = 60.0) -> int:
+    """
+    Estimate the prompt tokens of a request without calling the model
+
+    Args:
+        contents: Request contents
+        config: Optional generation config (its system instruction is counted)
+        video_tokens_per_second: Tokens charged per second of referenced video
+        default_video_duration: Seconds assumed for a video part without offsets
+
+    Returns:
+        Estimated prompt token count
+    """
+    chars = sum(len(text) for text in iter_request_text(contents))
+    system_instruction = getattr(config, "system_instruction", None)
+    if isinstance(system_instruction, str):
+        chars += len(system_instruction)
+    video_seconds = 0.0
+    for span in iter_video_spans(contents):
+        start = _parse_offset(span["start_offset"])
+        end = _parse_offset(span["end_offset"])
+        if start is None or end is None:
+            video_seconds += default_video_duration
+        else:
+            video_seconds += max(end - start, 0.0)
+    return chars // CHARS_PER_TOKEN + int(video_seconds * video_tokens_per_second)
@@ -0,0 +1,241 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from src.backends.base import (
+    CachedContent,
+    ModelBackend,
+    ModelResponse,
+    RequestKeys,
+    UploadedFile,
+    UsageMetadata,
+    file_sha256,
+    response_usage,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cache modes:
+# - readwrite: serve hits and store new responses
+# - readonly: serve hits, never store (e.g. a shared cache built by another run)
+# - bypass: always call the inner backend and leave the cache untouched
+CACHE_MODES = ("readwrite", "readonly", "bypass")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CachingBackend(ModelBackend):
+    """
+    Backend wrapper that stores every generate_content response in a SQLite file.
+
+    Responses are addressed by a SHA-256 of the model name, the request contents
+    (text, file URIs and ``VideoMetadata`` offsets) and the generation config,
+    including the system instruction. Files uploaded through this backend are
+    keyed by their content hash instead of their URI, so a re-upload of the same
+    video still hits the cache. Entries are evicted least-recently-used first
+    once ``max_entries`` or ``max_bytes`` is exceeded, and expire after ``max_age``.
+    """
+
+    def __init__(self,
+                 inner: ModelBackend,
+                 path: Union[str, Path],
+                 mode: str = "readwrite",
+                 max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        """
+        Initialize the cache
+
+        Args:
+            inner: Backend that serves cache misses
+            path: SQLite file holding the cache
+            mode: One of CACHE_MODES
+            max_entries: Maximum number of cached responses
+            max_bytes: Maximum total size of cached response text in bytes
+            max_age: Seconds after which a cached response is considered stale
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+
+        self.inner = inner
+        self.path = Path(path)
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._keys = RequestKeys()
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        if mode == "readwrite":
+            self._evict()
+
+    def cache_key(self, model: str, contents: Any, config: Any = None) -> str:
+        """Content-addressed key of a generate_content request"""
+        return self._keys.key(model, contents, config)
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        if self.mode == "bypass":
+            return self.inner.generate_content(model=model, contents=contents, config=config)
+
+        key = self.cache_key(model, contents, config)
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+
+        response = self.inner.generate_content(model=model, contents=contents, config=config)
+        if self.mode == "readwrite" and response.text is not None:
+            self._put(key, model, response)
+        return response
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        if self.mode == "bypass":
+            yield from self.inner.generate_content_stream(model=model, contents=contents, config=config)
+            return
+
+        # Streamed and non-streamed requests share entries: a hit is replayed as one chunk
+        key = self.cache_key(model, contents, config)
+        cached = self._get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        texts = []
+        usage = None
+        for chunk in self.inner.generate_content_stream(model=model, contents=contents, config=config):
+            texts.append(chunk.text or "")
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        # Only a stream read to the end is stored
+        if self.mode == "readwrite":
+            self._put(key, model, ModelResponse(text="".join(texts), usage_metadata=usage))
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        if self.mode == "readwrite":
+            key = self.cache_key(model, contents, config)
+            with self._lock:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.inner.invalidate(model, contents, config)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        uploaded = self.inner.upload_file(path)
+        if self.mode != "bypass":
+            self._keys.add_file(uploaded.uri, uploaded.sha256 or file_sha256(path))
+        return uploaded
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self.inner.get_file(name)
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        cache = self.inner.create_cache(model, contents, ttl_seconds, display_name)
+        # Key requests by what the cache holds, not by its per-run name
+        self._keys.add_cache(cache.name, contents)
+        return cache
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return self.inner.update_cache(name, ttl_seconds)
+
+    def delete_cache(self, name: str):
+        self.inner.delete_cache(name)
+
+    def _get(self, key: str) -> Optional[ModelResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, usage, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.max_age is not None and now - row[2] > self.max_age:
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.mode == "readwrite":
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        text, usage, _ = row
+        logger.debug(f"Cache hit for request {key[:12]}")
+        return ModelResponse(text=text, usage_metadata=UsageMetadata(**json.loads(usage)))
+
+    def _put(self, key: str, model: str, response: Any):
+        now = time.time()
+        text = response.text
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, text, usage, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, text, json.dumps(response_usage(response)), len(text.encode("utf-8")), now, now),
+            )
+            self.stores += 1
+        self._evict()
+
+    def _evict(self):
+        """Drop stale entries, then least-recently-used ones until the size limits hold"""
+        with self._lock:
+            if self.max_age is not None:
+                cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+                self.evictions += cursor.rowcount
+
+            if self.max_entries is None and self.max_bytes is None:
+                return
+
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes):
+                return
+
+            doomed = []
+            for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+                if (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes):
+                    break
+                doomed.append((key,))
+                count -= 1
+                total -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        self._conn.close()
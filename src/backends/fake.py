@@ -0,0 +1,231 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from src.backends.base import (
+    BackendError,
+    CachedContent,
+    ModelBackend,
+    ModelResponse,
+    UploadedFile,
+    UsageMetadata,
+    VIDEO_TOKENS_PER_SECOND,
+    estimate_prompt_tokens,
+    iter_request_text,
+)
+
+FAKE_QA_DIMENSIONS = ["Temporal", "Spatial", "Causal", "Count", "Plot", "Binary"]
+
+
+def _schema_properties(config: Any) -> Dict[str, Any]:
+    """Properties of the array items of a request's response_schema (a types.Schema or a dict)"""
+    schema = getattr(config, "response_schema", None)
+    items = schema.get("items") if isinstance(schema, dict) else getattr(schema, "items", None)
+    properties = items.get("properties") if isinstance(items, dict) else getattr(items, "properties", None)
+    return properties or {}
+
+
+def default_responder(model: str, contents: Any, config: Any, call_index: int) -> str:
+    """
+    Produce plausible text for a request: a JSON QA array or a short description
+
+    A request whose schema has a "Level" property (the single-call multi-level mode)
+    gets pairs for every "Level <n> description" in its prompt, with "Level" set.
+    """
+    prompt = "\n".join(iter_request_text(contents))
+    wants_json = getattr(config, "response_mime_type", None) == "application/json" or "JSON array" in prompt
+    if wants_json:
+        if "Level" in _schema_properties(config):
+            levels = sorted({int(level) for level in re.findall(r"Level (\d+) description", prompt)}) or [1]
+        else:
+            levels = [None]
+        pairs = [
+            {
+                **({"Level": level} if level is not None else {}),
+                "Dimension": dimension,
+                "Question": f"Synthetic {dimension.lower()} question #{call_index}"
+                            f"{f' for level {level}' if level is not None else ''}?",
+                "Answer": f"Synthetic {dimension.lower()} answer #{call_index}.",
+            }
+            for level in levels
+            for dimension in FAKE_QA_DIMENSIONS
+        ]
+        return json.dumps(pairs)
+    return f"Synthetic response #{call_index} from {model}."
+
+
+class FakeBackend(ModelBackend):
+    """
+    Local stand-in for Gemini with configurable latency, jitter, error rate and token counts.
+
+    Prompt tokens are estimated from the request text (4 characters per token) plus
+    ``video_tokens_per_second`` for every second of referenced video, so token-based
+    behaviour (budgets, rate limits) can be exercised offline. Explicit context caches
+    are simulated with expiry, so their lifecycle can be tested without the API.
+    """
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 error_code: int = 503,
+                 output_tokens: int = 200,
+                 video_tokens_per_second: int = VIDEO_TOKENS_PER_SECOND,
+                 default_video_duration: float = 60.0,
+                 responder: Optional[Callable[[str, Any, Any, int], str]] = None,
+                 seed: Optional[int] = None,
+                 min_cache_tokens: int = 0,
+                 supports_caching: bool = True,
+                 stream_chunk_chars: int = 64):
+        """
+        Initialize the fake backend
+
+        Args:
+            latency: Mean seconds spent per call
+            jitter: Maximum seconds added or removed from the latency (uniform)
+            error_rate: Probability in [0, 1] that a call raises BackendError
+            error_code: Status code attached to injected errors (e.g. 429 or 503)
+            output_tokens: Candidate tokens reported per call
+            video_tokens_per_second: Prompt tokens charged per second of video
+            default_video_duration: Seconds charged for a video part without offsets
+            responder: Callable ``(model, contents, config, call_index) -> text``
+            seed: Seed for the latency/error random generator
+            min_cache_tokens: Smallest cache the fake accepts (Gemini requires a model-specific minimum)
+            supports_caching: Whether create_cache is available, to exercise fallbacks
+            stream_chunk_chars: Characters per chunk of generate_content_stream
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.output_tokens = output_tokens
+        self.video_tokens_per_second = video_tokens_per_second
+        self.default_video_duration = default_video_duration
+        self.responder = responder or default_responder
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self.calls = 0
+        self.errors = 0
+        self.uploads: Dict[str, UploadedFile] = {}
+        self.min_cache_tokens = min_cache_tokens
+        self.supports_caching = supports_caching
+        self.caches: Dict[str, CachedContent] = {}
+        self.deleted_caches = 0
+        self.stream_chunk_chars = stream_chunk_chars
+
+    def _sample(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            fail = self._random.random() < self.error_rate
+            call_index = next(self._counter)
+            self.calls += 1
+            if fail:
+                self.errors += 1
+        return max(delay, 0.0), fail, call_index
+
+    def estimate_prompt_tokens(self, contents: Any, config: Any = None) -> int:
+        """Estimate prompt tokens for a request the same way the fake charges them"""
+        return estimate_prompt_tokens(contents, config,
+                                      video_tokens_per_second=self.video_tokens_per_second,
+                                      default_video_duration=self.default_video_duration)
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> ModelResponse:
+        delay, fail, call_index = self._sample()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise BackendError(f"Injected fake error on call {call_index}", code=self.error_code)
+
+        cached_tokens = 0
+        cache_name = getattr(config, "cached_content", None)
+        if cache_name:
+            cache = self._live_cache(cache_name)
+            if cache.model != model:
+                raise BackendError(f"Cache {cache_name} was created for {cache.model}, not {model}", code=400)
+            cached_tokens = cache.token_count or 0
+
+        text = self.responder(model, contents, config, call_index)
+        max_tokens = getattr(config, "max_output_tokens", None)
+        candidates = min(self.output_tokens, max_tokens) if max_tokens else self.output_tokens
+        prompt_tokens = self.estimate_prompt_tokens(contents, config) + cached_tokens
+        return ModelResponse(
+            text=text,
+            usage_metadata=UsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=candidates,
+                total_token_count=prompt_tokens + candidates,
+                cached_content_token_count=cached_tokens,
+            ),
+        )
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[ModelResponse]:
+        response = self.generate_content(model=model, contents=contents, config=config)
+        text = response.text or ""
+        starts = range(0, max(len(text), 1), self.stream_chunk_chars)
+        for start in starts:
+            last = start == starts[-1]
+            yield ModelResponse(text=text[start:start + self.stream_chunk_chars],
+                                usage_metadata=response.usage_metadata if last else None)
+
+    def _live_cache(self, name: str) -> CachedContent:
+        with self._lock:
+            cache = self.caches.get(name)
+        if cache is None or cache.expire_time <= datetime.now(timezone.utc):
+            raise BackendError(f"Cached content {name} not found or expired", code=404)
+        return cache
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        if not self.supports_caching:
+            raise BackendError(f"Model {model} does not support explicit caching", code=400)
+        token_count = self.estimate_prompt_tokens(contents)
+        if token_count < self.min_cache_tokens:
+            raise BackendError(f"Cached content of {token_count} tokens is below the minimum of {self.min_cache_tokens}", code=400)
+        with self._lock:
+            name = f"cachedContents/fake-{len(self.caches) + self.deleted_caches}"
+            cache = CachedContent(
+                name=name,
+                model=model,
+                expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds),
+                token_count=token_count,
+            )
+            self.caches[name] = cache
+        return cache
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        cache = self._live_cache(name)
+        with self._lock:
+            cache.expire_time = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+        return cache
+
+    def delete_cache(self, name: str):
+        with self._lock:
+            if self.caches.pop(name, None) is None:
+                raise BackendError(f"Cached content {name} not found", code=404)
+            self.deleted_caches += 1
+
+    def upload_file(self, path: str) -> UploadedFile:
+        with self._lock:
+            name = f"files/fake-{len(self.uploads)}"
+            uploaded = UploadedFile(
+                name=name,
+                uri=f"https://fake.local/{name}",
+                mime_type="video/mp4",
+                state="ACTIVE",
+                expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+            )
+            self.uploads[name] = uploaded
+        return uploaded
+
+    def get_file(self, name: str) -> UploadedFile:
+        with self._lock:
+            if name not in self.uploads:
+                raise BackendError(f"File {name} not found", code=404)
+            return self.uploads[name]
+
@@ -0,0 +1,112 @@
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+from src.backends.base import CachedContent, ModelBackend, UploadedFile
+
+if TYPE_CHECKING:
+    from google import genai
+
+logger = logging.getLogger(__name__)
+
+# One client per API key for the whole process, built on first use
+_clients: Dict[str, "genai.Client"] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(api_key: str) -> "genai.Client":
+    """
+    Process-wide ``genai.Client`` for an API key
+
+    ``google.genai`` takes most of a second to import, so it is only imported here,
+    the first time a request actually needs a client. Every backend (and pipeline)
+    using the same key then shares that client and its connection pool.
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            from google import genai
+
+            client = _clients[api_key] = genai.Client(api_key=api_key)
+        return client
+
+
+class GeminiBackend(ModelBackend):
+    """Backend that forwards every call to the live Gemini API"""
+
+    def __init__(self, api_key: Optional[str] = None, client: Optional["genai.Client"] = None):
+        """
+        Initialize the backend
+
+        Args:
+            api_key: Google API key of the shared client, created on the first call
+            client: Existing ``genai.Client`` to reuse instead of the shared one
+        """
+        if client is None and not api_key:
+            raise ValueError("Google API key must be provided either as parameter or GOOGLE_API_KEY environment variable")
+        self._api_key = api_key
+        self._client = client
+
+    @property
+    def client(self) -> "genai.Client":
+        if self._client is None:
+            self._client = shared_client(self._api_key)
+        return self._client
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        return self.client.models.generate_content(model=model, contents=contents, config=config)
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        return self.client.models.generate_content_stream(model=model, contents=contents, config=config)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        uploaded = self.client.files.upload(file=path)
+        return self._to_uploaded_file(uploaded)
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self._to_uploaded_file(self.client.files.get(name=name))
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        from google.genai import types
+
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=contents,
+                ttl=f"{int(ttl_seconds)}s",
+                display_name=display_name,
+            ),
+        )
+        return self._to_cached_content(cache, model)
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        from google.genai import types
+
+        cache = self.client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s"))
+        return self._to_cached_content(cache, getattr(cache, "model", ""))
+
+    def delete_cache(self, name: str):
+        self.client.caches.delete(name=name)
+
+    @staticmethod
+    def _to_cached_content(cache: Any, model: str) -> CachedContent:
+        usage = getattr(cache, "usage_metadata", None)
+        return CachedContent(
+            name=cache.name,
+            model=getattr(cache, "model", None) or model,
+            expire_time=getattr(cache, "expire_time", None),
+            token_count=getattr(usage, "total_token_count", None),
+        )
+
+    @staticmethod
+    def _to_uploaded_file(file: Any) -> UploadedFile:
+        state = getattr(file, "state", None)
+        return UploadedFile(
+            name=file.name,
+            uri=file.uri,
+            mime_type=getattr(file, "mime_type", None),
+            state=getattr(state, "value", state) or "STATE_UNSPECIFIED",
+            expiration_time=getattr(file, "expiration_time", None),
+            size_bytes=getattr(file, "size_bytes", None),
+        )
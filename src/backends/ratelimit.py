@@ -0,0 +1,314 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+from src.backends.base import CachedContent, ModelBackend, UploadedFile, estimate_prompt_tokens, response_usage
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: throttling, timeouts and server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate_per_minute`` up to a one-minute burst"""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available (requests larger than the burst wait for a full bucket)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        # May go negative when a response used more tokens than reserved
+        self.tokens -= amount
+
+
+def error_code(error: BaseException) -> Optional[int]:
+    """HTTP-like status code of a backend or Gemini SDK error, if any"""
+    for attribute in ("code", "status_code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Server-suggested delay in seconds (BackendError.retry_after or a Gemini RetryInfo retryDelay)"""
+    delay = getattr(error, "retry_after", None)
+    if delay is not None:
+        return float(delay)
+    details = getattr(error, "details", None)
+    match = re.search(r"retryDelay'?\"?\s*:\s*'?\"?(\d+(?:\.\d+)?)s", str(details) if details else str(error))
+    return float(match.group(1)) if match else None
+
+
+class RateLimiter:
+    """
+    Process-wide limiter shared by every model call.
+
+    Requests first wait for the requests-per-minute and tokens-per-minute buckets,
+    then for a concurrency slot. The concurrency limit adapts AIMD-style: it grows
+    by one every ``limit`` successful calls and halves on a 429, at most once per
+    backoff period. A 429 with a retry-after hint pauses every caller until then.
+    """
+
+    def __init__(self,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 initial_concurrency: int = 16,
+                 max_concurrency: int = 64,
+                 max_retries: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 60.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize the limiter
+
+        Args:
+            requests_per_minute: Request quota (unlimited if None)
+            tokens_per_minute: Prompt + output token quota (unlimited if None)
+            initial_concurrency: Starting number of concurrent calls
+            max_concurrency: Upper bound of the adaptive concurrency limit
+            max_retries: Retries of a retryable error before it is raised
+            base_delay: First backoff delay in seconds
+            max_delay: Upper bound of a single backoff delay
+            seed: Seed for the backoff jitter
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limit = float(max(1, min(initial_concurrency, max_concurrency)))
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._random = random.Random(seed)
+        self._condition = threading.Condition()
+
+    def acquire(self, estimated_tokens: int = 0):
+        """Block until the quotas and the concurrency limit allow one more call"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if self.requests is not None:
+                    wait = max(wait, self.requests.wait_time(1, now))
+                if self.tokens is not None:
+                    wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+                if wait <= 0 and self.in_flight < int(self.limit):
+                    break
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(min(estimated_tokens, self.tokens.capacity))
+            self.in_flight += 1
+            self.calls += 1
+
+    def release(self, success: bool, throttled: bool = False, reserved_tokens: int = 0,
+                used_tokens: Optional[int] = None, pause: Optional[float] = None):
+        """
+        Return a concurrency slot and adapt the limit
+
+        Args:
+            success: Whether the call succeeded
+            throttled: Whether the call was rejected with a 429
+            reserved_tokens: Tokens taken from the bucket by acquire
+            used_tokens: Tokens actually reported by the response
+            pause: Seconds every caller should wait before the next call
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if self.tokens is not None and used_tokens is not None:
+                self.tokens.take(used_tokens - min(reserved_tokens, self.tokens.capacity))
+            if success:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            elif throttled:
+                self.throttled += 1
+                if now - self._last_decrease >= self.base_delay:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+                    logger.info(f"Throttled, concurrency limit lowered to {int(self.limit)}")
+            if pause:
+                self._paused_until = max(self._paused_until, now + pause)
+            self._condition.notify_all()
+
+    def backoff(self, attempt: int, hint: Optional[float] = None) -> float:
+        """Full-jitter exponential backoff delay, never shorter than a retry-after hint"""
+        with self._condition:
+            delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, hint or 0.0)
+
+    def call(self, fn, estimated_tokens: int = 0) -> Any:
+        """
+        Run a model call under the limiter, retrying retryable errors
+
+        Args:
+            fn: Zero-argument callable performing the call
+            estimated_tokens: Tokens reserved against the tokens-per-minute quota
+
+        Returns:
+            The call's response
+        """
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                code = error_code(e)
+                hint = retry_after(e)
+                throttled = code == 429
+                self.release(success=False, throttled=throttled, pause=hint if throttled else None)
+                if code not in RETRYABLE_CODES or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, hint)
+                attempt += 1
+                with self._condition:
+                    self.retries += 1
+                logger.warning(f"Model call failed with {code} ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            used = response_usage(response)["total_token_count"] or None
+            self.release(success=True, reserved_tokens=estimated_tokens, used_tokens=used)
+            return response
+
+    def stream(self, fn, estimated_tokens: int = 0) -> Iterator[Any]:
+        """
+        Run a streaming model call under the limiter
+
+        The concurrency slot is held until the stream is exhausted or closed. Retryable
+        errors are retried only before the first chunk; once output has been yielded
+        an error is raised, since the caller has already consumed part of the response.
+
+        Args:
+            fn: Zero-argument callable returning an iterator of response chunks
+            estimated_tokens: Tokens reserved against the tokens-per-minute quota
+
+        Yields:
+            The call's response chunks
+        """
+        attempt = 0
+        while True:
+            self.acquire(estimated_tokens)
+            started = False
+            used = None
+            try:
+                for chunk in fn():
+                    started = True
+                    used = response_usage(chunk)["total_token_count"] or used
+                    yield chunk
+            except GeneratorExit:
+                # The consumer stopped reading; the call itself succeeded
+                self.release(success=True, reserved_tokens=estimated_tokens, used_tokens=used)
+                raise
+            except Exception as e:
+                code = error_code(e)
+                hint = retry_after(e)
+                throttled = code == 429
+                self.release(success=False, throttled=throttled, pause=hint if throttled else None)
+                if started or code not in RETRYABLE_CODES or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, hint)
+                attempt += 1
+                with self._condition:
+                    self.retries += 1
+                logger.warning(f"Streaming call failed with {code} ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            self.release(success=True, reserved_tokens=estimated_tokens, used_tokens=used)
+            return
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_lock = threading.Lock()
+
+
+def default_rate_limiter() -> RateLimiter:
+    """
+    Process-wide limiter shared by every pipeline that is not given its own
+
+    Quotas are read once from RATE_LIMIT_RPM and RATE_LIMIT_TPM (unlimited when unset).
+    """
+    global _default_limiter
+    with _default_lock:
+        if _default_limiter is None:
+            rpm = os.environ.get("RATE_LIMIT_RPM")
+            tpm = os.environ.get("RATE_LIMIT_TPM")
+            _default_limiter = RateLimiter(
+                requests_per_minute=float(rpm) if rpm else None,
+                tokens_per_minute=float(tpm) if tpm else None,
+            )
+        return _default_limiter
+
+
+class RateLimitedBackend(ModelBackend):
+    """Backend wrapper that sends every generate_content call through a RateLimiter"""
+
+    def __init__(self, inner: ModelBackend, limiter: Optional[RateLimiter] = None):
+        """
+        Initialize the wrapper
+
+        Args:
+            inner: Backend that performs the calls
+            limiter: Limiter to use (the process-wide default if None)
+        """
+        self.inner = inner
+        self.limiter = limiter or default_rate_limiter()
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        estimated = estimate_prompt_tokens(contents, config) + (getattr(config, "max_output_tokens", None) or 0)
+        return self.limiter.call(
+            lambda: self.inner.generate_content(model=model, contents=contents, config=config),
+            estimated_tokens=estimated,
+        )
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        estimated = estimate_prompt_tokens(contents, config) + (getattr(config, "max_output_tokens", None) or 0)
+        return self.limiter.stream(
+            lambda: self.inner.generate_content_stream(model=model, contents=contents, config=config),
+            estimated_tokens=estimated,
+        )
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        self.inner.invalidate(model, contents, config)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        return self.inner.upload_file(path)
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self.inner.get_file(name)
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        return self.inner.create_cache(model, contents, ttl_seconds, display_name)
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return self.inner.update_cache(name, ttl_seconds)
+
+    def delete_cache(self, name: str):
+        self.inner.delete_cache(name)
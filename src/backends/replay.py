@@ -0,0 +1,191 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+
+from src.backends.base import (
+    BackendError,
+    CachedContent,
+    ModelBackend,
+    ModelResponse,
+    RequestKeys,
+    UploadedFile,
+    UsageMetadata,
+    file_sha256,
+    response_usage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayMissError(KeyError):
+    """Raised when a replayed session has no recording for a request"""
+
+
+class RecordingBackend(ModelBackend):
+    """
+    Backend that forwards calls to another backend and appends every response to a JSONL file.
+
+    Each record stores the request key, the response text, token usage and the
+    observed latency so that ``ReplayBackend`` can play the session back offline.
+    Requests are keyed like ``CachingBackend`` keys them: uploaded files by content
+    hash and context caches by what they hold, so a session recorded against real
+    uploads and caches matches when replayed. Every created context cache is also
+    recorded, so the replay creates (or falls back from) the same caches.
+    Streamed calls are recorded once the stream has been read to the end.
+    """
+
+    def __init__(self, inner: ModelBackend, path: Union[str, Path]):
+        """
+        Initialize the recorder
+
+        Args:
+            inner: Backend that serves the real calls
+            path: JSONL file the session is appended to
+        """
+        self.inner = inner
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._keys = RequestKeys()
+        self._lock = threading.Lock()
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        key = self._keys.key(model, contents, config)
+        started = time.perf_counter()
+        response = self.inner.generate_content(model=model, contents=contents, config=config)
+        self._write({
+            "key": key,
+            "model": model,
+            "text": response.text,
+            "usage": response_usage(response),
+            "latency": time.perf_counter() - started,
+        })
+        return response
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        key = self._keys.key(model, contents, config)
+        started = time.perf_counter()
+        texts = []
+        usage = None
+        for chunk in self.inner.generate_content_stream(model=model, contents=contents, config=config):
+            texts.append(chunk.text or "")
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+        self._write({
+            "key": key,
+            "model": model,
+            "text": "".join(texts),
+            "usage": response_usage(ModelResponse(text=None, usage_metadata=usage)),
+            "latency": time.perf_counter() - started,
+        })
+
+    def _write(self, record: Dict[str, Any]):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        self.inner.invalidate(model, contents, config)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        uploaded = self.inner.upload_file(path)
+        self._keys.add_file(uploaded.uri, uploaded.sha256 or file_sha256(path))
+        return uploaded
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self.inner.get_file(name)
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        cache = self.inner.create_cache(model, contents, ttl_seconds, display_name)
+        self._write({"cache": self._keys.add_cache(cache.name, contents), "model": model})
+        return cache
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return self.inner.update_cache(name, ttl_seconds)
+
+    def delete_cache(self, name: str):
+        self.inner.delete_cache(name)
+
+
+class ReplayBackend(ModelBackend):
+    """
+    Backend that plays back a session captured by ``RecordingBackend``.
+
+    Requests are matched by key. When the same request was recorded several times
+    the responses are returned in recorded order and then cycle. Uploads get
+    replay URIs keyed by the file's content hash, and only the context caches
+    created while recording can be created again; others fail like an unsupported
+    cache would, so the pipeline falls back to sending the video as it did then.
+    """
+
+    def __init__(self, path: Union[str, Path], replay_latency: bool = False):
+        """
+        Initialize the replayer
+
+        Args:
+            path: JSONL file written by RecordingBackend
+            replay_latency: Sleep for the recorded latency before returning
+        """
+        self.path = Path(path)
+        self.replay_latency = replay_latency
+        self._records: Dict[str, List[Dict]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        # Content hashes of the context caches created while recording
+        self._recorded_caches: Set[str] = set()
+        self._keys = RequestKeys()
+        self._cache_ids = itertools.count()
+        self._lock = threading.Lock()
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if "cache" in record:
+                        self._recorded_caches.add(record["cache"])
+                    else:
+                        self._records[record["key"]].append(record)
+        logger.info(f"Loaded {sum(len(v) for v in self._records.values())} recorded responses from {self.path}")
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> ModelResponse:
+        key = self._keys.key(model, contents, config)
+        with self._lock:
+            records = self._records.get(key)
+            if not records:
+                raise ReplayMissError(f"No recorded response for request {key[:12]} (model {model})")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            record = records[position % len(records)]
+
+        if self.replay_latency:
+            time.sleep(record.get("latency", 0.0))
+        return ModelResponse(text=record["text"], usage_metadata=UsageMetadata(**record["usage"]))
+
+    def upload_file(self, path: str) -> UploadedFile:
+        # Requests are keyed by the file's content hash, like they were when recording
+        sha256 = file_sha256(path)
+        name = f"files/replay-{sha256[:16]}"
+        uploaded = UploadedFile(name=name, uri=f"https://replay.local/{name}", sha256=sha256)
+        self._keys.add_file(uploaded.uri, sha256)
+        return uploaded
+
+    def get_file(self, name: str) -> UploadedFile:
+        return UploadedFile(name=name, uri=f"https://replay.local/{name}")
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        name = f"cachedContents/replay-{next(self._cache_ids)}"
+        if self._keys.add_cache(name, contents) not in self._recorded_caches:
+            raise BackendError(f"No context cache of these contents was recorded in {self.path}", code=400)
+        return CachedContent(name=name, model=model,
+                             expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds))
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return CachedContent(name=name, model="", expire_time=datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds))
+
+    def delete_cache(self, name: str):
+        pass
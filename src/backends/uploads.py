@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from src.backends.base import BackendError, CachedContent, ModelBackend, UploadedFile, file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class UploadRegistry(ModelBackend):
+    """
+    Backend wrapper that uploads each distinct file once and reuses its URI until it expires.
+
+    Files are identified by a streamed SHA-256 of their content. A (path, size,
+    mtime) index skips re-hashing files that have not changed since they were
+    last seen. Uploads of different files run concurrently; concurrent uploads
+    of the same file wait for a single upload. Every returned file has reached
+    the ACTIVE state, polled with exponential backoff.
+    """
+
+    def __init__(self,
+                 inner: ModelBackend,
+                 path: Optional[Union[str, Path]] = None,
+                 min_remaining: float = 3600.0,
+                 poll_interval: float = 1.0,
+                 max_poll_interval: float = 10.0,
+                 activation_timeout: float = 600.0):
+        """
+        Initialize the registry
+
+        Args:
+            inner: Backend that performs the real uploads
+            path: JSON file persisting the registry across runs (in-memory only if None)
+            min_remaining: Minimum seconds a file must have left before expiry to be reused
+            poll_interval: Initial seconds between file state checks
+            max_poll_interval: Upper bound of the backoff between state checks
+            activation_timeout: Seconds to wait for a file to become ACTIVE
+        """
+        self.inner = inner
+        self.path = Path(path) if path else None
+        self.min_remaining = min_remaining
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.activation_timeout = activation_timeout
+        self.uploads = 0
+        self.reuses = 0
+        # Content hash -> uploaded file
+        self._files: Dict[str, UploadedFile] = {}
+        # (absolute path, size, mtime_ns) -> content hash
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._file_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+        if self.path and self.path.exists():
+            self._load()
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        return self.inner.generate_content(model=model, contents=contents, config=config)
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[Any]:
+        return self.inner.generate_content_stream(model=model, contents=contents, config=config)
+
+    def invalidate(self, model: str, contents: Any, config: Any = None):
+        self.inner.invalidate(model, contents, config)
+
+    def get_file(self, name: str) -> UploadedFile:
+        return self.inner.get_file(name)
+
+    def create_cache(self, model: str, contents: Any, ttl_seconds: float,
+                     display_name: Optional[str] = None) -> CachedContent:
+        return self.inner.create_cache(model, contents, ttl_seconds, display_name)
+
+    def update_cache(self, name: str, ttl_seconds: float) -> CachedContent:
+        return self.inner.update_cache(name, ttl_seconds)
+
+    def delete_cache(self, name: str):
+        self.inner.delete_cache(name)
+
+    def upload_file(self, path: str) -> UploadedFile:
+        sha256 = self._content_hash(path)
+        with self._lock:
+            file_lock = self._file_locks.setdefault(sha256, threading.Lock())
+
+        with file_lock:
+            with self._lock:
+                known = self._files.get(sha256)
+            if known is not None and self._is_reusable(known):
+                try:
+                    uploaded = self._wait_until_active(known)
+                    with self._lock:
+                        self.reuses += 1
+                    logger.info(f"Reusing uploaded file {uploaded.uri} for {path}")
+                    return replace(uploaded, sha256=sha256)
+                except Exception as e:
+                    logger.warning(f"Cannot reuse uploaded file {known.name}, uploading again: {e}")
+
+            uploaded = self._wait_until_active(self.inner.upload_file(path))
+            uploaded = replace(uploaded, sha256=sha256)
+            with self._lock:
+                self.uploads += 1
+                self._files[sha256] = uploaded
+                self._save()
+            return uploaded
+
+    def _content_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        fast_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            sha256 = self._hashes.get(fast_key)
+        if sha256 is None:
+            sha256 = file_sha256(path)
+            with self._lock:
+                self._hashes[fast_key] = sha256
+        return sha256
+
+    def _is_reusable(self, uploaded: UploadedFile) -> bool:
+        if uploaded.expiration_time is None:
+            return True
+        expiration = uploaded.expiration_time
+        if expiration.tzinfo is None:
+            expiration = expiration.replace(tzinfo=timezone.utc)
+        return expiration - datetime.now(timezone.utc) > timedelta(seconds=self.min_remaining)
+
+    def _wait_until_active(self, uploaded: UploadedFile) -> UploadedFile:
+        """Poll the file state with exponential backoff until it is ACTIVE"""
+        deadline = time.monotonic() + self.activation_timeout
+        delay = self.poll_interval
+        while True:
+            try:
+                uploaded = replace(self.inner.get_file(uploaded.name), sha256=uploaded.sha256)
+            except NotImplementedError:
+                return uploaded
+            if uploaded.state == "ACTIVE":
+                return uploaded
+            if uploaded.state == "FAILED":
+                raise BackendError(f"Processing of uploaded file {uploaded.name} failed")
+            if time.monotonic() + delay > deadline:
+                raise BackendError(f"Uploaded file {uploaded.name} not ACTIVE after {self.activation_timeout}s (state {uploaded.state})")
+            logger.debug(f"Waiting {delay:.1f}s for {uploaded.name} (state {uploaded.state})")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for record in data.get("files", []):
+            if record.get("expiration_time"):
+                record["expiration_time"] = datetime.fromisoformat(record["expiration_time"])
+            uploaded = UploadedFile(**record)
+            self._files[uploaded.sha256] = uploaded
+        for record in data.get("hashes", []):
+            self._hashes[(record["path"], record["size"], record["mtime_ns"])] = record["sha256"]
+        logger.info(f"Loaded {len(self._files)} uploaded files from {self.path}")
+
+    def _save(self):
+        """Write the registry atomically; callers hold self._lock"""
+        if self.path is None:
+            return
+        files = []
+        for uploaded in self._files.values():
+            record = asdict(uploaded)
+            if record["expiration_time"] is not None:
+                record["expiration_time"] = record["expiration_time"].isoformat()
+            files.append(record)
+        hashes = [
+            {"path": path, "size": size, "mtime_ns": mtime_ns, "sha256": sha256}
+            for (path, size, mtime_ns), sha256 in self._hashes.items()
+        ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": files, "hashes": hashes}, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 
 @dataclass
 class Description:
@@ -7,10 +8,29 @@ class Description:
     timestamp: float
     content: str
     segment_index: int
+    usage: Optional[Dict[str, int]] = None
+    # Set when the description was copied from an identical segment instead of calling the model:
+    # "segment <index>" in the same video, "<video_path> segment <index>" in another one
+    reused_from: Optional[str] = None
+    # Part of the video the description covers, in seconds (set by the pipeline once the task finishes)
+    start: Optional[float] = None
+    end: Optional[float] = None
 
 @dataclass
 class VideoSegment:
     """Represents a video segment with time boundaries"""
     start_time: float
     end_time: float
-    segment_index: int
\ No newline at end of file
+    segment_index: int
+
+@dataclass
+class VideoRun:
+    """Per-video state of one process_video call"""
+    video_path: str
+    video_uri: str
+    duration: float
+    segments: List[VideoSegment] = field(default_factory=list)
+    level1_descriptions: List[Description] = field(default_factory=list)
+    level2_descriptions: List[Description] = field(default_factory=list)
+    level3_description: Optional[Description] = None
+    usage: Dict[str, Dict[str, Any]] = field(default_factory=dict)
@@ -0,0 +1,81 @@
+import logging
+import os
+import shutil
+import subprocess
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# "copy" cuts at keyframes without re-encoding; "transcode" re-encodes to a small, low-fps H.264 clip
+CLIP_MODES = ("copy", "transcode")
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def clip_command(source: str, output: str, start: float, end: float, mode: str = "copy",
+                 height: int = 360, fps: float = 1.0, video_bitrate: str = "250k",
+                 audio_bitrate: str = "48k") -> List[str]:
+    """
+    Build the ffmpeg command cutting [start, end] of a video
+
+    Args:
+        source: Input video file
+        output: Output MP4 file
+        start: Clip start in seconds
+        end: Clip end in seconds
+        mode: One of CLIP_MODES
+        height: Output height when transcoding (width keeps the aspect ratio)
+        fps: Output frame rate when transcoding (Gemini samples video at 1 fps by default)
+        video_bitrate: Output video bitrate when transcoding
+        audio_bitrate: Output audio bitrate when transcoding
+
+    Returns:
+        ffmpeg argument list
+    """
+    if mode not in CLIP_MODES:
+        raise ValueError(f"Unknown clip mode {mode!r}, expected one of {CLIP_MODES}")
+    # Seeking before -i is fast; with stream copy the clip starts at the keyframe at or before start
+    command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+               "-ss", f"{start:.3f}", "-i", source, "-t", f"{end - start:.3f}"]
+    if mode == "copy":
+        command += ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+    else:
+        command += ["-vf", f"scale=-2:{height},fps={fps}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-b:v", video_bitrate,
+                    "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "1"]
+    return command + ["-movflags", "+faststart", "-f", "mp4", output]
+
+
+def cut_clip(source: str, output: str, start: float, end: float, mode: str = "copy", **options) -> str:
+    """
+    Cut one clip with ffmpeg, reusing an existing output file
+
+    Runs in worker processes, so it only takes picklable arguments.
+
+    Args:
+        source: Input video file
+        output: Output MP4 file, written atomically
+        start: Clip start in seconds
+        end: Clip end in seconds
+        mode: One of CLIP_MODES
+        **options: height, fps, video_bitrate and audio_bitrate of clip_command
+
+    Returns:
+        The output path
+
+    Raises:
+        RuntimeError: If ffmpeg fails
+    """
+    if os.path.exists(output):
+        return output
+    tmp_output = f"{output}.{os.getpid()}.tmp"
+    result = subprocess.run(clip_command(source, tmp_output, start, end, mode, **options),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp_output):
+            os.unlink(tmp_output)
+        raise RuntimeError(f"ffmpeg failed to cut {source} [{start}s-{end}s]: {result.stderr.strip()}")
+    os.replace(tmp_output, output)
+    return output
@@ -0,0 +1,285 @@
+import logging
+import os
+import struct
+import threading
+from typing import Dict, Hashable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes fetched per HTTP range request; one block usually covers every header we need
+RANGE_BLOCK_SIZE = 64 * 1024
+
+MP4_TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid"}
+
+EBML_HEADER = 0x1A45DFA3
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_CLUSTER = 0x1F43B675
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+
+_cache: Dict[Hashable, float] = {}
+_cache_lock = threading.Lock()
+
+
+class LocalFile:
+    """Random-access reader over a local file"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def read(self, offset: int, length: int) -> bytes:
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def close(self):
+        self._file.close()
+
+
+class HttpRangeFile:
+    """Random-access reader over an HTTP resource that fetches blocks with Range requests"""
+
+    def __init__(self, url: str, block_size: int = RANGE_BLOCK_SIZE, timeout: float = 10.0):
+        import requests
+
+        self.url = url
+        self.block_size = block_size
+        self.timeout = timeout
+        self.bytes_fetched = 0
+        self._session = requests.Session()
+        self._block_start = 0
+        self._block = b""
+        self.size: Optional[int] = None
+        self._fetch(0, block_size)
+
+    def _fetch(self, offset: int, length: int):
+        end = offset + length - 1
+        if self.size is not None:
+            end = min(end, self.size - 1)
+        response = self._session.get(self.url, headers={"Range": f"bytes={offset}-{end}"},
+                                     timeout=self.timeout, stream=True)
+        try:
+            if response.status_code != 206:
+                raise ValueError(f"Server does not support range requests (status {response.status_code})")
+            content_range = response.headers.get("Content-Range", "")
+            if self.size is None and "/" in content_range and not content_range.endswith("/*"):
+                self.size = int(content_range.rsplit("/", 1)[1])
+            self._block = response.content
+            self._block_start = offset
+            self.bytes_fetched += len(self._block)
+        finally:
+            response.close()
+        if self.size is None:
+            raise ValueError("Server did not report the resource size")
+
+    def read(self, offset: int, length: int) -> bytes:
+        block_end = self._block_start + len(self._block)
+        if not (self._block_start <= offset and offset + length <= block_end):
+            self._fetch(offset, max(length, self.block_size))
+        start = offset - self._block_start
+        return self._block[start:start + length]
+
+    def close(self):
+        self._session.close()
+
+
+def probe_duration(source: str) -> Optional[float]:
+    """
+    Read a video's duration from its container header
+
+    Supports MP4/MOV (``mvhd``, ``mdhd``, ``mehd``) and Matroska/WebM (EBML ``Duration``).
+    Local files are read with a few seeks; HTTP(S) sources are read with Range requests,
+    so only the header bytes are transferred. Results are memoized per path and mtime,
+    or per URL and ETag/Last-Modified.
+
+    Args:
+        source: Local path or HTTP(S) URL
+
+    Returns:
+        Duration in seconds, or None if the container is not recognised
+
+    Raises:
+        OSError, ValueError or requests exceptions if the source cannot be read
+    """
+    is_http = source.startswith(("http://", "https://"))
+    cache_key = _http_cache_key(source) if is_http else _local_cache_key(source)
+    if cache_key is not None:
+        with _cache_lock:
+            if cache_key in _cache:
+                return _cache[cache_key]
+
+    reader = HttpRangeFile(source) if is_http else LocalFile(source)
+    try:
+        duration = _container_duration(reader)
+    finally:
+        reader.close()
+
+    if is_http:
+        logger.debug(f"Probed {source} with {reader.bytes_fetched} bytes")
+    if duration is not None and cache_key is not None:
+        with _cache_lock:
+            _cache[cache_key] = duration
+    return duration
+
+
+def _local_cache_key(path: str) -> Tuple:
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _http_cache_key(url: str) -> Optional[Tuple]:
+    import requests
+
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=10.0)
+    except requests.RequestException:
+        return None
+    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+    return (url, validator) if validator else None
+
+
+def _container_duration(reader) -> Optional[float]:
+    head = reader.read(0, 12)
+    if len(head) >= 4 and struct.unpack(">I", head[:4])[0] == EBML_HEADER:
+        return _ebml_duration(reader)
+    if len(head) >= 8 and head[4:8] in MP4_TOP_LEVEL_BOXES:
+        return _mp4_duration(reader)
+    return None
+
+
+def _iter_boxes(reader, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (type, payload start, box end) for every ISO-BMFF box in [start, end)"""
+    offset = start
+    while offset + 8 <= end:
+        header = reader.read(offset, 16)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return
+            size = struct.unpack(">Q", header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield kind, offset + header_size, offset + size
+        offset += size
+
+
+def _find_box(reader, start: int, end: int, path: Tuple[bytes, ...]) -> Optional[Tuple[int, int]]:
+    for kind, payload, box_end in _iter_boxes(reader, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            found = _find_box(reader, payload, box_end, path[1:])
+            if found is not None:
+                return found
+    return None
+
+
+def _full_box_times(reader, payload: int, v0: Tuple[int, int], v1: Tuple[int, int]) -> Tuple[int, Optional[int]]:
+    """
+    Read (timescale, duration) of an mvhd/mdhd box given their v0/v1 field offsets
+
+    The duration is None when it is all ones, which marks it unknown: 32-bit in a
+    version 0 box, 64-bit in a version 1 box.
+    """
+    data = reader.read(payload, 32)
+    if data[0] == 1:
+        timescale = struct.unpack(">I", data[v1[0]:v1[0] + 4])[0]
+        duration = struct.unpack(">Q", data[v1[1]:v1[1] + 8])[0]
+        unknown = 0xFFFFFFFFFFFFFFFF
+    else:
+        timescale = struct.unpack(">I", data[v0[0]:v0[0] + 4])[0]
+        duration = struct.unpack(">I", data[v0[1]:v0[1] + 4])[0]
+        unknown = 0xFFFFFFFF
+    return timescale, (None if duration == unknown else duration)
+
+
+def _valid(timescale: int, duration: Optional[int]) -> bool:
+    return timescale > 0 and duration is not None and duration > 0
+
+
+def _mp4_duration(reader) -> Optional[float]:
+    moov = _find_box(reader, 0, reader.size, (b"moov",))
+    if moov is None:
+        return None
+
+    timescale = 0
+    mvhd = _find_box(reader, moov[0], moov[1], (b"mvhd",))
+    if mvhd is not None:
+        timescale, duration = _full_box_times(reader, mvhd[0], v0=(12, 16), v1=(20, 24))
+        if _valid(timescale, duration):
+            return duration / timescale
+
+    # Fragmented files leave mvhd empty; use the longest track or the fragment duration
+    durations = []
+    for kind, payload, box_end in _iter_boxes(reader, moov[0], moov[1]):
+        if kind == b"trak":
+            mdhd = _find_box(reader, payload, box_end, (b"mdia", b"mdhd"))
+            if mdhd is not None:
+                track_scale, track_duration = _full_box_times(reader, mdhd[0], v0=(12, 16), v1=(20, 24))
+                if _valid(track_scale, track_duration):
+                    durations.append(track_duration / track_scale)
+    if durations:
+        return max(durations)
+
+    mehd = _find_box(reader, moov[0], moov[1], (b"mvex", b"mehd"))
+    if mehd is not None and timescale > 0:
+        data = reader.read(mehd[0], 12)
+        duration = struct.unpack(">Q", data[4:12])[0] if data[0] == 1 else struct.unpack(">I", data[4:8])[0]
+        if duration > 0:
+            return duration / timescale
+    return None
+
+
+def _read_vint(reader, offset: int, keep_marker: bool) -> Tuple[Optional[int], int]:
+    """Read an EBML variable-length integer, returning (value, length); value is None for unknown sizes"""
+    first = reader.read(offset, 1)
+    if not first or first[0] == 0:
+        raise ValueError(f"Invalid EBML variable-length integer at {offset}")
+    length = 8 - first[0].bit_length() + 1
+    raw = int.from_bytes(reader.read(offset, length), "big")
+    if keep_marker:
+        return raw, length
+    value = raw & ((1 << (7 * length)) - 1)
+    return (None if value == (1 << (7 * length)) - 1 else value), length
+
+
+def _iter_ebml(reader, start: int, end: int) -> Iterator[Tuple[int, int, Optional[int]]]:
+    """Yield (id, payload start, payload size) for every EBML element in [start, end)"""
+    offset = start
+    while offset < end:
+        element_id, id_length = _read_vint(reader, offset, keep_marker=True)
+        size, size_length = _read_vint(reader, offset + id_length, keep_marker=False)
+        payload = offset + id_length + size_length
+        yield element_id, payload, size
+        if size is None:
+            return
+        offset = payload + size
+
+
+def _ebml_duration(reader) -> Optional[float]:
+    for element_id, payload, size in _iter_ebml(reader, 0, reader.size):
+        if element_id != EBML_SEGMENT:
+            continue
+        segment_end = reader.size if size is None else payload + size
+        for child_id, child_payload, child_size in _iter_ebml(reader, payload, segment_end):
+            if child_id == EBML_CLUSTER or child_size is None:
+                return None
+            if child_id != EBML_INFO:
+                continue
+            timecode_scale = 1_000_000
+            duration = None
+            for info_id, info_payload, info_size in _iter_ebml(reader, child_payload, child_payload + child_size):
+                data = reader.read(info_payload, info_size or 0)
+                if info_id == EBML_TIMECODE_SCALE:
+                    timecode_scale = int.from_bytes(data, "big")
+                elif info_id == EBML_DURATION and info_size in (4, 8):
+                    duration = struct.unpack(">f" if info_size == 4 else ">d", data)[0]
+            return duration * timecode_scale / 1e9 if duration else None
+    return None
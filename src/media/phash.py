@@ -0,0 +1,136 @@
+import logging
+from typing import List
+
+from src.entities import VideoSegment
+
+logger = logging.getLogger(__name__)
+
+# Frames are reduced to HASH_SIZE x HASH_SIZE grey levels before the DCT; the low HASH_BITS x HASH_BITS
+# frequencies form the 64-bit hash
+HASH_SIZE = 32
+HASH_BITS = 8
+# Sampled frames are decoded at this height before reduction
+DECODE_HEIGHT = 96
+
+
+def _dct_matrix(size: int):
+    import numpy as np
+
+    n = np.arange(size)
+    return np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+
+
+def phash(frames):
+    """
+    Perceptual hashes of a batch of frames
+
+    Each frame is converted to grey, reduced to HASH_SIZE x HASH_SIZE, transformed
+    with a 2-D DCT, and its lowest frequencies are compared with their median.
+    Small edits (re-encoding, scaling, overlays) flip only a few of the 64 bits.
+
+    Args:
+        frames: Array of shape (n, height, width, 3) or (n, height, width)
+
+    Returns:
+        uint64 array of n hashes
+    """
+    import numpy as np
+
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 4:
+        frames = frames @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    n, height, width = frames.shape
+    rows = np.linspace(0, height, HASH_SIZE + 1).astype(int)
+    cols = np.linspace(0, width, HASH_SIZE + 1).astype(int)
+    # Area reduction: mean of each block, via cumulative sums
+    summed = np.pad(frames.cumsum(axis=1).cumsum(axis=2), ((0, 0), (1, 0), (1, 0)))
+    blocks = (summed[:, rows[1:]][:, :, cols[1:]] - summed[:, rows[:-1]][:, :, cols[1:]]
+              - summed[:, rows[1:]][:, :, cols[:-1]] + summed[:, rows[:-1]][:, :, cols[:-1]])
+    areas = np.maximum(np.diff(rows)[:, None] * np.diff(cols)[None, :], 1)
+    reduced = blocks / areas
+
+    dct = _dct_matrix(HASH_SIZE)
+    coefficients = np.einsum("ij,njk,lk->nil", dct, reduced, dct)[:, :HASH_BITS, :HASH_BITS].reshape(n, -1)
+    # The DC term only measures brightness, leave it out of the median
+    median = np.median(coefficients[:, 1:], axis=1, keepdims=True)
+    bits = np.packbits(coefficients > median, axis=1)
+    return bits.view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(a, b):
+    """
+    Pairwise Hamming distances between two arrays of uint64 hashes
+
+    Args:
+        a: Hashes of shape (..., k)
+        b: Hashes broadcastable against a
+
+    Returns:
+        Integer array of bit differences with the broadcast shape
+    """
+    import numpy as np
+
+    xor = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).astype(np.int64)
+    bits = np.unpackbits(xor[..., None].view(np.uint8), axis=-1)
+    return bits.sum(axis=-1, dtype=np.int64)
+
+
+def segment_signatures(path: str, segments: List[VideoSegment], frames_per_segment: int = 3):
+    """
+    Perceptual hashes of frames sampled evenly inside every segment
+
+    Args:
+        path: Local video file
+        segments: Segments to hash
+        frames_per_segment: Frames sampled per segment
+
+    Returns:
+        uint64 array of shape (len(segments), frames_per_segment)
+    """
+    import numpy as np
+    from moviepy.editor import VideoFileClip
+
+    fractions = (np.arange(frames_per_segment) + 0.5) / frames_per_segment
+    clip = VideoFileClip(path, audio=False, target_resolution=(DECODE_HEIGHT, None))
+    try:
+        last_frame_time = max(clip.duration - 1.0 / (clip.fps or 25), 0)
+        frames = [
+            clip.get_frame(min(segment.start_time + fraction * (segment.end_time - segment.start_time), last_frame_time))
+            for segment in segments
+            for fraction in fractions
+        ]
+    finally:
+        clip.close()
+    return phash(np.stack(frames)).reshape(len(segments), frames_per_segment)
+
+
+def find_duplicates(signatures, max_distance: int) -> List[int]:
+    """
+    Map every segment to the first earlier segment that looks the same
+
+    Two segments match when each pair of corresponding sampled frames differs by at
+    most max_distance bits.
+
+    Args:
+        signatures: Output of segment_signatures
+        max_distance: Largest per-frame Hamming distance of a match
+
+    Returns:
+        For every segment, the index of the segment it duplicates (itself if none).
+        The target of a duplicate is never a duplicate itself.
+    """
+    import numpy as np
+
+    signatures = np.asarray(signatures, dtype=np.uint64)
+    count = len(signatures)
+    distances = hamming_distances(signatures[:, None, :], signatures[None, :, :]).max(axis=2)
+    matches = (distances <= max_distance) & np.tri(count, k=-1, dtype=bool)
+    sources = list(range(count))
+    for i in range(count):
+        for j in np.flatnonzero(matches[i]):
+            if sources[j] == j:
+                sources[i] = int(j)
+                break
+    return sources
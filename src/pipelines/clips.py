@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.backends.base import ModelBackend
+from src.media.clips import cut_clip
+
+logger = logging.getLogger(__name__)
+
+
+class ClipSet:
+    """
+    Clips of one local video, cut with ffmpeg and uploaded in the background.
+
+    Clips are cut in a process pool and each clip is uploaded as soon as it exists,
+    so the first segment calls can start before the rest of the video is processed.
+    A window's URI is requested with ``uri(start, end)``, which schedules the clip if
+    it was not prefetched and blocks until it is uploaded. The whole video (the
+    original in "copy" mode, a downscaled copy in "transcode" mode) is available
+    from ``full_uri()`` for the level-3 overview and for windows without their own
+    clip, which seek in it with offsets.
+    """
+
+    def __init__(self,
+                 backend: ModelBackend,
+                 source: str,
+                 duration: float,
+                 mode: str = "copy",
+                 output_dir: Optional[str] = None,
+                 max_workers: int = 4,
+                 **options):
+        """
+        Initialize the clip set
+
+        Args:
+            backend: Backend uploading the clips (an UploadRegistry reuses clips across runs)
+            source: Local video file
+            duration: Video duration in seconds
+            mode: One of CLIP_MODES
+            output_dir: Directory keeping the clips for later runs (a temporary directory removed on close if None)
+            max_workers: Number of concurrent ffmpeg processes and uploads
+            **options: height, fps, video_bitrate and audio_bitrate of clip_command
+        """
+        self.backend = backend
+        self.source = source
+        self.duration = duration
+        self.mode = mode
+        self.options = options
+        self._temporary = output_dir is None
+        self.output_dir = Path(output_dir or tempfile.mkdtemp(prefix="clips-"))
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # The pipeline runs many threads, which makes forking unsafe
+        self._cutters = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._uploaders = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clip-upload")
+        self._uploads: Dict[Tuple[float, float], Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, windows: Iterable[Tuple[float, float]]):
+        """Start cutting and uploading windows in the given order"""
+        for start, end in windows:
+            self._submit(start, end)
+
+    def has_clip(self, start: float, end: float) -> bool:
+        """Whether [start, end] was scheduled as a clip of its own"""
+        with self._lock:
+            return self._key(start, end) in self._uploads
+
+    def uri(self, start: float, end: float) -> str:
+        """URI of the uploaded clip covering [start, end]"""
+        return self._submit(start, end).result()
+
+    def full_uri(self) -> str:
+        """URI of the uploaded whole video"""
+        return self._submit(0.0, self.duration).result()
+
+    @staticmethod
+    def _key(start: float, end: float) -> Tuple[float, float]:
+        return round(start, 3), round(end, 3)
+
+    def _submit(self, start: float, end: float) -> Future:
+        key = self._key(start, end)
+        with self._lock:
+            upload = self._uploads.get(key)
+            if upload is None:
+                if self.mode == "copy" and key == (0.0, round(self.duration, 3)):
+                    # A stream copy of the whole video is the original file
+                    upload = self._uploaders.submit(self._upload, self.source, None)
+                else:
+                    cut = self._cutters.submit(cut_clip, self.source, self._clip_path(start, end), start, end,
+                                               self.mode, **self.options)
+                    upload = self._uploaders.submit(self._upload, None, cut)
+                self._uploads[key] = upload
+        return upload
+
+    def _upload(self, path: Optional[str], cut: Optional[Future]) -> str:
+        if cut is not None:
+            path = cut.result()
+        uploaded = self.backend.upload_file(path)
+        logger.info(f"Uploaded clip {path} as {uploaded.uri}")
+        return uploaded.uri
+
+    def _clip_path(self, start: float, end: float) -> str:
+        # Clips depend on the source content (by path, size and mtime) and the cut settings
+        stat = os.stat(self.source)
+        settings = repr((os.path.abspath(self.source), stat.st_size, stat.st_mtime_ns, self.mode, sorted(self.options.items())))
+        digest = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:16]
+        return str(self.output_dir / f"{Path(self.source).stem}-{digest}-{start:.3f}-{end:.3f}.mp4")
+
+    def close(self):
+        """Stop pending work and remove temporary clips"""
+        self._uploaders.shutdown(wait=True, cancel_futures=True)
+        self._cutters.shutdown(wait=True, cancel_futures=True)
+        if self._temporary:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def __enter__(self) -> "ClipSet":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,374 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from src.entities import Description
+from src.pipelines.jobs import video_id as source_video_id
+
+logger = logging.getLogger(__name__)
+
+# Version written to every shard; readers refuse shards written by a newer version.
+# Version 3 stores the set of video ids of each shard instead of their min/max range
+SCHEMA_VERSION = 3
+
+# Columns of each table. Tables are partitioned by level, so "level" is stored in the directory name
+TABLES: Dict[str, Sequence[str]] = {
+    "descriptions": ("video_id", "video_path", "level", "segment_index", "timestamp", "content", "reused_from"),
+    # Version 2 added duplicate_of (set on near-duplicate QA pairs flagged by QADeduplicator)
+    "qa": ("video_id", "level", "dimension", "question", "answer", "duplicate_of"),
+}
+
+# Columns whose set of values is stored in each shard's metadata so readers can skip shards without
+# opening them. Video ids are hashes, so a min/max range would span nearly every id and prune nothing
+_SET_STATS = ("video_id", "dimension")
+
+
+def description_records(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Every description of VideoDescriptionPipeline.process_video results, with its "level" set"""
+    records = [{**record, "level": 1} for record in results.get("level1_descriptions", [])]
+    records += [{**record, "level": 2} for record in results.get("level2_descriptions", [])]
+    if results.get("level3_description"):
+        records.append({**results["level3_description"], "level": 3})
+    return records
+
+
+class DatasetWriter:
+    """
+    Writer appending descriptions and QA pairs to a partitioned columnar dataset.
+
+    Rows are buffered per table and level and written as immutable shards of
+    shard_rows rows::
+
+        <root>/<table>/level=<level>/part-<writer>-<n>/<column>.json.gz
+        <root>/<table>/level=<level>/part-<writer>-<n>/_meta.json
+
+    Every column of a shard is a separate gzip-compressed JSON array, so a reader
+    opens only the columns it needs. A shard appears atomically (it is written to a
+    temporary directory and renamed), and shard names include a per-writer id, so
+    any number of processes can write to the same dataset.
+    """
+
+    def __init__(self, root: Union[str, Path], shard_rows: int = 50000):
+        """
+        Open a dataset for appending
+
+        Args:
+            root: Dataset directory
+            shard_rows: Rows per shard; larger shards compress better, smaller ones prune finer
+        """
+        self.root = Path(root)
+        self.shard_rows = shard_rows
+        self.writer_id = uuid.uuid4().hex[:8]
+        self.shards_written = 0
+        self._buffers: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def write_descriptions(self, descriptions: Iterable[Union[Description, Dict[str, Any]]], video_path: str,
+                           video_id: Optional[str] = None):
+        """
+        Append the descriptions of one video
+
+        Args:
+            descriptions: Description objects, or their records as in process_video results
+                (a record without "level" needs it set by the caller)
+            video_path: Source of the video
+            video_id: Identifier of the video (derived from video_path if None)
+        """
+        video_id = video_id or source_video_id(video_path)
+        rows = []
+        for description in descriptions:
+            record = vars(description) if isinstance(description, Description) else description
+            rows.append({
+                "video_id": video_id,
+                "video_path": video_path,
+                "level": record["level"],
+                "segment_index": record.get("segment_index", 0),
+                "timestamp": record.get("timestamp"),
+                "content": record["content"],
+                "reused_from": record.get("reused_from"),
+            })
+        self._append("descriptions", rows)
+
+    def write_qa(self, qa: Iterable[Dict[str, Any]], video_id: str):
+        """
+        Append the QA pairs of one video
+
+        Args:
+            qa: {"level", "qa_pairs"} entries as returned by QAPipeline.process_video_analysis_all_levels
+            video_id: Identifier of the video
+        """
+        rows = [
+            {
+                "video_id": video_id,
+                "level": entry["level"],
+                "dimension": pair.get("Dimension"),
+                "question": pair.get("Question"),
+                "answer": pair.get("Answer"),
+                "duplicate_of": pair.get("duplicate_of"),
+            }
+            for entry in qa
+            for pair in entry["qa_pairs"]
+        ]
+        self._append("qa", rows)
+
+    def write_video(self, results: Dict[str, Any], qa: Optional[Iterable[Dict[str, Any]]] = None) -> str:
+        """
+        Append a video from VideoDescriptionPipeline.process_video results and, optionally, its QA pairs
+
+        Returns:
+            The video id the rows were written under
+        """
+        video_path = results["video_path"]
+        video_id = source_video_id(video_path)
+        self.write_descriptions(description_records(results), video_path, video_id)
+        if qa is not None:
+            self.write_qa(qa, video_id)
+        return video_id
+
+    def _append(self, table: str, rows: List[Dict[str, Any]]):
+        full = []
+        with self._lock:
+            for row in rows:
+                buffer = self._buffers.setdefault((table, row["level"]), [])
+                buffer.append(row)
+                if len(buffer) >= self.shard_rows:
+                    full.append((table, row["level"], buffer))
+                    self._buffers[(table, row["level"])] = []
+        for table, level, buffer in full:
+            self._write_shard(table, level, buffer)
+
+    def flush(self):
+        """Write every buffered row"""
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+        for (table, level), rows in buffers.items():
+            if rows:
+                self._write_shard(table, level, rows)
+
+    def _write_shard(self, table: str, level: int, rows: List[Dict[str, Any]]):
+        with self._lock:
+            self.shards_written += 1
+            name = f"part-{self.writer_id}-{self.shards_written:05d}"
+        partition = self.root / table / f"level={level}"
+        tmp_dir = partition / f".{name}.tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        columns = [column for column in TABLES[table] if column != "level"]
+        for column in columns:
+            with gzip.open(tmp_dir / f"{column}.json.gz", "wt", encoding="utf-8") as f:
+                json.dump([row[column] for row in rows], f, ensure_ascii=False)
+
+        stats: Dict[str, Any] = {}
+        for column in columns:
+            if column in _SET_STATS:
+                stats[column] = {"values": sorted({row[column] for row in rows if row[column] is not None})}
+        meta = {"schema_version": SCHEMA_VERSION, "table": table, "level": level, "rows": len(rows),
+                "columns": columns, "stats": stats}
+        with open(tmp_dir / "_meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_dir, partition / name)
+        logger.info(f"Wrote {len(rows)} {table} rows to {partition / name}")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DatasetReader:
+    """
+    Reader of a dataset written by DatasetWriter, with column projection and predicate pushdown.
+
+    Filters on level select partitions; filters on video id and dimension skip shards
+    using the value-set statistics in their metadata. Within the remaining
+    shards, only the filtered columns are read to select rows, then only the requested
+    columns of those rows.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        """
+        Open a dataset
+
+        Args:
+            root: Dataset directory
+        """
+        self.root = Path(root)
+
+    def shards(self, table: str, levels: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        """Metadata of the shards of a table (with their "path"), restricted to some levels"""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table!r}, expected one of {tuple(TABLES)}")
+        if levels is None:
+            partitions = sorted((self.root / table).glob("level=*"))
+        else:
+            partitions = [self.root / table / f"level={level}" for level in levels]
+        shards = []
+        for partition in partitions:
+            for meta_path in sorted(partition.glob("part-*/_meta.json")):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta["schema_version"] > SCHEMA_VERSION:
+                    raise ValueError(f"{meta_path.parent} has schema version {meta['schema_version']}, "
+                                     f"this reader supports up to {SCHEMA_VERSION}")
+                meta["path"] = meta_path.parent
+                shards.append(meta)
+        return shards
+
+    def video_ids(self, table: str) -> set:
+        """Ids of the videos with rows in a table, read from the shard statistics"""
+        ids = set()
+        for shard in self.shards(table):
+            stats = shard.get("stats", {}).get("video_id", {})
+            if "values" in stats:
+                ids.update(stats["values"])
+            else:
+                # Shard written before version 3, which only stored the id range
+                ids.update(self._read_column(shard, "video_id"))
+        return ids
+
+    def scan(self,
+             table: str,
+             columns: Optional[Sequence[str]] = None,
+             video_ids: Optional[Iterable[str]] = None,
+             levels: Optional[Iterable[int]] = None,
+             dimensions: Optional[Iterable[str]] = None) -> Dict[str, List[Any]]:
+        """
+        Read columns of the rows matching every given filter
+
+        Args:
+            table: "descriptions" or "qa"
+            columns: Columns to return (all columns of the table if None)
+            video_ids: Keep only these videos
+            levels: Keep only these levels
+            dimensions: Keep only these QA dimensions ("qa" table only)
+
+        Returns:
+            Column name -> list of values, all of the same length
+        """
+        columns = list(columns or TABLES[table])
+        unknown = [column for column in columns if column not in TABLES[table]]
+        if unknown:
+            raise ValueError(f"Unknown columns {unknown} for table {table!r}")
+        if dimensions is not None and table != "qa":
+            raise ValueError("dimensions can only filter the qa table")
+        filters = {}
+        if video_ids is not None:
+            filters["video_id"] = set(video_ids)
+        if dimensions is not None:
+            filters["dimension"] = set(dimensions)
+
+        result: Dict[str, List[Any]] = {column: [] for column in columns}
+        for shard in self.shards(table, levels):
+            if not self._may_match(shard, filters):
+                continue
+            selected = None
+            for column, allowed in filters.items():
+                values = self._read_column(shard, column)
+                matches = [i for i, value in enumerate(values) if value in allowed]
+                selected = matches if selected is None else sorted(set(selected) & set(matches))
+            if selected is not None and not selected:
+                continue
+            for column in columns:
+                if column == "level":
+                    values = [shard["level"]] * shard["rows"]
+                else:
+                    values = self._read_column(shard, column)
+                result[column].extend(values if selected is None else [values[i] for i in selected])
+        return result
+
+    def rows(self, table: str, columns: Optional[Sequence[str]] = None, **filters) -> Iterator[Dict[str, Any]]:
+        """Rows of scan() as dictionaries"""
+        data = self.scan(table, columns, **filters)
+        names = list(data)
+        for values in zip(*(data[name] for name in names)):
+            yield dict(zip(names, values))
+
+    @staticmethod
+    def _may_match(shard: Dict[str, Any], filters: Dict[str, set]) -> bool:
+        stats = shard.get("stats", {})
+        for column, allowed in filters.items():
+            stat = stats.get(column)
+            if stat is None:
+                continue
+            if "values" in stat:
+                if not allowed & set(stat["values"]):
+                    return False
+            elif "min" in stat:
+                # Range statistics of shards written before version 3
+                if not any(stat["min"] <= value <= stat["max"] for value in allowed):
+                    return False
+        return True
+
+    @staticmethod
+    def _read_column(shard: Dict[str, Any], column: str) -> List[Any]:
+        if column not in shard["columns"]:
+            # Column added in a later schema version than the shard
+            return [None] * shard["rows"]
+        with gzip.open(shard["path"] / f"{column}.json.gz", "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def export_outputs(output_dir: Union[str, Path], dataset_dir: Union[str, Path], shard_rows: int = 50000) -> int:
+    """
+    Write the describe and qa outputs of JobWorker runs to a dataset
+
+    Videos whose descriptions (or QA pairs) are already in the dataset are skipped,
+    so exporting the same output directory again only appends new videos.
+
+    Args:
+        output_dir: Output directory of the workers
+        dataset_dir: Dataset directory to append to
+        shard_rows: Rows per shard
+
+    Returns:
+        Number of videos with rows written
+    """
+    reader = DatasetReader(dataset_dir)
+    described = reader.video_ids("descriptions")
+    answered = reader.video_ids("qa")
+    count = 0
+    with DatasetWriter(dataset_dir, shard_rows=shard_rows) as writer:
+        for describe_path in sorted(Path(output_dir).glob("*/describe.json")):
+            with open(describe_path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            video_path = results["video_path"]
+            video_id = source_video_id(video_path)
+            written = False
+            if video_id not in described:
+                writer.write_descriptions(description_records(results), video_path, video_id)
+                described.add(video_id)
+                written = True
+            qa_path = describe_path.with_name("qa.json")
+            if video_id not in answered and qa_path.exists():
+                with open(qa_path, "r", encoding="utf-8") as f:
+                    writer.write_qa(json.load(f)["qa"], video_id)
+                answered.add(video_id)
+                written = True
+            count += written
+    logger.info(f"Exported {count} videos to {dataset_dir}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export worker outputs to a columnar dataset")
+    parser.add_argument("output_dir", help="Output directory of the job workers")
+    parser.add_argument("dataset_dir", help="Dataset directory")
+    parser.add_argument("--shard-rows", type=int, default=50000)
+    parser.add_argument("--replace", action="store_true", help="Remove the existing dataset first")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.replace:
+        shutil.rmtree(args.dataset_dir, ignore_errors=True)
+    print(f"Exported {export_outputs(args.output_dir, args.dataset_dir, args.shard_rows)} videos")
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from src.media.phash import hamming_distances
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentHashIndex:
+    """
+    Thread-safe index of described segments keyed by their perceptual hashes.
+
+    Shared by every video a pipeline processes, so a recurring channel intro or
+    outro is described once per batch (or once ever, when persisted to a JSON file)
+    and later occurrences reuse that description. The index holds at most
+    max_entries segments; past that, the least recently matched or added ones are
+    evicted, so recurring segments stay while one-off segments age out.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, max_distance: int = 4,
+                 max_entries: Optional[int] = 20000):
+        """
+        Initialize the index
+
+        Args:
+            path: JSON file persisting the index across runs (in-memory only if None)
+            max_distance: Largest per-frame Hamming distance of a match
+            max_entries: Most segments kept (unbounded if None); exceeding it evicts the least
+                recently used tenth at once
+        """
+        self.path = Path(path) if path else None
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries: List[Dict[str, Any]] = []
+        # Per signature length: entry indices, hash matrix and used rows, with capacity to append in place
+        self._matrices: Dict[int, List] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+        if self.path and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f).get("entries", [])
+            logger.info(f"Loaded {len(self._entries)} segment hashes from {self.path}")
+        # Recency of each entry ("last_used"); entries saved before it existed count as oldest
+        self._clock = max((entry.get("last_used", 0) for entry in self._entries), default=0)
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, signature: Sequence[int]) -> Optional[Dict[str, Any]]:
+        """
+        Look up a segment
+
+        Args:
+            signature: Per-frame perceptual hashes of the segment
+
+        Returns:
+            The closest matching entry ({"signature", "content", "video_path", "segment_index"}) or None
+        """
+        import numpy as np
+
+        with self._lock:
+            # Hash matrices per signature length, built on first lookup and then appended to by add
+            length = len(signature)
+            if length not in self._matrices:
+                candidates = [i for i, entry in enumerate(self._entries) if len(entry["signature"]) == length]
+                self._matrices[length] = [np.array(candidates, dtype=np.int64),
+                                          np.array([self._entries[i]["signature"] for i in candidates],
+                                                   dtype=np.uint64).reshape(len(candidates), length),
+                                          len(candidates)]
+            indices, hashes, size = self._matrices[length]
+            if not size:
+                return None
+            distances = hamming_distances(hashes[:size], np.asarray(signature, dtype=np.uint64)[None, :]).max(axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return None
+            self.hits += 1
+            entry = self._entries[int(indices[best])]
+            self._clock += 1
+            entry["last_used"] = self._clock
+            return entry
+
+    def add(self, signature: Sequence[int], content: str, video_path: str, segment_index: int):
+        """Remember the description of a segment"""
+        import numpy as np
+
+        with self._lock:
+            self._clock += 1
+            self._entries.append({
+                "signature": [int(value) for value in signature],
+                "content": content,
+                "video_path": video_path,
+                "segment_index": segment_index,
+                "last_used": self._clock,
+            })
+            if self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._evict()
+                return
+
+            matrix = self._matrices.get(len(signature))
+            if matrix is not None:
+                indices, hashes, size = matrix
+                if size == len(indices):
+                    # Double the capacity, so appending copies each row a logarithmic number of times
+                    capacity = max(2 * size, 64)
+                    indices = np.resize(indices, capacity)
+                    hashes = np.resize(hashes, (capacity, len(signature)))
+                indices[size] = len(self._entries) - 1
+                hashes[size] = np.asarray(signature, dtype=np.uint64)
+                self._matrices[len(signature)] = [indices, hashes, size + 1]
+
+    def _evict(self):
+        """Drop the least recently used entries down to 90% of max_entries (lock held)"""
+        keep = int(self.max_entries * 0.9)
+        recent = sorted(range(len(self._entries)), key=lambda i: self._entries[i].get("last_used", 0))[-keep:]
+        evicted = len(self._entries) - keep
+        self._entries = [self._entries[i] for i in sorted(recent)] if keep else []
+        # Entry indices changed, so the matrices are rebuilt on the next lookup
+        self._matrices.clear()
+        logger.info(f"Evicted {evicted} least recently used segment hashes, {len(self._entries)} left")
+
+    def save(self):
+        """
+        Write the index atomically (no-op for an in-memory index)
+
+        Videos of one pipeline save concurrently, so saves are serialised and each writes
+        its own temporary file; lookups and adds are not blocked while the file is written.
+        """
+        if self.path is None:
+            return
+        with self._save_lock:
+            with self._lock:
+                # Copies, since lookups update "last_used" while the entries are written
+                entries = [dict(entry) for entry in self._entries]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f"{self.path.suffix}.{uuid.uuid4().hex[:8]}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,309 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Stages every video goes through, in order
+STAGES = ("ingest", "describe", "qa")
+# Job states:
+# - pending: waiting for a worker (at the stage in its "stage" column)
+# - leased: a worker holds the job until its lease expires
+# - done: every stage finished
+# - failed: a stage failed max_attempts times
+JOB_STATES = ("pending", "leased", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    duration REAL,
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    outputs TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+
+def video_id(source: str) -> str:
+    """Stable identifier of a video source, used to name its outputs"""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+def read_manifest(path: Union[str, Path]) -> List[Tuple[str, Optional[float]]]:
+    """
+    Read the videos listed in a manifest
+
+    A ``.jsonl`` manifest holds one {"source", "duration"} record per line (duration optional);
+    any other file holds one source per line, with blank lines and "#" comments skipped.
+
+    Args:
+        path: Manifest file
+
+    Returns:
+        (source, duration) pairs in file order
+    """
+    path = Path(path)
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.suffix == ".jsonl":
+                record = json.loads(line)
+                entries.append((record["source"], record.get("duration")))
+            else:
+                entries.append((line, None))
+    return entries
+
+
+@dataclass
+class Job:
+    """One video of the queue, as leased by a worker"""
+    id: int
+    video_id: str
+    source: str
+    duration: Optional[float]
+    stage: str
+    attempts: int
+    worker: str
+    outputs: Dict[str, str] = field(default_factory=dict)
+
+
+class JobQueue:
+    """
+    Persistent queue of videos on a SQLite file, shared by any number of worker processes.
+
+    A worker leases one job at a time for lease_seconds and keeps it with heartbeat().
+    A job whose lease expires (its worker crashed or hung) is handed to the next worker
+    that asks, resuming at the first unfinished stage. Every lease counts as an attempt;
+    after max_attempts the job is marked failed with the reason of the last failure.
+    """
+
+    def __init__(self, path: Union[str, Path], lease_seconds: float = 600.0, max_attempts: int = 3):
+        """
+        Open (and create if needed) the queue
+
+        Args:
+            path: SQLite file holding the queue
+            lease_seconds: Seconds a lease lasts without a heartbeat
+            max_attempts: Leases a job gets before it is marked failed
+        """
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, entries: Iterable[Tuple[str, Optional[float]]]) -> int:
+        """
+        Add videos to the queue, ignoring sources that are already queued
+
+        Args:
+            entries: (source, duration) pairs, duration None if unknown
+
+        Returns:
+            Number of new jobs
+        """
+        now = time.time()
+        rows = [(video_id(source), source, duration, STAGES[0], "pending", now, now) for source, duration in entries]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (video_id, source, duration, stage, state, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            added = self._conn.total_changes - before
+        logger.info(f"Queued {added} new videos ({len(rows) - added} already queued)")
+        return added
+
+    def lease(self, worker: str) -> Optional[Job]:
+        """
+        Lease the oldest pending job, first re-queueing jobs whose lease expired
+
+        Args:
+            worker: Identifier of the calling worker
+
+        Returns:
+            The leased job, or None if no job is pending
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._expire_leases(now)
+                row = self._conn.execute(
+                    "SELECT id, video_id, source, duration, stage, attempts, outputs FROM jobs "
+                    "WHERE state = 'pending' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_expires_at = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    (worker, now + self.lease_seconds, now, row[0]),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        job_id, vid, source, duration, stage, attempts, outputs = row
+        return Job(id=job_id, video_id=vid, source=source, duration=duration, stage=stage,
+                   attempts=attempts + 1, worker=worker, outputs=json.loads(outputs))
+
+    def _expire_leases(self, now: float):
+        # Called inside a transaction; the expired lease already counted as an attempt
+        expired = self._conn.execute(
+            "SELECT id, source, stage, worker, attempts FROM jobs WHERE state = 'leased' AND lease_expires_at < ?",
+            (now,),
+        ).fetchall()
+        for job_id, source, stage, worker, attempts in expired:
+            state = "pending" if attempts < self.max_attempts else "failed"
+            logger.warning(f"Lease of {worker} on {source} ({stage}) expired, job is {state}")
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires_at = NULL, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (state, f"lease of {worker} expired during {stage}", now, job_id),
+            )
+
+    def heartbeat(self, job: Job) -> bool:
+        """
+        Extend a lease
+
+        Returns:
+            False if the lease was lost (it expired and was re-queued, possibly to another worker)
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                (now + self.lease_seconds, now, job.id, job.worker),
+            )
+        return cursor.rowcount == 1
+
+    def complete_stage(self, job: Job, output: Optional[str] = None) -> bool:
+        """
+        Record that the job's current stage finished and move it to the next one
+
+        The lease is kept for the next stage; after the last stage the job is done.
+
+        Args:
+            job: Leased job, updated in place
+            output: Path of the stage output
+
+        Returns:
+            False if the lease was lost, in which case nothing is recorded
+        """
+        now = time.time()
+        outputs = dict(job.outputs)
+        if output is not None:
+            outputs[job.stage] = output
+        index = STAGES.index(job.stage)
+        next_stage = STAGES[index + 1] if index + 1 < len(STAGES) else job.stage
+        state = "leased" if index + 1 < len(STAGES) else "done"
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET stage = ?, state = ?, outputs = ?, duration = ?, last_error = NULL, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                (next_stage, state, json.dumps(outputs), job.duration, now + self.lease_seconds, now,
+                 job.id, job.worker),
+            )
+        if cursor.rowcount != 1:
+            logger.warning(f"Lost the lease on {job.source} before finishing {job.stage}")
+            return False
+        job.stage = next_stage
+        job.outputs = outputs
+        return True
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> str:
+        """
+        Record a failure of the job's current stage and give up the lease
+
+        Args:
+            job: Leased job
+            error: Failure reason
+            retry: Whether another attempt may succeed (False marks the job failed at once)
+
+        Returns:
+            The new state of the job ("pending" or "failed")
+        """
+        state = "pending" if retry and job.attempts < self.max_attempts else "failed"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires_at = NULL, last_error = ?, updated_at = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                (state, f"{job.stage}: {error}", time.time(), job.id, job.worker),
+            )
+        return state
+
+    def release(self, job: Job):
+        """Give up a lease without counting the attempt (e.g. on worker shutdown)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'pending', worker = NULL, lease_expires_at = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated_at = ? WHERE id = ? AND state = 'leased' AND worker = ?",
+                (time.time(), job.id, job.worker),
+            )
+
+    def retry_failed(self) -> int:
+        """Re-queue every failed job with a fresh attempt budget"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, updated_at = ? WHERE state = 'failed'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of jobs per state and, for unfinished jobs, per stage"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, stage, COUNT(*) FROM jobs GROUP BY state, stage").fetchall()
+        states = {state: 0 for state in JOB_STATES}
+        stages = {stage: {state: 0 for state in ("pending", "leased", "failed")} for stage in STAGES}
+        for state, stage, count in rows:
+            states[state] += count
+            if state != "done":
+                stages[stage][state] += count
+        return {"total": sum(states.values()), "states": states, "stages": stages}
+
+    def failures(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Failed jobs with the stage and reason of their last failure"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, stage, attempts, last_error FROM jobs WHERE state = 'failed' ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [{"source": source, "stage": stage, "attempts": attempts, "error": error}
+                for source, stage, attempts, error in rows]
+
+    def close(self):
+        self._conn.close()
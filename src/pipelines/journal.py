@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Union
+
+from src.entities import Description
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of the descriptions produced for one video.
+
+    The first record is a header holding the run settings; every following record
+    is one finished task (its graph key and Description), flushed and fsynced as
+    soon as it is written. A journal whose header does not match the current run
+    settings is discarded, so a resume never mixes descriptions produced with a
+    different interval, mode or model.
+    """
+
+    def __init__(self, path: Union[str, Path], header: Dict[str, Any]):
+        """
+        Open a journal, loading any records left by an interrupted run
+
+        Args:
+            path: JSONL file of the journal
+            header: Run settings that must match for records to be reused
+        """
+        self.path = Path(path)
+        self.header = header
+        self.entries: Dict[Hashable, Description] = {}
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self._load()
+        if not self.entries:
+            self._write({"type": "header", **header}, mode="w")
+
+    @staticmethod
+    def path_for(directory: Union[str, Path], video_path: str, header: Dict[str, Any]) -> Path:
+        """Journal file for a video and set of run settings"""
+        payload = json.dumps({"video_path": video_path, **header}, sort_keys=True)
+        return Path(directory) / f"{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}.jsonl"
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if not lines:
+            return
+        try:
+            header = json.loads(lines[0])
+        except json.JSONDecodeError:
+            header = None
+        if header != {"type": "header", **self.header}:
+            logger.warning(f"Journal {self.path} was written with different settings, starting over")
+            return
+
+        for line_number, line in enumerate(lines[1:], start=2):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave the last record half-written
+                logger.warning(f"Ignoring truncated record on line {line_number} of {self.path}")
+                continue
+            self.entries[tuple(record["key"])] = Description(**record["description"])
+        logger.info(f"Resuming from journal {self.path} with {len(self.entries)} finished tasks")
+
+        # Rewrite the journal without truncated records before appending to it. The clean copy
+        # replaces the journal only once it is on disk, so a crash here keeps the finished tasks
+        records = [{"type": "header", **self.header}]
+        records += [{"key": list(key), "description": asdict(description)} for key, description in self.entries.items()]
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _write(self, record: Dict[str, Any], mode: str = "a"):
+        with self._lock, open(self.path, mode, encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, key: Hashable, description: Description):
+        """Durably append a finished task"""
+        self.entries[key] = description
+        self._write({"key": list(key), "description": asdict(description)})
+
+    def get(self, key: Hashable) -> Optional[Description]:
+        return self.entries.get(key)
+
+    def remove(self):
+        """Delete the journal once the run has completed"""
+        self.path.unlink(missing_ok=True)
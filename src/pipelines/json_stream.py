@@ -0,0 +1,85 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class JsonObjectStream:
+    """
+    Incremental parser for a JSON array of objects that arrives in chunks.
+
+    Each top-level object is returned by ``feed`` as soon as its closing brace
+    arrives. Text outside objects (a preamble, code fences, commas, the array
+    brackets) is skipped, and an object that does not parse is counted in
+    ``malformed`` and dropped without losing the objects around it. An object
+    still open when the stream ends (a truncated response) is never returned.
+    """
+
+    def __init__(self):
+        self.malformed = 0
+        # Whether the closing bracket of the array has been seen
+        self.complete = False
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def truncated(self) -> bool:
+        """Whether the text so far ends inside an object or before the array was closed"""
+        return self._depth > 0 or not self.complete
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Consume the next chunk of text
+
+        Args:
+            text: Next chunk of the response
+
+        Returns:
+            Objects completed by this chunk, in order
+        """
+        objects = []
+        current = self._current
+        for char in text:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    current.append(char)
+                elif char == "]":
+                    self.complete = True
+                continue
+
+            current.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    parsed = self._parse("".join(current))
+                    current.clear()
+                    if parsed is not None:
+                        objects.append(parsed)
+        return objects
+
+    def _parse(self, text: str):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            self.malformed += 1
+            logger.warning(f"Skipping malformed object in streamed response: {e}")
+            return None
+        if not isinstance(value, dict):
+            self.malformed += 1
+            return None
+        return value
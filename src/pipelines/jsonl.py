@@ -0,0 +1,96 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from src.entities import Description
+
+
+def description_record(description: Description, video_path: Optional[str] = None) -> Dict[str, Any]:
+    """Flat JSON record of a description"""
+    record = {
+        "level": description.level,
+        "timestamp": description.timestamp,
+        "segment_index": description.segment_index,
+        "content": description.content,
+    }
+    if description.start is not None:
+        record["start"], record["end"] = description.start, description.end
+    if description.reused_from is not None:
+        record["reused_from"] = description.reused_from
+    if video_path is not None:
+        record = {"video_path": video_path, **record}
+    return record
+
+
+class JsonlWriter:
+    """
+    Thread-safe writer that appends one JSON record per line and flushes each record.
+
+    Records are written as soon as they are produced, so readers can tail the file
+    and memory does not grow with the number of records.
+    """
+
+    def __init__(self, path: Union[str, Path], mode: str = "a"):
+        """
+        Open the output file
+
+        Args:
+            path: JSONL file to write
+            mode: "a" to append to an existing file, "w" to truncate it
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._file = open(self.path, mode, encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def write_description(self, description: Description, video_path: Optional[str] = None):
+        self.write(description_record(description, video_path))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_jsonl(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Iterate over the records of a JSONL file, skipping blank lines"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_video_analysis(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Rebuild process_video results from a JSONL file of description records
+
+    The file holds the description records of one video, in any order, and a
+    {"run": {...}} record with the other result fields (duration, intervals, usage).
+    Records keep their start/end times, so QA prompts get the same time ranges as
+    from the process_video results.
+    """
+    analysis: Dict[str, Any] = {"level1_descriptions": [], "level2_descriptions": [], "level3_description": None}
+    for record in read_jsonl(path):
+        if "run" in record:
+            analysis.update(record["run"])
+        elif record["level"] == 3:
+            analysis["level3_description"] = record
+        else:
+            analysis[f"level{record['level']}_descriptions"].append(record)
+    analysis["level1_descriptions"].sort(key=lambda record: record["segment_index"])
+    analysis["level2_descriptions"].sort(key=lambda record: record["timestamp"])
+    return analysis
@@ -0,0 +1,406 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Texts are hashed in batches of about this many shingles, with this many permutations at once,
+# which bounds the hashing matrix to _PERMUTATION_BLOCK x _BATCH_SHINGLES 32-bit values
+_BATCH_SHINGLES = 1 << 18
+_PERMUTATION_BLOCK = 32
+
+
+def qa_text(pair: Dict[str, Any]) -> str:
+    """Text of a QA pair that near-duplicate detection compares"""
+    return f"{pair.get('Question', '')} {pair.get('Answer', '')}"
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Number of bands and rows per band for an LSH threshold
+
+    The banding makes pairs with Jaccard similarity s candidates with probability
+    1 - (1 - s^rows)^bands, whose steepest point is near (1 / bands)^(1 / rows).
+    This picks the most rows whose steepest point stays at or below the threshold,
+    so few true duplicates are missed; candidates are verified on their signatures.
+
+    Returns:
+        (bands, rows) with bands * rows == num_perm
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+class QADeduplicator:
+    """
+    Near-duplicate detection of QA pairs with MinHash signatures and LSH banding.
+
+    Pairs are shingled into character k-grams of their normalised question and
+    answer, hashed into MinHash signatures in NumPy batches, and bucketed by band.
+    A pair is a near-duplicate when its estimated Jaccard similarity to an earlier
+    pair in the same bucket reaches the threshold. Pairs that are kept are added
+    to the index, so later batches and videos are checked against them; with a
+    store_path the index is saved as append-only shards and reloaded by later runs.
+    """
+
+    def __init__(self,
+                 threshold: float = 0.8,
+                 num_perm: int = 128,
+                 shingle_size: int = 5,
+                 seed: int = 1,
+                 store_path: Optional[Union[str, Path]] = None):
+        """
+        Initialize the deduplicator
+
+        Args:
+            threshold: Estimated Jaccard similarity from which a pair is a near-duplicate
+            num_perm: MinHash permutations per signature
+            shingle_size: Characters per shingle
+            seed: Seed of the permutations (signatures from different seeds are not comparable)
+            store_path: Directory persisting the signatures of kept pairs (in-memory only if None)
+        """
+        import numpy as np
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_parameters(threshold, num_perm)
+        self.store_path = Path(store_path) if store_path else None
+
+        rng = np.random.default_rng(seed)
+        # Permutations of the 32-bit shingle hashes: x -> a * x + b (mod 2^32) with odd a is a bijection
+        self._a = (rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint32) | np.uint32(1))
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint32)
+
+        self.ids: List[str] = []
+        # Signatures and band keys of the entries, in arrays whose first len(ids) rows are used and whose
+        # capacity doubles, so adding entries copies existing ones only a logarithmic number of times
+        self._signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._keys = np.zeros((0, self.bands), dtype=np.uint64)
+        self._unsaved = 0
+        # Per band: the keys of the entries sorted, and the entry index of each
+        self._sorted: List[Tuple[Any, Any]] = [(np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))
+                                              for _ in range(self.bands)]
+        self._lock = threading.Lock()
+
+        if self.store_path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _settings(self) -> Dict[str, Any]:
+        return {"num_perm": self.num_perm, "bands": self.bands, "rows": self.rows,
+                "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def _load(self):
+        import numpy as np
+
+        meta_path = self.store_path / "meta.json"
+        if not meta_path.exists():
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            settings = json.load(f)["settings"]
+        if settings != self._settings():
+            raise ValueError(f"Signature store {self.store_path} was built with {settings}, not {self._settings()}")
+        signatures, keys = [], []
+        # Shard names start with their creation time, so this loads them oldest first
+        for shard in sorted(self.store_path.glob("signatures-*.npz")):
+            with np.load(shard) as data:
+                signatures.append(data["signatures"])
+                keys.append(data["keys"])
+            with open(shard.with_suffix(".ids.json"), "r", encoding="utf-8") as f:
+                self.ids.extend(json.load(f))
+        if signatures:
+            self._signatures = np.concatenate(signatures)
+            self._keys = np.concatenate(keys)
+            self._sorted = []
+            for band in range(self.bands):
+                order = np.argsort(self._keys[:, band], kind="stable")
+                self._sorted.append((self._keys[order, band], order))
+        logger.info(f"Loaded {len(self.ids)} QA signatures from {self.store_path}")
+
+    def save(self):
+        """
+        Write the signatures added since the last save as a new shard (no-op for an in-memory index)
+
+        Shards have unique names and appear atomically, so several processes can save to one store.
+        """
+        import numpy as np
+
+        if self.store_path is None:
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            end = len(self.ids)
+            start = end - self._unsaved
+            signatures, keys, ids = self._signatures[start:end], self._keys[start:end], self.ids[start:]
+            self._unsaved = 0
+
+        self.store_path.mkdir(parents=True, exist_ok=True)
+        meta_path = self.store_path / "meta.json"
+        if not meta_path.exists():
+            tmp_path = meta_path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"settings": self._settings()}, f)
+            os.replace(tmp_path, meta_path)
+        shard = self.store_path / f"signatures-{time.time_ns()}-{uuid.uuid4().hex[:8]}.npz"
+        with open(shard.with_suffix(".ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        # The shard only counts once its .npz exists
+        tmp_path = shard.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, signatures=signatures, keys=keys)
+        os.replace(tmp_path, shard)
+        logger.info(f"Saved {len(ids)} QA signatures to {shard}")
+
+    def signatures(self, texts: Sequence[str]):
+        """
+        MinHash signatures of texts
+
+        Args:
+            texts: Texts to hash
+
+        Returns:
+            uint32 array of shape (len(texts), num_perm)
+        """
+        import numpy as np
+
+        k = self.shingle_size
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        start = 0
+        while start < len(texts):
+            # Batches bounded by their number of shingles keep the hashing matrix small
+            encoded, shingles = [], 0
+            while start + len(encoded) < len(texts) and (not encoded or shingles < _BATCH_SHINGLES):
+                text = re.sub(r"\W+", " ", texts[start + len(encoded)].lower()).strip().ljust(k)
+                encoded.append(text.encode("utf-8"))
+                shingles += len(encoded[-1]) - k + 1
+            result[start:start + len(encoded)] = self._minhash(encoded)
+            start += len(encoded)
+        return result
+
+    def _minhash(self, encoded: List[bytes]):
+        import numpy as np
+
+        k = self.shingle_size
+        lengths = np.array([len(text) for text in encoded], dtype=np.int64)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        counts = lengths - k + 1
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        # Positions of the shingles, which never cross the end of a text
+        positions = np.repeat(offsets, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+
+        # Polynomial hash of every k-byte window, then mixed into a 32-bit shingle hash
+        hashes = np.zeros(len(positions), dtype=np.uint64)
+        for j in range(k):
+            hashes = hashes * np.uint64(257) + data[positions + j]
+        hashes = ((hashes * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)).astype(np.uint32)
+
+        # Permutations along rows, so the per-text minimum reduces contiguous memory
+        signatures = np.empty((self.num_perm, len(encoded)), dtype=np.uint32)
+        starts = np.cumsum(counts) - counts
+        for block in range(0, self.num_perm, _PERMUTATION_BLOCK):
+            rows = slice(block, block + _PERMUTATION_BLOCK)
+            permuted = hashes[None, :] * self._a[rows] + self._b[rows]
+            signatures[rows] = np.minimum.reduceat(permuted, starts, axis=1)
+        return signatures.T
+
+    def _band_keys(self, signatures):
+        import numpy as np
+
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = np.full((len(signatures), self.bands), 0xCBF29CE484222325, dtype=np.uint64)
+        for row in range(self.rows):
+            keys = (keys ^ bands[:, :, row]) * np.uint64(0x100000001B3)
+        return keys
+
+    def _extend(self, ids: Sequence[str], signatures, keys):
+        """Add entries to the index, merging their keys into the sorted band indexes (lock held)"""
+        import numpy as np
+
+        size = len(self.ids)
+        needed = size + len(ids)
+        if needed > len(self._signatures):
+            capacity = max(needed, 2 * len(self._signatures), 1024)
+            grown_signatures = np.empty((capacity, self.num_perm), dtype=np.uint32)
+            grown_keys = np.empty((capacity, self.bands), dtype=np.uint64)
+            grown_signatures[:size] = self._signatures[:size]
+            grown_keys[:size] = self._keys[:size]
+            self._signatures, self._keys = grown_signatures, grown_keys
+        self._signatures[size:needed] = signatures
+        self._keys[size:needed] = keys
+        self.ids.extend(ids)
+        self._unsaved += len(ids)
+
+        # Only the new keys are sorted; inserting them after equal existing keys keeps the oldest entry first
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            new_keys = keys[order, band]
+            indexed_keys, indexed_order = self._sorted[band]
+            slots = np.searchsorted(indexed_keys, new_keys, side="right")
+            self._sorted[band] = (np.insert(indexed_keys, slots, new_keys),
+                                  np.insert(indexed_order, slots, size + order))
+
+    def find(self, texts: Sequence[str], ids: Sequence[str], add: bool = True) -> List[Optional[str]]:
+        """
+        Find the near-duplicates among texts and of earlier texts
+
+        Args:
+            texts: Texts to check, in order (an earlier text is kept over a later one)
+            ids: Identifiers of the texts
+            add: Add the texts that are not near-duplicates to the index
+
+        Returns:
+            For every text, the id of the earlier text it duplicates, or None
+        """
+        import numpy as np
+
+        if len(texts) != len(ids):
+            raise ValueError("texts and ids must have the same length")
+        if not texts:
+            return []
+        signatures = self.signatures(texts)
+        keys = self._band_keys(signatures)
+        count = len(texts)
+
+        with self._lock:
+            existing = len(self.ids)
+            # Candidates per band: the earliest text of the batch sharing the bucket (index < count),
+            # or the earliest indexed text sharing it (index count + entry)
+            candidates = np.empty((count, self.bands), dtype=np.int64)
+            for band in range(self.bands):
+                order = np.argsort(keys[:, band], kind="stable")
+                sorted_keys = keys[order, band]
+                first_in_run = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+                run_of = np.cumsum(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))) - 1
+                candidates[order, band] = order[first_in_run[run_of]]
+
+                indexed_keys, indexed_order = self._sorted[band]
+                if existing:
+                    slots = np.minimum(np.searchsorted(indexed_keys, keys[:, band]), existing - 1)
+                    found = indexed_keys[slots] == keys[:, band]
+                    candidates[found, band] = count + indexed_order[slots[found]]
+
+            duplicate_of = np.full(count, -1, dtype=np.int64)
+            rows, bands = np.nonzero(candidates != np.arange(count)[:, None])
+            if len(rows):
+                targets = candidates[rows, bands]
+                in_batch = targets < count
+                target_signatures = np.empty((len(rows), self.num_perm), dtype=np.uint32)
+                target_signatures[in_batch] = signatures[targets[in_batch]]
+                target_signatures[~in_batch] = self._signatures[targets[~in_batch] - count]
+                similar = (signatures[rows] == target_signatures).mean(axis=1) >= self.threshold
+                rows, targets = rows[similar], targets[similar]
+            # Bucket collisions may all fail the similarity check
+            if len(rows):
+                # Each text keeps its best target: indexed texts first (oldest first), then the earliest of the batch
+                priority = np.where(targets >= count, targets - count - existing, targets)
+                order = np.lexsort((priority, rows))
+                rows, targets = rows[order], targets[order]
+                first = np.concatenate(([True], rows[1:] != rows[:-1]))
+                duplicate_of[rows[first]] = targets[first]
+
+            result: List[Optional[str]] = []
+            for i in range(count):
+                target = int(duplicate_of[i])
+                if target >= count:
+                    result.append(self.ids[target - count])
+                elif target >= 0:
+                    # The target of a duplicate is never a duplicate itself
+                    root = int(duplicate_of[target])
+                    if root >= 0:
+                        duplicate_of[i] = root
+                        target = root
+                    result.append(self.ids[target - count] if target >= count else ids[target])
+                else:
+                    result.append(None)
+
+            if add:
+                kept = duplicate_of < 0
+                self._extend([id_ for id_, keep in zip(ids, kept) if keep], signatures[kept], keys[kept])
+        return result
+
+    def deduplicate_qa(self, qa: List[Dict[str, Any]], video_id: str, mode: str = "flag") -> List[Dict[str, Any]]:
+        """
+        Drop or flag the near-duplicate QA pairs of one video
+
+        Args:
+            qa: {"level", "qa_pairs"} entries as returned by QAPipeline.process_video_analysis_all_levels
+            video_id: Identifier of the video, used in the ids of its pairs ("<video_id>:<level>:<index>")
+            mode: "flag" adds "duplicate_of" to near-duplicates, "drop" removes them
+
+        Returns:
+            The entries with deduplicated qa_pairs
+        """
+        if mode not in ("flag", "drop"):
+            raise ValueError(f"Unknown mode {mode!r}, expected 'flag' or 'drop'")
+        pairs = [(entry["level"], i, pair) for entry in qa for i, pair in enumerate(entry["qa_pairs"])]
+        duplicates = self.find([qa_text(pair) for _, _, pair in pairs],
+                               [f"{video_id}:{level}:{i}" for level, i, _ in pairs])
+        duplicate_of = {(level, i): target for (level, i, _), target in zip(pairs, duplicates)}
+
+        deduplicated = []
+        for entry in qa:
+            kept = []
+            for i, pair in enumerate(entry["qa_pairs"]):
+                target = duplicate_of[(entry["level"], i)]
+                if target is None:
+                    kept.append(pair)
+                elif mode == "flag":
+                    kept.append({**pair, "duplicate_of": target})
+            deduplicated.append({**entry, "qa_pairs": kept})
+        dropped = sum(target is not None for target in duplicates)
+        logger.info(f"{dropped} of {len(pairs)} QA pairs of {video_id} are near-duplicates")
+        return deduplicated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report near-duplicate QA pairs in job worker outputs")
+    parser.add_argument("output_dir", help="Output directory of the job workers")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--store", help="Signature store directory for incremental runs")
+    parser.add_argument("--report", default="qa_duplicates.jsonl", help="JSONL file listing every near-duplicate")
+    parser.add_argument("--batch-videos", type=int, default=256,
+                        help="Videos whose pairs are hashed and checked in one call")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    deduplicator = QADeduplicator(threshold=args.threshold, num_perm=args.num_perm, store_path=args.store)
+    total = duplicates = 0
+    qa_paths = sorted(Path(args.output_dir).glob("*/qa.json"))
+    with open(args.report, "w", encoding="utf-8") as report:
+        for batch_start in range(0, len(qa_paths), args.batch_videos):
+            ids, pairs = [], []
+            for qa_path in qa_paths[batch_start:batch_start + args.batch_videos]:
+                with open(qa_path, "r", encoding="utf-8") as f:
+                    qa = json.load(f)["qa"]
+                video_id = qa_path.parent.name
+                for entry in qa:
+                    for i, pair in enumerate(entry["qa_pairs"]):
+                        ids.append(f"{video_id}:{entry['level']}:{i}")
+                        pairs.append(pair)
+            for id_, pair, target in zip(ids, pairs, deduplicator.find([qa_text(pair) for pair in pairs], ids)):
+                if target is not None:
+                    report.write(json.dumps({"id": id_, "duplicate_of": target, "question": pair.get("Question")},
+                                            ensure_ascii=False) + "\n")
+                    duplicates += 1
+            total += len(pairs)
+    deduplicator.save()
+    print(f"{duplicates} of {total} QA pairs are near-duplicates, listed in {args.report}")
@@ -2,16 +2,52 @@ import os
 import json
 import logging
 import re  # Add regex module for JSON string sanitization
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Union
 
-from google import genai
-from google.genai import types
+from src.backends.base import response_usage
+from src.pipelines.json_stream import JsonObjectStream
+from src.pipelines.jsonl import JsonlWriter, read_video_analysis
+from src.pipelines.usage import UsageTracker
+from src.backends import CachingBackend, GeminiBackend, ModelBackend, RateLimitedBackend, RateLimiter
+
+if TYPE_CHECKING:
+    from google.genai import types
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+QA_LEVELS = (1, 2, 3)
+
+
+@lru_cache(maxsize=None)
+def multilevel_qa_schema() -> "types.Schema":
+    """Output of the single-call multi-level mode: an array of {Level, Dimension, Question, Answer} objects"""
+    from google.genai import types
+
+    return types.Schema(
+        type=types.Type.ARRAY,
+        items=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "Level": types.Schema(type=types.Type.INTEGER),
+                "Dimension": types.Schema(type=types.Type.STRING),
+                "Question": types.Schema(type=types.Type.STRING),
+                "Answer": types.Schema(type=types.Type.STRING),
+            },
+            required=["Level", "Dimension", "Question", "Answer"],
+            property_ordering=["Level", "Dimension", "Question", "Answer"],
+        ),
+    )
+
+
+def timed_description(start: float, end: float, content: str) -> str:
+    """One line of a timed level-1 or level-2 description listing"""
+    return f"From {start:.1f}s to {end:.1f}s): {content}"
+
+
 class QAPipeline:
     """
     Pipeline for generating question-answer pairs from video descriptions
@@ -24,6 +60,11 @@ class QAPipeline:
         google_api_key: Optional[str] = None,
         task_definition_path: Optional[str] = None,
         temperature: float = 0.5,  # Lower default temperature for more reliable JSON formatting
+        backend: Optional[ModelBackend] = None,
+        cache_path: Optional[str] = None,
+        cache_mode: str = "readwrite",
+        rate_limiter: Optional[RateLimiter] = None,
+        streaming: bool = False,
     ):
         """
         Initialize the QA pipeline.
@@ -33,15 +74,31 @@ class QAPipeline:
             google_api_key: Google API key for Google models
             task_definition_path: Path to task definitions markdown file
             temperature: Temperature for model generation (default: 0.1)
+            backend: Model backend to use instead of the live Gemini API (e.g. FakeBackend, ReplayBackend)
+            cache_path: SQLite file caching model responses across runs (disabled if None)
+            cache_mode: Cache mode, one of "readwrite", "readonly" or "bypass"
+            rate_limiter: Limiter for model calls (the process-wide default if None)
+            streaming: Stream responses and keep every complete QA pair of a truncated or
+                partly malformed response, re-requesting only the missing dimensions
         """
-        api_key = google_api_key or os.environ.get("GOOGLE_API_KEY")
-        logger.debug(f"API key provided for Google models: {api_key is not None}")
-        if not api_key:
-            raise ValueError("Google API key must be provided either as parameter or GOOGLE_API_KEY environment variable")
+        if backend is None:
+            api_key = google_api_key or os.environ.get("GOOGLE_API_KEY")
+            logger.debug(f"API key provided for Google models: {api_key is not None}")
+            backend = GeminiBackend(api_key=api_key)
+        # Cache hits are served before the limiter so they do not consume quota
+        backend = RateLimitedBackend(backend, rate_limiter)
+        if cache_path:
+            backend = CachingBackend(backend, cache_path, mode=cache_mode)
         
-        self.client = genai.Client(api_key=api_key)
+        self.backend = backend
         self.model_name = model_name
         self.temperature = temperature
+        self.streaming = streaming
+        # Usage of every QA generation call made by this pipeline
+        self.usage = UsageTracker()
+        # Counters of the current process_video_descriptions batch
+        self.progress: Dict[str, int] = {"total": 0, "completed": 0, "failed": 0, "qa_pairs": 0}
+        self._progress_lock = threading.Lock()
         logger.info(f"Using Gemini model: {self.model_name} with temperature: {self.temperature}")
 
         # # Check model availability in Gemini
@@ -57,6 +114,8 @@ class QAPipeline:
             base_dir = Path(__file__).parents[2]  # Go up to Vista-VID directory
             default_path = base_dir / "src" / "prompts" / "tasks.md"
             self.task_definitions = self._load_task_definitions(default_path)
+        # Dimension names are the level-2 headings of the task definitions
+        self.dimensions = re.findall(r"^## (.+?)\s*$", self.task_definitions, flags=re.MULTILINE)
             
         # Prepare system message template
         self.system_message_template = self._create_system_message()
@@ -68,6 +127,17 @@ class QAPipeline:
         IMPORTANT: Your response MUST be a valid JSON array containing ONLY the question-answer pairs.
         No explanations, no code blocks, no additional text - just the JSON array.
         """
+        # Single-call mode: the same task and guidelines, with a Level key and the output shape enforced by a schema
+        self.multilevel_system_message_template = self.system_message_template.split("### Output Format Requirements:")[0] + """
+        ### Output Format Requirements:
+        You are given the descriptions of one video at up to three levels of detail. Generate the question-answer
+        pairs separately for every level, following the guidelines above for each level on its own, and set
+        "Level" to the level number the pair was generated from.
+        """
+        self.multilevel_user_message_template = """
+        Please generate question-answer pairs for each level of the following video descriptions:
+        {levels}
+        """
     
     def _load_task_definitions(self, file_path: Union[str, Path]) -> str:
         """Load task definitions from a markdown file."""
@@ -122,13 +192,23 @@ class QAPipeline:
         """
         Generate question-answer pairs for a given video description.
         
+        Transient API errors (429, 5xx) are retried with backoff by the backend's rate
+        limiter; this loop only retries empty responses and responses that cannot be parsed.
+        
         Args:
             caption: The video description
             max_retries: Maximum number of retries on failure
             
         Returns:
             List of dictionaries containing dimension, question, and answer
+            (empty if no attempt returned parseable JSON)
+            
+        Raises:
+            Exception: Any other error of the backend, e.g. BackendError or BudgetExceededError
         """
+        if self.streaming:
+            return list(self.generate_qa_pairs_stream(caption, max_rounds=max_retries))
+        
         logger.debug(f"system message_template: {self.system_message_template}")
         system_message = self.system_message_template.format(task_definitions=self.task_definitions)
         user_message = self.user_message_template.format(caption=caption)
@@ -138,24 +218,30 @@ class QAPipeline:
         attempts = 0
         success = False
         
+        from google.genai import types
+        
+        config = types.GenerateContentConfig(
+            system_instruction=system_message,
+            temperature=self.temperature,
+            max_output_tokens=8192
+        )
+        
         while attempts < max_retries and not success:
             attempts += 1
             try:
                 logger.info(f"Attempt {attempts}/{max_retries} to generate QA pairs")
                 
                 # Send the request to the model
-                response = self.client.models.generate_content(
+                response = self.backend.generate_content(
                     model=self.model_name,
                     contents=user_message,
-                    config=types.GenerateContentConfig(
-                        system_instruction=system_message,
-                        temperature=self.temperature,
-                        max_output_tokens=8192
-                    )
+                    config=config
                 )
+                self.usage.add("qa", response_usage(response))
                 
-                if response.text is None:
-                    raise ValueError("Received empty response from model")
+                if not response.text:
+                    # Retried like an unparsable response
+                    raise json.JSONDecodeError("Received empty response from model", "", 0)
                     
                 raw_text = response.text
                 
@@ -171,22 +257,74 @@ class QAPipeline:
             except json.JSONDecodeError as e:
                 logger.warning(f"Failed to parse JSON response: {e}")
                 
-                if attempts == max_retries:
-                    logger.error(f"Failed to generate valid JSON after {max_retries} attempts")
-                    return []
-                    
-                # Wait a moment before retrying
-                import time
-                time.sleep(1)
+                # Make sure the retry asks the model again instead of replaying a cached response
+                self.backend.invalidate(self.model_name, user_message, config)
                 
-            except Exception as e:
-                logger.error(f"Unexpected error generating QA pairs: {e}")
                 if attempts == max_retries:
-                    logger.error(f"Failed after {max_retries} attempts")
+                    logger.error(f"Failed to generate valid JSON after {max_retries} attempts")
                     return []
         
         return qa_pairs
         
+    def generate_qa_pairs_stream(self, caption: str, max_rounds: int = 3) -> Iterator[Dict[str, str]]:
+        """
+        Stream question-answer pairs for a video description as they are generated.
+        
+        Each pair is yielded as soon as its closing brace arrives. When a response is
+        truncated (e.g. at max_output_tokens) or contains malformed objects, the valid
+        pairs are kept and the next round asks only for the dimensions still missing.
+        
+        Args:
+            caption: The video description
+            max_rounds: Maximum number of requests
+            
+        Yields:
+            Dictionaries containing dimension, question, and answer
+            
+        Raises:
+            Exception: Any error of the backend, e.g. BackendError or BudgetExceededError
+        """
+        system_message = self.system_message_template.format(task_definitions=self.task_definitions)
+        from google.genai import types
+        
+        config = types.GenerateContentConfig(
+            system_instruction=system_message,
+            temperature=self.temperature,
+            max_output_tokens=8192
+        )
+        user_message = self.user_message_template.format(caption=caption)
+        covered = set()
+        
+        for round_index in range(1, max_rounds + 1):
+            logger.info(f"Round {round_index}/{max_rounds} of streamed QA generation")
+            parser = JsonObjectStream()
+            # Usage arrives on the last chunk
+            last_with_usage = None
+            # Backend errors are raised as they are; only truncated or malformed output is re-requested
+            try:
+                for chunk in self.backend.generate_content_stream(model=self.model_name, contents=user_message, config=config):
+                    if getattr(chunk, "usage_metadata", None) is not None:
+                        last_with_usage = chunk
+                    for pair in parser.feed(chunk.text or ""):
+                        if not self._verify_qa_pairs_format([pair]):
+                            parser.malformed += 1
+                            continue
+                        covered.add(pair["Dimension"].strip().lower())
+                        yield pair
+            finally:
+                self.usage.add("qa", response_usage(last_with_usage))
+            
+            if not parser.truncated and not parser.malformed:
+                return
+            missing = [dimension for dimension in self.dimensions if dimension.lower() not in covered]
+            if not missing:
+                return
+            logger.warning(f"Response was {'truncated' if parser.truncated else 'partly malformed'}, "
+                           f"requesting {len(missing)} missing dimensions")
+            user_message = self.user_message_template.format(caption=caption) + (
+                f"\n        Only generate question-answer pairs for these dimensions: {', '.join(missing)}.\n"
+            )
+    
     def _parse_json_response(self, text: str) -> List[Dict[str, str]]:
         """
         Parse the JSON response from the model.
@@ -223,6 +361,73 @@ class QAPipeline:
             
         return qa_pairs
     
+    def generate_multilevel_qa_pairs(self, level_descriptions: Dict[int, str], max_retries: int = 3) -> Dict[int, List[Dict[str, str]]]:
+        """
+        Generate question-answer pairs for several description levels in one request.
+        
+        The response is constrained to multilevel_qa_schema(), so it is parsed directly
+        instead of being cut out of free text. Only a truncated or otherwise unparsable
+        response is retried.
+        
+        Args:
+            level_descriptions: Description text per level
+            max_retries: Maximum number of attempts
+            
+        Returns:
+            QA pairs (with "Dimension", "Question" and "Answer") per requested level
+            
+        Raises:
+            RuntimeError: No attempt returned a parsable response. Backend errors (after the
+                rate limiter's own retries) are raised as they are.
+        """
+        system_message = self.multilevel_system_message_template.format(task_definitions=self.task_definitions)
+        user_message = self.multilevel_user_message_template.format(levels="".join(
+            f"\n        Level {level} description:\n        {text}\n" for level, text in sorted(level_descriptions.items())
+        ))
+        from google.genai import types
+        
+        config = types.GenerateContentConfig(
+            system_instruction=system_message,
+            temperature=self.temperature,
+            max_output_tokens=8192,
+            response_mime_type="application/json",
+            response_schema=multilevel_qa_schema()
+        )
+        
+        for attempt in range(1, max_retries + 1):
+            try:
+                logger.info(f"Attempt {attempt}/{max_retries} to generate QA pairs for levels {sorted(level_descriptions)}")
+                response = self.backend.generate_content(
+                    model=self.model_name,
+                    contents=user_message,
+                    config=config
+                )
+                self.usage.add("qa", response_usage(response))
+                if response.text is None:
+                    raise ValueError("Received empty response from model")
+                qa_pairs = json.loads(response.text)
+                if not isinstance(qa_pairs, list):
+                    raise json.JSONDecodeError("Response is not a list", response.text, 0)
+                break
+            except ValueError as e:
+                # Empty or unparsable response (JSONDecodeError is a ValueError)
+                logger.warning(f"Failed to parse JSON response: {e}")
+                # Make sure the retry asks the model again instead of replaying a cached response
+                self.backend.invalidate(self.model_name, user_message, config)
+                if attempt == max_retries:
+                    raise RuntimeError(f"Failed to generate QA pairs after {max_retries} attempts: {e}") from e
+        
+        results: Dict[int, List[Dict[str, str]]] = {level: [] for level in level_descriptions}
+        for pair in qa_pairs:
+            level = pair.get("Level") if isinstance(pair, dict) else None
+            pair = {key: pair.get(key) for key in ("Dimension", "Question", "Answer")} if level in results else None
+            if pair is None or not self._verify_qa_pairs_format([pair]):
+                logger.warning(f"Dropping malformed QA pair for level {level}")
+                continue
+            results[level].append(pair)
+        logger.info(f"Generated {sum(len(pairs) for pairs in results.values())} QA pairs for {len(results)} levels in one call")
+        return results
+    
     def _verify_qa_pairs_format(self, qa_pairs: List[Dict[str, str]]) -> bool:
         """
         Verify that QA pairs have the correct format.
@@ -254,33 +459,69 @@ class QAPipeline:
                     
         return True
     
-    def process_video_descriptions(self, descriptions: List[str], output_path: Optional[str] = None) -> List[Dict]:
+    def process_video_descriptions(self, descriptions: List[str], output_path: Optional[str] = None,
+                                   max_workers: int = 1,
+                                   jsonl_path: Optional[str] = None,
+                                   on_result: Optional[Callable[[int, Dict], None]] = None) -> List[Dict]:
         """
         Process multiple video descriptions and generate QA pairs for each.
         
+        Descriptions are processed by up to max_workers threads; every model call still
+        goes through the pipeline's (shared) rate limiter. self.progress counts finished
+        and failed descriptions while the batch runs.
+        
         Args:
             descriptions: List of video descriptions
             output_path: Optional path to save results
+            max_workers: Number of descriptions processed at the same time
+            jsonl_path: Optional JSONL file receiving each result (with its "index") as soon as it is ready
+            on_result: Called with the index and result of each description as soon as it is ready
             
         Returns:
-            List of results, each containing the description and generated QA pairs
+            List of results in input order, each containing the description and generated QA pairs.
+            A description that fails gets an empty list plus "error" and "error_type".
         """
-        results = []
+        results: List[Optional[Dict]] = [None] * len(descriptions)
+        with self._progress_lock:
+            self.progress = {"total": len(descriptions), "completed": 0, "failed": 0, "qa_pairs": 0}
         
-        for i, description in enumerate(descriptions):
+        def _process(i: int) -> Dict:
             logger.info(f"Processing description {i+1}/{len(descriptions)}")
-            qa_pairs = self.generate_qa_pairs(description)
+            description = descriptions[i]
+            try:
+                qa_pairs = self.generate_qa_pairs(description)
+            except Exception as e:
+                logger.error(f"Error generating QA pairs for description {i+1}: {e}")
+                return {"description": description, "qa_pairs": [], "error": str(e), "error_type": type(e).__name__}
             
             # Verify QA pairs format
             if not self._verify_qa_pairs_format(qa_pairs):
                 logger.warning(f"QA pairs for description {i+1} failed verification, using empty list")
                 qa_pairs = []
             
-            result = {
+            return {
                 "description": description,
                 "qa_pairs": qa_pairs
             }
-            results.append(result)
+        
+        writer = JsonlWriter(jsonl_path, mode="w") if jsonl_path else None
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_process, i): i for i in range(len(descriptions))}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    result = results[i] = future.result()
+                    with self._progress_lock:
+                        self.progress["completed"] += 1
+                        self.progress["failed"] += "error" in result or not result["qa_pairs"]
+                        self.progress["qa_pairs"] += len(result["qa_pairs"])
+                    if writer is not None:
+                        writer.write({"index": i, **result})
+                    if on_result is not None:
+                        on_result(i, result)
+        finally:
+            if writer is not None:
+                writer.close()
         
         # Save results if output path is provided
         if output_path:
@@ -320,6 +561,40 @@ class QAPipeline:
         Returns:
             List of dictionaries containing dimension, question, and answer
         """
+        all_description = self._level_description(level, video_analysis)
+        if all_description is None:
+            return []
+        
+        logger.debug(f"Processing description: {all_description}")
+        qa_pairs = self.process_single_description(all_description)
+        return qa_pairs
+    
+    def process_video_analysis_all_levels(self, video_analysis: Dict) -> List[Dict]:
+        """
+        Generate QA pairs for every description level of a video in a single model call.
+        
+        Args:
+            video_analysis: Results of VideoDescriptionPipeline.process_video
+            
+        Returns:
+            One {"level", "qa_pairs"} entry per level, like calling process_video_analysis per level
+        """
+        level_descriptions = {}
+        for level in QA_LEVELS:
+            description = self._level_description(level, video_analysis)
+            if description is not None:
+                level_descriptions[level] = description
+        
+        qa_pairs = self.generate_multilevel_qa_pairs(level_descriptions) if level_descriptions else {}
+        return [{"level": level, "qa_pairs": qa_pairs.get(level, [])} for level in QA_LEVELS]
+    
+    def _level_description(self, level: int, video_analysis: Dict) -> Optional[str]:
+        """
+        Description text of one level of a video analysis, or None if the level is empty
+        
+        Level-1 and level-2 descriptions are listed with their "start" and "end" times.
+        Results written before those fields existed fall back to multiples of the level's interval.
+        """
         if level in [1, 2]:
             descriptions: Optional[Union[List, Dict]] = video_analysis.get(f"level{level}_descriptions", None)
             level_interval = video_analysis.get(f"level{level}_interval", 10)
@@ -330,43 +605,46 @@ class QAPipeline:
         
         if not descriptions:
             logger.warning(f"No descriptions found for level {level}")
-            return []
+            return None
 
         if isinstance(descriptions, list):
             all_description = ""
             for i, desc in enumerate(descriptions):
                 content = desc["content"]
-                if level_interval:
+                if "start" in desc and "end" in desc:
+                    description = timed_description(desc["start"], desc["end"], content)
+                elif level_interval:
                     start = i * level_interval
                     end = min(start + level_interval, video_analysis["duration"])
-                    description = f"From {start:.1f}s to {end:.1f}s): {content}"
+                    description = timed_description(start, end, content)
                 else:
                     description = content
                 all_description += f"\n{description}"
         else:
             all_description = descriptions["content"]
-            
-        logger.debug(f"Processing description: {all_description}")
-        qa_pairs = self.process_single_description(all_description)
-        return qa_pairs
+        return all_description
         
         
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    
     # Load environment variables (assuming they are set)
-    pipeline = QAPipeline()
+    pipeline = QAPipeline(cache_path=os.environ.get("RESPONSE_CACHE_PATH"))
     
-    # Load the YouTube video analysis JSON file
-    json_path = Path(__file__).parents[2] / "youtube_video_analysis.json"
-    with open(json_path, 'r') as f:
-        video_analysis = json.load(f)
+    # Load the YouTube video analysis streamed by main.py
+    video_analysis = read_video_analysis(Path(__file__).parents[2] / "youtube_video_analysis.jsonl")
     
-    results = []
-    for level in [1, 2, 3]:
-        qa_pairs = pipeline.process_video_analysis(level, video_analysis)
-        results.append({
-            "level": level,
-            "qa_pairs": qa_pairs
-        })
+    if os.environ.get("QA_SINGLE_CALL", "1") != "0":
+        # One schema-constrained request for all three levels
+        results = pipeline.process_video_analysis_all_levels(video_analysis)
+    else:
+        results = []
+        for level in [1, 2, 3]:
+            qa_pairs = pipeline.process_video_analysis(level, video_analysis)
+            results.append({
+                "level": level,
+                "qa_pairs": qa_pairs
+            })
     
     # Optionally, save all results to a file
     output_path = Path(__file__).parents[2] / "qa_results.json"
@@ -0,0 +1,138 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TaskNode:
+    """A unit of work in a TaskGraph"""
+    key: Hashable
+    fn: Callable[[], Any]
+    deps: Tuple[Hashable, ...] = ()
+    priority: Tuple = ()
+    dependents: List[Hashable] = field(default_factory=list)
+
+
+class TaskGraph:
+    """
+    Dependency-aware wavefront scheduler.
+
+    Nodes are submitted to a thread pool as soon as all of their dependencies have
+    finished, with at most ``max_workers`` running at once. When several nodes are
+    ready the one with the lowest ``priority`` runs first, which lets callers keep
+    the critical path (e.g. the level-2 chain) moving ahead of bulk work.
+
+    Node functions take no arguments; they read the outputs of their dependencies
+    from ``graph.results``, which is safe because a node only starts after all of
+    its dependencies have stored their results.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[Hashable, TaskNode] = {}
+        self.results: Dict[Hashable, Any] = {}
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, fn: Callable[[], Any], deps: Sequence[Hashable] = (),
+            priority: Tuple = ()) -> Hashable:
+        """
+        Add a node to the graph
+
+        Args:
+            key: Unique node key
+            fn: Zero-argument callable producing the node result
+            deps: Keys of nodes that must finish first (must already be in the graph)
+            priority: Sort key among ready nodes, lower runs first
+
+        Returns:
+            The node key
+        """
+        if key in self.nodes:
+            raise ValueError(f"Duplicate task {key!r}")
+        for dep in deps:
+            if dep not in self.nodes:
+                raise ValueError(f"Task {key!r} depends on unknown task {dep!r}")
+        self.nodes[key] = TaskNode(key=key, fn=fn, deps=tuple(dict.fromkeys(deps)), priority=(priority, next(self._order)))
+        for dep in self.nodes[key].deps:
+            self.nodes[dep].dependents.append(key)
+        return key
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.nodes
+
+    def critical_path_length(self) -> int:
+        """Number of nodes on the longest dependency chain"""
+        depth: Dict[Hashable, int] = {}
+        for key, node in self.nodes.items():  # insertion order is topological
+            depth[key] = 1 + max((depth[dep] for dep in node.deps), default=0)
+        return max(depth.values(), default=0)
+
+    def run(self, max_workers: int = 4,
+            on_complete: Optional[Callable[[Hashable, Any], None]] = None) -> Dict[Hashable, Any]:
+        """
+        Execute every node that does not already have a result
+
+        Args:
+            max_workers: Maximum number of nodes running at once
+            on_complete: Optional callback invoked with (key, result) as each node finishes
+
+        Returns:
+            Mapping of node key to result
+
+        Raises:
+            Exception: The first exception raised by a node, after running nodes have finished
+        """
+        remaining = {key: sum(1 for dep in node.deps if dep not in self.results)
+                     for key, node in self.nodes.items() if key not in self.results}
+        ready: List[Tuple[Tuple, Hashable]] = []
+        for key, count in remaining.items():
+            if count == 0:
+                heapq.heappush(ready, (self.nodes[key].priority, key))
+
+        running: Dict[Future, Hashable] = {}
+        error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while ready or running:
+                while ready and len(running) < max_workers and error is None:
+                    _, key = heapq.heappop(ready)
+                    running[executor.submit(self.nodes[key].fn)] = key
+
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    if future.exception() is not None:
+                        if error is None:
+                            error = future.exception()
+                            logger.error(f"Task {key!r} failed: {error}")
+                        continue
+
+                    result = future.result()
+                    with self._lock:
+                        self.results[key] = result
+                    if on_complete is not None:
+                        on_complete(key, result)
+
+                    for dependent in self.nodes[key].dependents:
+                        if dependent not in remaining:
+                            continue
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            heapq.heappush(ready, (self.nodes[dependent].priority, dependent))
+
+                if error is not None:
+                    ready.clear()
+
+        if error is not None:
+            raise error
+
+        return self.results
@@ -0,0 +1,257 @@
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from src.pipelines.dataset import description_records
+from src.pipelines.jobs import video_id as source_video_id
+
+logger = logging.getLogger(__name__)
+
+# Searchable record kinds
+RECORD_KINDS = ("description", "qa")
+
+# Full-text columns of the index, weighted for BM25 (a match in a question counts more than in an answer)
+_TEXT_COLUMNS = ("content", "question", "answer")
+_BM25_WEIGHTS = (1.0, 2.0, 1.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    video_path TEXT,
+    kind TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    segment_index INTEGER,
+    timestamp REAL,
+    dimension TEXT,
+    content TEXT,
+    question TEXT,
+    answer TEXT
+);
+CREATE INDEX IF NOT EXISTS records_video_id ON records (video_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    content, question, answer, content='records', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS records_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts (rowid, content, question, answer) VALUES (new.id, new.content, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS records_delete AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, content, question, answer)
+    VALUES ('delete', old.id, old.content, old.question, old.answer);
+END;
+"""
+
+
+def match_query(text: str) -> str:
+    """FTS5 query matching every word of free text, so punctuation never reads as query syntax"""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+class SearchIndex:
+    """
+    Incremental full-text index of descriptions and QA pairs on SQLite FTS5.
+
+    Every description (its content) and QA pair (its question and answer) is one
+    record, filterable by video id, kind, level, timestamp and dimension. Indexing a
+    video replaces its previous records, so it is safe to repeat. Matches are ranked
+    with BM25, and only the matching records are filtered, so queries stay fast on
+    millions of records.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Open (and create if needed) the index
+
+        Args:
+            path: SQLite file holding the index
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def add_video(self, results: Dict[str, Any], qa: Optional[Iterable[Dict[str, Any]]] = None,
+                  video_id: Optional[str] = None) -> int:
+        """
+        Index (or re-index) one video
+
+        Args:
+            results: VideoDescriptionPipeline.process_video results
+            qa: {"level", "qa_pairs"} entries as returned by QAPipeline.process_video_analysis_all_levels
+            video_id: Identifier of the video (derived from results["video_path"] if None)
+
+        Returns:
+            Number of records indexed
+        """
+        video_path = results["video_path"]
+        video_id = video_id or source_video_id(video_path)
+        rows = [
+            (video_id, video_path, "description", record["level"], record.get("segment_index"),
+             record.get("timestamp"), None, record["content"], None, None)
+            for record in description_records(results)
+        ]
+        for entry in qa or []:
+            rows.extend(
+                (video_id, video_path, "qa", entry["level"], None, None,
+                 pair.get("Dimension"), None, pair.get("Question"), pair.get("Answer"))
+                for pair in entry["qa_pairs"]
+            )
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM records WHERE video_id = ?", (video_id,))
+                self._conn.executemany(
+                    "INSERT INTO records (video_id, video_path, kind, level, segment_index, timestamp, dimension, "
+                    "content, question, answer) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.debug(f"Indexed {len(rows)} records of {video_path}")
+        return len(rows)
+
+    def remove_video(self, video_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM records WHERE video_id = ?", (video_id,))
+
+    def search(self,
+               query: str,
+               kind: Optional[str] = None,
+               video_ids: Optional[Iterable[str]] = None,
+               levels: Optional[Iterable[int]] = None,
+               dimensions: Optional[Iterable[str]] = None,
+               start_time: Optional[float] = None,
+               end_time: Optional[float] = None,
+               limit: int = 20,
+               raw: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find records matching a query, best first
+
+        Args:
+            query: Words that must all occur (or an FTS5 query if raw)
+            kind: Only "description" or only "qa" records
+            video_ids: Only these videos
+            levels: Only these levels
+            dimensions: Only QA pairs of these dimensions
+            start_time: Only descriptions with a timestamp at or after this second
+            end_time: Only descriptions with a timestamp at or before this second
+            limit: Maximum number of records
+            raw: Pass query to FTS5 unchanged (phrases, OR, NEAR, column filters, prefixes)
+
+        Returns:
+            Matching records with their BM25 "score" (lower is better)
+        """
+        if kind is not None and kind not in RECORD_KINDS:
+            raise ValueError(f"Unknown record kind {kind!r}, expected one of {RECORD_KINDS}")
+        match = query if raw else match_query(query)
+        if not match:
+            return []
+
+        conditions = ["records_fts MATCH ?"]
+        params: List[Any] = [match]
+        if kind is not None:
+            conditions.append("r.kind = ?")
+            params.append(kind)
+        for column, values in (("r.video_id", video_ids), ("r.level", levels), ("r.dimension", dimensions)):
+            if values is not None:
+                values = list(values)
+                conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if start_time is not None:
+            conditions.append("r.timestamp >= ?")
+            params.append(start_time)
+        if end_time is not None:
+            conditions.append("r.timestamp <= ?")
+            params.append(end_time)
+
+        sql = (
+            "SELECT r.video_id, r.video_path, r.kind, r.level, r.segment_index, r.timestamp, r.dimension, "
+            f"r.content, r.question, r.answer, bm25(records_fts, {', '.join(map(str, _BM25_WEIGHTS))}) AS score "
+            "FROM records_fts JOIN records r ON r.id = records_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} ORDER BY score LIMIT ?"
+        )
+        params.append(limit)
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return [{name: value for name, value in zip(names, row) if value is not None} for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """Number of indexed videos and records per kind"""
+        with self._lock:
+            videos = self._conn.execute("SELECT COUNT(DISTINCT video_id) FROM records").fetchone()[0]
+            counts = dict(self._conn.execute("SELECT kind, COUNT(*) FROM records GROUP BY kind").fetchall())
+        return {"videos": videos, **{kind: counts.get(kind, 0) for kind in RECORD_KINDS}}
+
+    def optimize(self):
+        """Merge the FTS5 segments, e.g. after a large bulk load"""
+        with self._lock:
+            self._conn.execute("INSERT INTO records_fts (records_fts) VALUES ('optimize')")
+
+    def close(self):
+        self._conn.close()
+
+
+def index_outputs(output_dir: Union[str, Path], index: SearchIndex) -> int:
+    """
+    Index the describe and qa outputs of JobWorker runs
+
+    Returns:
+        Number of videos indexed
+    """
+    count = 0
+    for describe_path in sorted(Path(output_dir).glob("*/describe.json")):
+        with open(describe_path, "r", encoding="utf-8") as f:
+            results = json.load(f)
+        qa = None
+        qa_path = describe_path.with_name("qa.json")
+        if qa_path.exists():
+            with open(qa_path, "r", encoding="utf-8") as f:
+                qa = json.load(f)["qa"]
+        index.add_video(results, qa, video_id=describe_path.parent.name)
+        count += 1
+    index.optimize()
+    logger.info(f"Indexed {count} videos")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Full-text search over descriptions and QA pairs")
+    parser.add_argument("--index", default="search.sqlite", help="SQLite file of the index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index the outputs of the job workers")
+    build.add_argument("output_dir")
+    query = commands.add_parser("query", help="Search the index")
+    query.add_argument("text")
+    query.add_argument("--kind", choices=RECORD_KINDS)
+    query.add_argument("--level", type=int, action="append", dest="levels")
+    query.add_argument("--dimension", action="append", dest="dimensions")
+    query.add_argument("--video-id", action="append", dest="video_ids")
+    query.add_argument("--start", type=float, help="Earliest description timestamp in seconds")
+    query.add_argument("--end", type=float, help="Latest description timestamp in seconds")
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--raw", action="store_true", help="Use FTS5 query syntax")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = SearchIndex(args.index)
+    if args.command == "build":
+        print(f"Indexed {index_outputs(args.output_dir, index)} videos")
+    else:
+        for record in index.search(args.text, kind=args.kind, video_ids=args.video_ids, levels=args.levels,
+                                   dimensions=args.dimensions, start_time=args.start, end_time=args.end,
+                                   limit=args.limit, raw=args.raw):
+            print(json.dumps(record, ensure_ascii=False))
+    index.close()
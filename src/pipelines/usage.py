@@ -0,0 +1,93 @@
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+# prompt_text_tokens is the local estimate of the prompt's text alone (no video), when reported
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "total_token_count",
+                "cached_content_token_count", "prompt_text_tokens")
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a video or batch has used up its token or cost budget"""
+
+
+class UsageTracker:
+    """
+    Thread-safe token usage totals grouped by label (e.g. "level1", "level2", "qa").
+
+    Costs are estimated from per-million-token prices for prompt and output tokens;
+    with the default prices of 0 only token counts are meaningful.
+    """
+
+    def __init__(self, input_price_per_million: float = 0.0, output_price_per_million: float = 0.0):
+        """
+        Initialize the tracker
+
+        Args:
+            input_price_per_million: Price of one million prompt tokens
+            output_price_per_million: Price of one million output tokens
+        """
+        self.input_price_per_million = input_price_per_million
+        self.output_price_per_million = output_price_per_million
+        self._totals: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(("calls",) + USAGE_FIELDS, 0))
+        self._lock = threading.Lock()
+
+    def add(self, label: str, usage: Optional[Dict[str, int]]):
+        """Record one call's usage under a label"""
+        with self._lock:
+            totals = self._totals[label]
+            totals["calls"] += 1
+            for name in USAGE_FIELDS:
+                totals[name] += int((usage or {}).get(name, 0) or 0)
+
+    def cost(self, usage: Dict[str, int]) -> float:
+        """Estimated cost of a usage dict"""
+        return (usage.get("prompt_token_count", 0) * self.input_price_per_million
+                + usage.get("candidates_token_count", 0) * self.output_price_per_million) / 1_000_000
+
+    def totals(self) -> Dict[str, Dict[str, Any]]:
+        """Usage and estimated cost per label plus an overall "total" entry"""
+        with self._lock:
+            labels = {label: dict(totals) for label, totals in self._totals.items()}
+        overall = dict.fromkeys(("calls",) + USAGE_FIELDS, 0)
+        for totals in labels.values():
+            for name, value in totals.items():
+                overall[name] += value
+        labels["total"] = overall
+        for totals in labels.values():
+            totals["estimated_cost"] = self.cost(totals)
+        return labels
+
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(totals["total_token_count"] for totals in self._totals.values())
+
+    def total_cost(self) -> float:
+        return self.totals()["total"]["estimated_cost"]
+
+    def check_budget(self, max_tokens: Optional[int] = None, max_cost: Optional[float] = None, scope: str = "run"):
+        """
+        Raise if the recorded usage has reached a budget
+
+        Raises:
+            BudgetExceededError: If max_tokens or max_cost has been reached
+        """
+        if max_tokens is not None and self.total_tokens() >= max_tokens:
+            raise BudgetExceededError(f"Token budget of {max_tokens} for this {scope} exhausted")
+        if max_cost is not None and self.total_cost() >= max_cost:
+            raise BudgetExceededError(f"Cost budget of {max_cost} for this {scope} exhausted")
+
+    def export(self, path: Union[str, Path], extra: Optional[Dict[str, Any]] = None):
+        """Write the totals to a JSON metrics file"""
+        metrics = {
+            "exported_at": datetime.now().isoformat(),
+            "input_price_per_million": self.input_price_per_million,
+            "output_price_per_million": self.output_price_per_million,
+            "usage": self.totals(),
+            **(extra or {}),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
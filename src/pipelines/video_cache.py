@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from src.backends.base import CachedContent, ModelBackend
+
+logger = logging.getLogger(__name__)
+
+# A cache costs a create call, storage for its TTL and a delete call, so it only pays
+# off when at least this many calls of a run reference the whole video
+MIN_CACHED_CALLS = 2
+
+
+class VideoCache:
+    """
+    Explicit context cache holding one video for the duration of a run.
+
+    The cache is created the first time a call asks for its name within the run,
+    so a run whose calls never need the whole video does not pay for it, and it is
+    deleted on exit. Runs should only enter it when at least MIN_CACHED_CALLS of
+    their calls use the whole video; otherwise sending the video inline is cheaper. Its TTL is extended lazily: a caller asking for the name when
+    less than half the TTL is left refreshes it first. When the backend or model
+    does not support caching (or the video is too short to be cached), ``name``
+    stays None and callers send the video inline.
+    """
+
+    def __init__(self, backend: ModelBackend, model: str, video_uri: str, ttl_seconds: float = 3600.0):
+        """
+        Initialize the cache handle
+
+        Args:
+            backend: Backend that creates, refreshes and deletes the cache
+            model: Model the cache is created for (calls must use the same model)
+            video_uri: URI of the uploaded video
+            ttl_seconds: Lifetime of the cache, extended while the run is still using it
+        """
+        self.backend = backend
+        self.model = model
+        self.video_uri = video_uri
+        self.ttl_seconds = ttl_seconds
+        self.cache: Optional[CachedContent] = None
+        self._expires_at = 0.0
+        self._active = False
+        self._attempted = False
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> Optional[str]:
+        """Name of the live cache to reference, or None to send the video inline"""
+        with self._lock:
+            if self.cache is None:
+                if not self._active or self._attempted:
+                    return None
+                # Other callers wait here rather than creating a second cache
+                self._attempted = True
+                self._create()
+                return self.cache.name if self.cache is not None else None
+            if self._expires_at - time.monotonic() < self.ttl_seconds / 2:
+                try:
+                    self.cache = self.backend.update_cache(self.cache.name, self.ttl_seconds)
+                    self._expires_at = time.monotonic() + self.ttl_seconds
+                    logger.info(f"Extended context cache {self.cache.name} by {self.ttl_seconds}s")
+                except Exception as e:
+                    # The cache is still valid until its old expiry; try again on the next call
+                    logger.warning(f"Cannot extend context cache {self.cache.name}: {e}")
+            return self.cache.name
+
+    def __enter__(self) -> "VideoCache":
+        self._active = True
+        self._attempted = False
+        return self
+
+    def _create(self):
+        from google.genai import types
+
+        contents = types.Content(role="user", parts=[types.Part(file_data=types.FileData(file_uri=self.video_uri))])
+        try:
+            self.cache = self.backend.create_cache(self.model, contents, self.ttl_seconds,
+                                                   display_name=f"video:{self.video_uri}")
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            logger.info(f"Created context cache {self.cache.name} ({self.cache.token_count} tokens) for {self.video_uri}")
+        except NotImplementedError:
+            logger.warning("Backend does not support context caching, sending the video with every call")
+        except Exception as e:
+            logger.warning(f"Cannot create context cache for {self.video_uri}, sending the video with every call: {e}")
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._active = False
+            cache, self.cache = self.cache, None
+        if cache is None:
+            return
+        try:
+            self.backend.delete_cache(cache.name)
+            logger.info(f"Deleted context cache {cache.name}")
+        except Exception as e:
+            # The cache expires on its own at the end of its TTL
+            logger.warning(f"Cannot delete context cache {cache.name}: {e}")
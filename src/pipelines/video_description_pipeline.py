@@ -1,23 +1,64 @@
+import contextlib
 import os
-from typing import List, Dict, Optional, Tuple
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Hashable, Iterator, List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import json
 from pathlib import Path
 import logging
 
-from google import genai
-from google.genai import types
-
-from src.entities import VideoSegment, Description
+from src.backends.base import estimate_text_tokens, response_usage
+from src.backends import CachingBackend, GeminiBackend, ModelBackend, RateLimitedBackend, RateLimiter, UploadRegistry
+from src.entities import VideoSegment, Description, VideoRun
+from src.media.clips import CLIP_MODES, ffmpeg_available
+from src.media.duration import probe_duration
+from src.media.phash import find_duplicates, segment_signatures
+from src.media.scenes import detect_scene_segments
+from src.pipelines.clips import ClipSet
+from src.pipelines.dedupe import SegmentHashIndex
+from src.pipelines.journal import RunJournal
+from src.pipelines.scheduler import TaskGraph
+from src.pipelines.usage import BudgetExceededError, UsageTracker
+from src.pipelines.video_cache import MIN_CACHED_CALLS, VideoCache
 from src.prompts.factory import PromptFactory
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+if TYPE_CHECKING:
+    from google.genai import types
+
 logger = logging.getLogger(__name__)
 
 # VideoSegment and Description classes are now imported from factory.py
 
+# Level-1 generation modes:
+# - sequential: every segment sees the previous level-1 and latest level-2 (original behaviour)
+# - parallel: no context, all segments run concurrently
+# - anchor: every `anchor_stride`-th segment is described first and used as context for the following ones
+# - two_pass: parallel context-free drafts, then a parallel refinement pass that sees neighbouring drafts
+LEVEL1_MODES = ("sequential", "parallel", "anchor", "two_pass")
+
+# Segmentation modes:
+# - fixed: level-1 segments of exactly level1_interval seconds (original behaviour)
+# - scenes: local files are cut at shot changes, within min/max segment lengths
+SEGMENTATION_MODES = ("fixed", "scenes")
+
+
+class _ConsumerStopped(Exception):
+    """Raised in a run of iter_process_video once its consumer has stopped iterating"""
+
+
+def clip_timeline_note(start: float, end: float, mode: str = "copy") -> str:
+    """Text sent after a clip, telling the model which part of the video the clip holds"""
+    note = (f"The attached clip is the part of the video from {start:.1f}s to {end:.1f}s. Its own timeline starts "
+            f"at 0s, which is {start:.1f}s in the video")
+    if mode == "copy":
+        # Stream-copied clips start at the keyframe at or before start
+        note += f" (it may begin slightly before {start:.1f}s)"
+    return note + ". Times in the instructions below are times in the video."
+
+
 class VideoDescriptionPipeline:
     """
     Hierarchical video description pipeline implementing three-level approach using Gemini's native video understanding:
@@ -30,7 +71,35 @@ class VideoDescriptionPipeline:
                  google_api_key: Optional[str] = None,
                  level1_interval: int = 10,
                  level2_interval: int = 30,
-                 model_name: str = "models/gemini-2.5-flash-preview-05-20"):
+                 model_name: str = "models/gemini-2.5-flash-preview-05-20",
+                 backend: Optional[ModelBackend] = None,
+                 level1_mode: str = "sequential",
+                 max_concurrency: int = 4,
+                 anchor_stride: int = 6,
+                 cache_path: Optional[str] = None,
+                 cache_mode: str = "readwrite",
+                 upload_registry_path: Optional[str] = None,
+                 journal_dir: Optional[str] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_video_tokens: Optional[int] = None,
+                 max_video_cost: Optional[float] = None,
+                 input_price_per_million: float = 0.0,
+                 output_price_per_million: float = 0.0,
+                 context_budgets: Optional[Dict[int, int]] = None,
+                 video_cache: bool = False,
+                 video_cache_ttl: float = 3600.0,
+                 segmentation: str = "fixed",
+                 min_segment_length: Optional[float] = None,
+                 max_segment_length: Optional[float] = None,
+                 dedupe_segments: bool = False,
+                 dedupe_max_distance: int = 4,
+                 dedupe_max_entries: Optional[int] = 20000,
+                 segment_index_path: Optional[str] = None,
+                 clip_mode: Optional[str] = None,
+                 clip_dir: Optional[str] = None,
+                 clip_height: int = 360,
+                 clip_fps: float = 1.0,
+                 clip_bitrate: str = "250k"):
         """
         Initialize the pipeline
         
@@ -39,12 +108,60 @@ class VideoDescriptionPipeline:
             level1_interval: Seconds between level-1 descriptions
             level2_interval: Seconds between level-2 descriptions
             model_name: Gemini model to use (must support video understanding)
+            backend: Model backend to use instead of the live Gemini API (e.g. FakeBackend, ReplayBackend)
+            level1_mode: One of LEVEL1_MODES, controls how much context each level-1 call sees
+            max_concurrency: Maximum number of concurrent model calls in the parallel level-1 modes
+            anchor_stride: Number of segments covered by each anchor in "anchor" mode
+            cache_path: SQLite file caching model responses across runs (disabled if None)
+            cache_mode: Cache mode, one of "readwrite", "readonly" or "bypass"
+            upload_registry_path: JSON file remembering uploaded files across runs (in-memory only if None)
+            journal_dir: Directory of per-video journals used to resume interrupted runs (disabled if None)
+            rate_limiter: Limiter for model calls (the process-wide default if None)
+            max_video_tokens: Stop a video once its calls have used this many tokens
+            max_video_cost: Stop a video once its estimated cost reaches this amount
+            input_price_per_million: Price of one million prompt tokens, used for cost estimates
+            output_price_per_million: Price of one million output tokens, used for cost estimates
+            context_budgets: Maximum context tokens per prompt level, e.g. {1: 400, 2: 1500, 3: 3000} (unbounded if None)
+            video_cache: Put each uploaded video in an explicit context cache referenced by its whole-video calls,
+                when a run has at least MIN_CACHED_CALLS of them (the level-3 overview is currently the only one)
+            video_cache_ttl: Seconds the context cache lives, extended while the run is still using it
+            segmentation: One of SEGMENTATION_MODES, controls where level-1 segments start and end
+            min_segment_length: Shortest scene segment (defaults to half of level1_interval)
+            max_segment_length: Longest scene segment (defaults to level2_interval)
+            dedupe_segments: Reuse level-1 descriptions of visually identical segments instead of calling the model
+            dedupe_max_distance: Largest per-frame perceptual hash distance (of 64 bits) of identical segments
+            dedupe_max_entries: Most segments kept in the shared index, least recently used evicted first (unbounded if None)
+            segment_index_path: JSON file keeping segment hashes and descriptions across runs (in-memory only if None)
+            clip_mode: Cut local videos into per-call clips before upload, one of CLIP_MODES (disabled if None).
+                "copy" clips cannot be smaller than the original, so that mode uploads the original once instead
+            clip_dir: Directory keeping the clips for later runs (temporary if None)
+            clip_height: Height of transcoded clips
+            clip_fps: Frame rate of transcoded clips
+            clip_bitrate: Video bitrate of transcoded clips
         """
-        api_key = google_api_key or os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("Google API key must be provided either as parameter or GOOGLE_API_KEY environment variable")
+        if level1_mode not in LEVEL1_MODES:
+            raise ValueError(f"Unknown level1_mode {level1_mode!r}, expected one of {LEVEL1_MODES}")
+        if max_concurrency < 1 or anchor_stride < 1:
+            raise ValueError("max_concurrency and anchor_stride must be at least 1")
+        if segmentation not in SEGMENTATION_MODES:
+            raise ValueError(f"Unknown segmentation {segmentation!r}, expected one of {SEGMENTATION_MODES}")
+        if clip_mode is not None and clip_mode not in CLIP_MODES:
+            raise ValueError(f"Unknown clip_mode {clip_mode!r}, expected one of {CLIP_MODES}")
+        if clip_mode is not None and video_cache:
+            raise ValueError("clip_mode and video_cache cannot be combined: clips replace the cached whole video")
+        if clip_mode == "copy":
+            logger.warning("Stream-copied clips cannot upload fewer bytes than the original, "
+                           "so clip_mode='copy' uploads the original once and seeks with offsets")
         
-        self.client = genai.Client(api_key=api_key)
+        if backend is None:
+            backend = GeminiBackend(api_key=google_api_key or os.environ.get("GOOGLE_API_KEY"))
+        backend = UploadRegistry(backend, upload_registry_path)
+        # Cache hits are served before the limiter so they do not consume quota
+        backend = RateLimitedBackend(backend, rate_limiter)
+        if cache_path:
+            backend = CachingBackend(backend, cache_path, mode=cache_mode)
+        
+        self.backend = backend
         self.model_name = model_name
         logger.info(f"Using Gemini model: {self.model_name}")
 
@@ -55,8 +172,31 @@ class VideoDescriptionPipeline:
         
         self.level1_interval = level1_interval
         self.level2_interval = level2_interval
+        self.level1_mode = level1_mode
+        self.max_concurrency = max_concurrency
+        self.anchor_stride = anchor_stride
+        self.journal_dir = journal_dir
+        self.max_video_tokens = max_video_tokens
+        self.max_video_cost = max_video_cost
+        self.input_price_per_million = input_price_per_million
+        self.output_price_per_million = output_price_per_million
+        self.context_budgets = context_budgets or {}
+        self.video_cache = video_cache
+        self.video_cache_ttl = video_cache_ttl
+        self.segmentation = segmentation
+        self.min_segment_length = min_segment_length or level1_interval / 2
+        self.max_segment_length = max_segment_length or max(level2_interval, level1_interval)
+        # Shared by every video of this pipeline, so recurring intros and outros are described once
+        self.segment_index = SegmentHashIndex(segment_index_path, dedupe_max_distance,
+                                              dedupe_max_entries) if dedupe_segments else None
+        self.clip_mode = clip_mode
+        self.clip_dir = clip_dir
+        self.clip_options = {"height": clip_height, "fps": clip_fps, "video_bitrate": clip_bitrate}
+        # Usage of every call made by this pipeline, grouped by task kind
+        self.usage = self._new_usage_tracker()
         
-        # Storage for descriptions
+        # Storage for descriptions built step by step with the generate_level*_description methods.
+        # process_video keeps its own per-video state in a VideoRun and does not touch these.
         self.level1_descriptions: List[Description] = []
         self.level2_descriptions: List[Description] = []
         self.level3_description: Optional[Description] = None
@@ -65,6 +205,9 @@ class VideoDescriptionPipeline:
         """
         Upload video to Gemini and return file URI
         
+        Uploads go through an UploadRegistry, so a file that was already uploaded
+        and has not expired is reused, and the returned file is ACTIVE.
+        
         Args:
             video_path: Path to the video file
             
@@ -74,7 +217,7 @@ class VideoDescriptionPipeline:
         logger.info(f"Uploading video: {video_path}")
         
         # Upload file to Gemini
-        uploaded_file = self.client.files.upload(path=video_path)
+        uploaded_file = self.backend.upload_file(video_path)
         logger.info(f"Video uploaded with URI: {uploaded_file.uri}")
         
         return uploaded_file.uri
@@ -84,87 +227,111 @@ class VideoDescriptionPipeline:
         Get video duration using appropriate library based on video source
         
         Args:
-            video_uri: URI of the uploaded video or path to video file
+            video_uri: URL of the video or path to a local video file
             
         Returns:
             Duration in seconds
+            
+        Raises:
+            FileNotFoundError: If a local file does not exist
+            ValueError: If the duration of a local file or direct URL cannot be determined
         """
         logger.info("Getting video duration...")
         
+        if "://" not in video_uri and not video_uri.startswith("file-") and not os.path.exists(video_uri):
+            raise FileNotFoundError(f"Video file not found: {video_uri}")
+        
+        # Handle YouTube URLs
+        if "youtube.com" in video_uri or "youtu.be" in video_uri:
+            return self._get_youtube_duration(video_uri)
+        
+        # Handle Gemini file URIs
+        if video_uri.startswith(('gs://', 'file-')):
+            # For Gemini URIs, we can't directly get the duration
+            # Use a reasonable default duration
+            logger.warning("Cannot determine duration for Gemini file URI, using default duration")
+            return 300.0
+        
+        # Handle local files or other direct video URLs: read the container header first
         try:
-            # Handle YouTube URLs
-            if "youtube.com" in video_uri or "youtu.be" in video_uri:
-                import pytube
-                try:
-                    # Use pytube to get video length
-                    yt = pytube.YouTube(video_uri)
-                    duration = yt.length
-                    logger.info(f"YouTube video duration: {duration} seconds")
-                    return float(duration)
-                except Exception as yt_error:
-                    logger.error(f"Error with pytube: {yt_error}")
-                    # Fallback to yt-dlp if available
-                    try:
-                        import yt_dlp
-                        
-                        ydl_opts = {
-                            'quiet': True,
-                            'no_warnings': True,
-                            'skip_download': True,
-                            'format': 'best',
-                        }
-                        
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            info = ydl.extract_info(video_uri, download=False)
-                            duration = info.get('duration', 0)
-                            logger.info(f"YouTube video duration (via yt-dlp): {duration} seconds")
-                            return float(duration)
-                    except Exception as ydl_error:
-                        logger.error(f"Error with yt-dlp: {ydl_error}")
-                        # If both methods fail, use default duration
-                        logger.warning("Using default duration for YouTube video")
-                        return 300.0
-            # Handle Gemini file URIs
-            elif video_uri.startswith(('gs://', 'file-')):
-                # For Gemini URIs, we can't directly get the duration
-                # Use a reasonable default duration
-                logger.warning("Cannot determine duration for Gemini file URI, using default duration")
-                return 300.0
-            # Handle local files or other direct video URLs
-            else:
-                from moviepy.editor import VideoFileClip
-                
-                # For local files, use the path directly
-                video_path = video_uri
-                if video_uri.startswith(('http://', 'https://')):
-                    # For HTTP URLs, download temporarily or stream
-                    import tempfile
-                    import requests
-                    
-                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                    with requests.get(video_uri, stream=True) as r:
-                        r.raise_for_status()
-                        for chunk in r.iter_content(chunk_size=8192):
-                            temp_file.write(chunk)
-                    temp_file.close()
-                    video_path = temp_file.name
-                
-                # Get duration using moviepy
-                clip = VideoFileClip(video_path)
-                duration = clip.duration
-                clip.close()
-                
-                # Clean up temp file if created
-                if video_uri.startswith(('http://', 'https://')) and 'temp_file' in locals():
-                    import os
-                    os.unlink(temp_file.name)
-                    
-                logger.info(f"Video duration: {duration} seconds")
+            duration = probe_duration(video_uri)
+            if duration:
+                logger.info(f"Video duration (from container header): {duration} seconds")
                 return duration
+            logger.info("Container header not recognised, falling back to moviepy")
+        except Exception as e:
+            logger.warning(f"Error reading container header: {e}, falling back to moviepy")
+        
+        try:
+            duration = self._get_moviepy_duration(video_uri)
         except Exception as e:
-            logger.error(f"Error getting video duration: {e}")
-            logger.warning("Using default duration estimation of 300 seconds")
-            return 300.0  # Default 5 minutes
+            raise ValueError(f"Cannot determine duration of {video_uri}: {e}") from e
+        logger.info(f"Video duration: {duration} seconds")
+        return duration
+    
+    def _get_youtube_duration(self, video_uri: str) -> float:
+        """Get the duration of a YouTube video with pytube, falling back to yt-dlp"""
+        try:
+            import pytube
+            # Use pytube to get video length
+            yt = pytube.YouTube(video_uri)
+            duration = yt.length
+            logger.info(f"YouTube video duration: {duration} seconds")
+            return float(duration)
+        except Exception as yt_error:
+            logger.error(f"Error with pytube: {yt_error}")
+        
+        # Fallback to yt-dlp if available
+        try:
+            import yt_dlp
+            
+            ydl_opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'skip_download': True,
+                'format': 'best',
+            }
+            
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(video_uri, download=False)
+                duration = info.get('duration', 0)
+                logger.info(f"YouTube video duration (via yt-dlp): {duration} seconds")
+                return float(duration)
+        except Exception as ydl_error:
+            logger.error(f"Error with yt-dlp: {ydl_error}")
+            # If both methods fail, use default duration
+            logger.warning("Using default duration for YouTube video")
+            return 300.0
+    
+    def _get_moviepy_duration(self, video_uri: str) -> float:
+        """Last-resort duration probe that decodes the file with moviepy (downloads HTTP sources in full)"""
+        from moviepy.editor import VideoFileClip
+        import tempfile
+        
+        # For local files, use the path directly
+        video_path = video_uri
+        temp_file = None
+        if video_uri.startswith(('http://', 'https://')):
+            # For HTTP URLs, download temporarily
+            import requests
+            
+            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+            with requests.get(video_uri, stream=True) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=1 << 20):
+                    temp_file.write(chunk)
+            temp_file.close()
+            video_path = temp_file.name
+        
+        try:
+            clip = VideoFileClip(video_path)
+            duration = clip.duration
+            clip.close()
+        finally:
+            # Clean up temp file if created
+            if temp_file is not None:
+                os.unlink(temp_file.name)
+        return duration
     
     def _create_video_segments(self, duration: float) -> List[VideoSegment]:
         """
@@ -194,6 +361,26 @@ class VideoDescriptionPipeline:
         logger.info(f"Created {len(segments)} video segments")
         return segments
     
+    def _create_scene_segments(self, video_path: str, duration: float) -> List[VideoSegment]:
+        """
+        Create segments cut at shot changes, falling back to fixed segments
+        
+        Args:
+            video_path: Path to the local video file
+            duration: Total video duration in seconds
+            
+        Returns:
+            List of VideoSegment objects
+        """
+        if video_path.startswith(('http://', 'https://', 'gs://')) or not os.path.exists(video_path):
+            logger.warning(f"Scene segmentation needs a local file, using fixed segments for {video_path}")
+            return self._create_video_segments(duration)
+        try:
+            return detect_scene_segments(video_path, duration, self.min_segment_length, self.max_segment_length)
+        except Exception as e:
+            logger.warning(f"Scene detection failed for {video_path}, using fixed segments: {e}")
+            return self._create_video_segments(duration)
+    
     def generate_level1_description(self, video_uri: str, segment: VideoSegment) -> Description:
         """
         Generate Level-1 description for a video segment
@@ -205,45 +392,58 @@ class VideoDescriptionPipeline:
         Returns:
             Description object with level-1 content
         """
-        logger.info(f"Generating Level-1 description for segment {segment.segment_index} ({segment.start_time}s-{segment.end_time}s)")
-        
         # Prepare context
         context = self._build_level1_context(segment.segment_index)
         
-        # Create prompt
-        prompt = self._create_level1_prompt(segment, context)
+        description = self._describe_level1(video_uri, segment, self._create_level1_prompt(segment, context))
+        self.usage.add("level1", description.usage)
+        
+        self.level1_descriptions.append(description)
+        return description
+    
+    def _describe_level1(self, video_uri: str, segment: VideoSegment, prompt: str,
+                         video_cache: Optional[VideoCache] = None,
+                         clips: Optional[ClipSet] = None) -> Description:
+        """
+        Call the model for one level-1 segment without touching pipeline state
+        
+        Args:
+            video_uri: URI of the uploaded video
+            segment: VideoSegment to analyze
+            prompt: Level-1 (or refinement) prompt
+            video_cache: Context cache holding the video, if any
+            clips: Locally cut clips of the video, if any
+            
+        Returns:
+            Description object with level-1 content
+        """
+        logger.info(f"Generating Level-1 description for segment {segment.segment_index} ({segment.start_time}s-{segment.end_time}s)")
         
         # Create content with video segment
-        content_parts = [
-            types.Part(
-                file_data=types.FileData(file_uri=video_uri),
-                video_metadata=types.VideoMetadata(
-                    start_offset=f'{int(segment.start_time)}s',
-                    end_offset=f'{int(segment.end_time)}s'
-                )
-            ),
-            types.Part(text=prompt)
-        ]
+        from google.genai import types
+        
+        content_parts, cached_content = self._video_parts(video_uri, video_cache, clips,
+                                                          start=segment.start_time, end=segment.end_time)
+        content_parts.append(types.Part(text=prompt))
         
         # Call Gemini
-        response = self.client.models.generate_content(
+        response = self.backend.generate_content(
             model=self.model_name,
             contents=types.Content(parts=content_parts),
             config=types.GenerateContentConfig(
                 max_output_tokens=1024,
-                temperature=0.1
+                temperature=0.1,
+                cached_content=cached_content
             )
         )
         
-        description = Description(
+        return Description(
             level=1,
             timestamp=segment.start_time,
             content=response.text.strip(),
-            segment_index=segment.segment_index
+            segment_index=segment.segment_index,
+            usage=self._call_usage(response, prompt)
         )
-        
-        self.level1_descriptions.append(description)
-        return description
     
     def generate_level2_description(self, video_uri: str, current_time: float) -> Description:
         """
@@ -256,49 +456,74 @@ class VideoDescriptionPipeline:
         Returns:
             Description object with level-2 content
         """
-        logger.info(f"Generating Level-2 description at {current_time}s")
-        
-        # Get the last 3 level-1 descriptions
-        recent_level1 = self._get_recent_level1_descriptions(3)
+        # Get the last 3 level-1 descriptions up to the current time
+        recent_level1 = self._get_recent_level1_descriptions(3, before=current_time)
         
         # Get the latest level-2 description
         latest_level2 = self.level2_descriptions[-1] if self.level2_descriptions else None
         
+        description = self._describe_level2(video_uri, current_time, recent_level1, latest_level2,
+                                            segment_index=len(self.level2_descriptions))
+        self.usage.add("level2", description.usage)
+        
+        self.level2_descriptions.append(description)
+        return description
+    
+    def _describe_level2(self, video_uri: str, current_time: float,
+                         recent_level1: List[Description],
+                         latest_level2: Optional[Description],
+                         segment_index: int,
+                         video_cache: Optional[VideoCache] = None,
+                         start_time: Optional[float] = None,
+                         clips: Optional[ClipSet] = None) -> Description:
+        """
+        Call the model for one level-2 summary without touching pipeline state
+        
+        Args:
+            video_uri: URI of the uploaded video
+            current_time: Timestamp the summary covers up to
+            recent_level1: Level-1 descriptions leading up to current_time
+            latest_level2: Previous level-2 summary if any
+            segment_index: Index of this summary in the level-2 chain
+            video_cache: Context cache holding the video, if any
+            start_time: Start of the summarised window (defaults to level2_interval before current_time)
+            clips: Locally cut clips of the video, if any
+            
+        Returns:
+            Description object with level-2 content
+        """
+        logger.info(f"Generating Level-2 description at {current_time}s")
+        
         # Create prompt
         prompt = self._create_level2_prompt(recent_level1, latest_level2, current_time)
         
-        content_parts = [
-            types.Part(
-                file_data=types.FileData(file_uri=video_uri),
-                video_metadata=types.VideoMetadata(
-                    start_offset=f'{int(current_time - self.level2_interval)}s',
-                    end_offset=f'{int(current_time)}s'
-                )
-            ),
-            types.Part(text=prompt)
-        ]
+        if start_time is None:
+            start_time = max(current_time - self.level2_interval, 0)
+        from google.genai import types
+        
+        content_parts, cached_content = self._video_parts(video_uri, video_cache, clips,
+                                                          start=start_time, end=current_time)
+        content_parts.append(types.Part(text=prompt))
         
         # For level-2, we can either use the recent segment or provide context without video
         # Using text-only generation with context from level-1 descriptions
-        response = self.client.models.generate_content(
+        response = self.backend.generate_content(
             model=self.model_name,
             contents=types.Content(parts=content_parts),
             config=types.GenerateContentConfig(
                 max_output_tokens=2048,
-                temperature=0.1
+                temperature=0.1,
+                cached_content=cached_content
             )
         )
         
-        segment_index = len(self.level2_descriptions)
-        description = Description(
+        return Description(
             level=2,
             timestamp=current_time,
             content=response.text.strip(),
-            segment_index=segment_index
+            segment_index=segment_index,
+            usage=self._call_usage(response, prompt)
         )
-        
-        self.level2_descriptions.append(description)
-        return description
     
     def generate_level3_description(self, video_uri: str, total_duration: float) -> Description:
         """
@@ -311,8 +536,6 @@ class VideoDescriptionPipeline:
         Returns:
             Description object with level-3 content
         """
-        logger.info("Generating Level-3 description (complete overview)")
-        
         # Get recent unsummarized level-1 descriptions
         last_level2_time = self.level2_descriptions[-1].timestamp if self.level2_descriptions else 0
         unsummarized_level1 = [desc for desc in self.level1_descriptions 
@@ -321,32 +544,271 @@ class VideoDescriptionPipeline:
         # Get the latest level-2 description
         latest_level2 = self.level2_descriptions[-1] if self.level2_descriptions else None
         
+        self.level3_description = self._describe_level3(video_uri, total_duration, unsummarized_level1, latest_level2)
+        self.usage.add("level3", self.level3_description.usage)
+        return self.level3_description
+    
+    def _describe_level3(self, video_uri: str, total_duration: float,
+                         unsummarized_level1: List[Description],
+                         latest_level2: Optional[Description],
+                         video_cache: Optional[VideoCache] = None,
+                         clips: Optional[ClipSet] = None) -> Description:
+        """
+        Call the model for the level-3 overview without touching pipeline state
+        
+        Args:
+            video_uri: URI of the uploaded video
+            total_duration: Total duration of the video
+            unsummarized_level1: Level-1 descriptions after the last level-2 summary
+            latest_level2: Last level-2 summary if any
+            video_cache: Context cache holding the video, if any
+            clips: Locally cut clips of the video, if any
+            
+        Returns:
+            Description object with level-3 content
+        """
+        logger.info("Generating Level-3 description (complete overview)")
+        
         # Create prompt
         prompt = self._create_level3_prompt(unsummarized_level1, latest_level2, total_duration)
         
         # For level-3, we can analyze the entire video for a comprehensive overview
-        content_parts = [
-            types.Part(file_data=types.FileData(file_uri=video_uri)),
-            types.Part(text=prompt)
-        ]
+        from google.genai import types
+        
+        content_parts, cached_content = self._video_parts(video_uri, video_cache, clips)
+        content_parts.append(types.Part(text=prompt))
         
-        response = self.client.models.generate_content(
+        response = self.backend.generate_content(
             model=self.model_name,
             contents=types.Content(parts=content_parts),
             config=types.GenerateContentConfig(
                 max_output_tokens=2048,
-                temperature=0.1
+                temperature=0.1,
+                cached_content=cached_content
             )
         )
         
-        self.level3_description = Description(
+        return Description(
             level=3,
             timestamp=total_duration,
             content=response.text.strip(),
-            segment_index=0
+            segment_index=0,
+            usage=self._call_usage(response, prompt)
         )
+    
+    @staticmethod
+    def _video_parts(video_uri: str, video_cache: Optional[VideoCache] = None, clips: Optional[ClipSet] = None,
+                     start: Optional[float] = None, end: Optional[float] = None) -> Tuple[List["types.Part"], Optional[str]]:
+        """
+        Video part of a request and the context cache it references
         
-        return self.level3_description
+        A call on the whole video references the context cache, if any, instead of
+        sending the video again. Calls on a part never use the cache: it holds the whole
+        video, so they would be billed for all of it instead of their [start, end].
+        With clips, a level-1 window gets its uploaded clip, followed by a note mapping
+        the clip's own timeline to the video's, since the prompts give times in the
+        video's timeline; other windows use the uploaded whole video with offsets, so
+        each part of the video is uploaded once as a clip and once in the whole video.
+        Otherwise the uploaded video is sent with [start, end] as offsets.
+        
+        Args:
+            video_uri: URI of the uploaded video
+            video_cache: Context cache holding the video, if any
+            clips: Locally cut clips of the video, if any
+            start: Start of the part to describe in seconds (whole video if None)
+            end: End of the part to describe in seconds
+            
+        Returns:
+            The content parts so far and the cache name to set as cached_content (or None)
+        """
+        from google.genai import types
+        
+        if start is None and video_cache is not None:
+            cached_content = video_cache.name
+            if cached_content is not None:
+                return [], cached_content
+        if clips is not None:
+            try:
+                if start is None:
+                    return [types.Part(file_data=types.FileData(file_uri=clips.full_uri()))], None
+                if clips.has_clip(start, end):
+                    return [types.Part(file_data=types.FileData(file_uri=clips.uri(start, end))),
+                            types.Part(text=clip_timeline_note(start, end, clips.mode))], None
+                # Other windows (level-2 summaries) seek in the whole video instead of uploading more clips of it
+                video_uri = clips.full_uri()
+            except Exception as e:
+                if start is None:
+                    raise
+                logger.warning(f"Clip {start}s-{end}s unavailable, sending the whole video with offsets: {e}")
+                video_uri = clips.full_uri()
+        video_metadata = None
+        if start is not None:
+            video_metadata = types.VideoMetadata(start_offset=f'{int(start)}s', end_offset=f'{int(end)}s')
+        return [types.Part(file_data=types.FileData(file_uri=video_uri), video_metadata=video_metadata)], None
+    
+    def _build_task_graph(self, video_uri: str, segments: List[VideoSegment], duration: float,
+                          video_cache: Optional[VideoCache] = None,
+                          duplicates: Optional[Dict[int, int]] = None,
+                          clips: Optional[ClipSet] = None) -> TaskGraph:
+        """
+        Build the dependency graph of all model calls for one video
+        
+        Nodes are keyed ("level1", i), ("draft", i), ("level2", j) and ("level3", 0):
+        - level-1 dependencies follow level1_mode (previous level-1 and latest level-2
+          in "sequential", the anchor in "anchor", neighbouring drafts in "two_pass")
+        - level-2 window j depends on the level-1 segments it summarises and level-2 j-1
+        - level-3 depends on the last level-2 and any level-1 after it
+        
+        Args:
+            video_uri: URI of the uploaded video
+            segments: Level-1 segments in order
+            duration: Total video duration
+            video_cache: Context cache holding the video, referenced by whole-video calls
+            duplicates: Segment index -> earlier segment index it looks identical to; these
+                segments copy that segment's description (and draft) instead of calling the model
+            clips: Locally cut clips of the video, used instead of offsets into video_uri
+            
+        Returns:
+            TaskGraph ready to run
+        """
+        graph = TaskGraph()
+        results = graph.results
+        
+        def _level1_priority(index: int) -> Tuple:
+            return (1, index)
+        
+        # Level-2 checkpoints: segment index each level-2 window ends on -> level-2 index
+        checkpoints = [segment.segment_index for segment in segments if self._is_level2_checkpoint(segment, duration)]
+        level2_at = {segment_index: j for j, segment_index in enumerate(checkpoints)}
+        # Latest level-2 finished before each segment starts (sequential mode context)
+        latest_level2_before: Dict[int, Optional[int]] = {}
+        latest = None
+        for segment in segments:
+            latest_level2_before[segment.segment_index] = latest
+            latest = level2_at.get(segment.segment_index, latest)
+        # Scene segments vary in length, so each level-2 window covers every segment since the previous checkpoint
+        previous_checkpoint = dict(zip(checkpoints, [-1] + checkpoints[:-1]))
+        
+        duplicates = duplicates or {}
+        
+        if self.level1_mode == "two_pass":
+            for segment in segments:
+                i = segment.segment_index
+                if i in duplicates:
+                    graph.add(("draft", i), self._reused_task(results, ("draft", duplicates[i]), segment),
+                              deps=[("draft", duplicates[i])], priority=_level1_priority(i))
+                else:
+                    graph.add(("draft", i), self._level1_task(video_uri, segment, video_cache, clips, lambda: {}),
+                              priority=_level1_priority(i))
+        
+        for segment in segments:
+            i = segment.segment_index
+            deps: List[Tuple] = []
+            
+            if i in duplicates:
+                deps.append(("level1", duplicates[i]))
+                task = self._reused_task(results, ("level1", duplicates[i]), segment)
+            elif self.level1_mode == "sequential":
+                if i > 0:
+                    deps.append(("level1", i - 1))
+                if latest_level2_before[i] is not None:
+                    deps.append(("level2", latest_level2_before[i]))
+                
+                def _context(i=i) -> Dict:
+                    level2_index = latest_level2_before[i]
+                    return {
+                        "previous_level1": results[("level1", i - 1)].content if i > 0 else None,
+                        "latest_level2": results[("level2", level2_index)].content if level2_index is not None else None,
+                    }
+                task = self._level1_task(video_uri, segment, video_cache, clips, _context)
+            elif self.level1_mode == "parallel":
+                task = self._level1_task(video_uri, segment, video_cache, clips, lambda: {})
+            elif self.level1_mode == "anchor":
+                anchor_index = i - i % self.anchor_stride
+                if anchor_index == i:
+                    task = self._level1_task(video_uri, segment, video_cache, clips, lambda: {})
+                else:
+                    deps.append(("level1", anchor_index))
+                    
+                    def _context(anchor_index=anchor_index) -> Dict:
+                        anchor = results[("level1", anchor_index)]
+                        return {"anchor_level1": anchor.content, "anchor_timestamp": anchor.timestamp}
+                    task = self._level1_task(video_uri, segment, video_cache, clips, _context)
+            else:
+                neighbours = [j for j in (i - 1, i, i + 1) if 0 <= j < len(segments)]
+                deps.extend(("draft", j) for j in neighbours)
+                
+                def _refine(segment=segment, i=i) -> Description:
+                    context = {
+                        "previous_draft": results[("draft", i - 1)].content if ("draft", i - 1) in results else None,
+                        "current_draft": results[("draft", i)].content,
+                        "next_draft": results[("draft", i + 1)].content if ("draft", i + 1) in results else None,
+                    }
+                    return self._describe_level1(video_uri, segment, PromptFactory.create_level1_refine_prompt(
+                        segment, context, context_budget=self.context_budgets.get(1)), video_cache, clips)
+                task = _refine
+            
+            graph.add(("level1", i), task, deps=deps, priority=_level1_priority(i))
+            
+            if i in level2_at:
+                j = level2_at[i]
+                current_time = segment.end_time
+                if self.segmentation == "fixed":
+                    window = list(range(max(0, i - 2), i + 1))
+                else:
+                    window = list(range(previous_checkpoint[i] + 1, i + 1))
+                window_start = segments[window[0]].start_time
+                level2_deps = [("level1", k) for k in window]
+                if j > 0:
+                    level2_deps.append(("level2", j - 1))
+                
+                def _level2(current_time=current_time, window=window, window_start=window_start, j=j) -> Description:
+                    recent_level1 = [results[("level1", k)] for k in window]
+                    latest_level2 = results[("level2", j - 1)] if j > 0 else None
+                    return self._describe_level2(video_uri, current_time, recent_level1, latest_level2,
+                                                 segment_index=j, video_cache=video_cache,
+                                                 start_time=window_start if self.segmentation != "fixed" else None,
+                                                 clips=clips)
+                
+                # Level-2 nodes are on the critical path, schedule them ahead of pending level-1 work
+                graph.add(("level2", j), _level2, deps=level2_deps, priority=(0, j))
+        
+        last_level2 = len(checkpoints) - 1
+        last_level2_time = segments[checkpoints[-1]].end_time if checkpoints else 0
+        unsummarized = [segment.segment_index for segment in segments if segment.start_time > last_level2_time]
+        level3_deps = [("level1", i) for i in unsummarized]
+        if last_level2 >= 0:
+            level3_deps.append(("level2", last_level2))
+        
+        def _level3() -> Description:
+            latest_level2 = results[("level2", last_level2)] if last_level2 >= 0 else None
+            return self._describe_level3(video_uri, duration, [results[("level1", i)] for i in unsummarized], latest_level2,
+                                         video_cache, clips)
+        
+        graph.add(("level3", 0), _level3, deps=level3_deps, priority=(0, len(checkpoints)))
+        return graph
+    
+    @staticmethod
+    def _reused_task(results: Dict, source_key: Tuple, segment: VideoSegment) -> Callable[[], Description]:
+        """Task copying the description of an identical earlier segment"""
+        def _task() -> Description:
+            source = results[source_key]
+            return Description(
+                level=source.level,
+                timestamp=segment.start_time,
+                content=source.content,
+                segment_index=segment.segment_index,
+                reused_from=source.reused_from or f"segment {source.segment_index}",
+            )
+        return _task
+    
+    def _level1_task(self, video_uri: str, segment: VideoSegment, video_cache: Optional[VideoCache],
+                     clips: Optional[ClipSet], context_fn: Callable[[], Dict]) -> Callable[[], Description]:
+        """Wrap a level-1 call whose context is resolved when the task starts"""
+        def _task() -> Description:
+            return self._describe_level1(video_uri, segment, self._create_level1_prompt(segment, context_fn()),
+                                         video_cache, clips)
+        return _task
     
     def _build_level1_context(self, segment_index: int) -> Dict:
         """Build context for level-1 description generation"""
@@ -365,105 +827,411 @@ class VideoDescriptionPipeline:
         
         return context
     
-    def _get_recent_level1_descriptions(self, count: int) -> List[Description]:
-        """Get the most recent level-1 descriptions"""
-        return self.level1_descriptions[-count:] if len(self.level1_descriptions) >= count else self.level1_descriptions
+    def _get_recent_level1_descriptions(self, count: int, before: Optional[float] = None) -> List[Description]:
+        """Get the most recent level-1 descriptions, optionally only those starting before a timestamp"""
+        descriptions = self.level1_descriptions
+        if before is not None:
+            descriptions = [desc for desc in descriptions if desc.timestamp < before]
+        return descriptions[-count:] if len(descriptions) >= count else descriptions
+    
+    def _is_level2_checkpoint(self, segment: VideoSegment, duration: float) -> bool:
+        """Whether a level-2 summary is due at the end of this segment"""
+        if segment.end_time >= duration - 1:
+            return True
+        if self.segmentation == "fixed":
+            return (segment.segment_index + 1) * self.level1_interval % self.level2_interval == 0
+        # Scene segments: the segment crosses (or ends on) a multiple of level2_interval
+        return segment.end_time // self.level2_interval > segment.start_time // self.level2_interval
+    
+    @staticmethod
+    def _call_usage(response, prompt: str) -> Dict[str, int]:
+        """Reported usage of a call plus the local estimate of its prompt text tokens"""
+        return {**response_usage(response), "prompt_text_tokens": estimate_text_tokens(prompt)}
     
     def _create_level1_prompt(self, segment: VideoSegment, context: Dict) -> str:
         """Create prompt for level-1 description"""
-        return PromptFactory.create_level1_prompt(segment, context)
+        return PromptFactory.create_level1_prompt(segment, context, context_budget=self.context_budgets.get(1))
     
     def _create_level2_prompt(self, recent_level1: List[Description], 
                             latest_level2: Optional[Description], 
                             current_time: float) -> str:
         """Create prompt for level-2 description"""
-        return PromptFactory.create_level2_prompt(recent_level1, latest_level2, current_time)
+        return PromptFactory.create_level2_prompt(recent_level1, latest_level2, current_time,
+                                                  context_budget=self.context_budgets.get(2))
     
     def _create_level3_prompt(self, unsummarized_level1: List[Description], 
                             latest_level2: Optional[Description], 
                             total_duration: float) -> str:
         """Create prompt for level-3 description"""
-        return PromptFactory.create_level3_prompt(unsummarized_level1, latest_level2, total_duration)
+        return PromptFactory.create_level3_prompt(unsummarized_level1, latest_level2, total_duration,
+                                                  context_budget=self.context_budgets.get(3))
     
-    def process_video(self, video_path: str) -> Dict[str, any]:
+    def process_video(self, video_path: str, duration: Optional[float] = None,
+                      on_description: Optional[Callable[[Description], None]] = None) -> Dict[str, any]:
         """
         Process a complete video through the hierarchical description pipeline
         
+        All per-video state lives in a VideoRun, so one pipeline instance can process
+        several videos concurrently (see process_videos).
+        
         Args:
             video_path: Path to the video file or URL
+            duration: Known video duration in seconds (skips the duration probe)
+            on_description: Called with each level-1, level-2 and level-3 description as soon as it exists
             
         Returns:
             Dictionary containing all generated descriptions
         """
         logger.info(f"Starting video processing: {video_path}")
         
-        # Reset state
-        self.level1_descriptions = []
-        self.level2_descriptions = []
-        self.level3_description = None
+        run = self._prepare_run(video_path, duration)
+        self._execute_run(run, on_description=on_description)
+        
+        logger.info("Video processing completed successfully")
+        return self._compile_results(run)
+    
+    def iter_process_video(self, video_path: str, duration: Optional[float] = None,
+                           max_pending: int = 16) -> Iterator[Description]:
+        """
+        Process a video and yield each description as soon as it exists
+        
+        Descriptions arrive in completion order, so level-1 segments may interleave with
+        level-2 summaries; level-3 always comes last. Descriptions restored from a journal
+        are yielded first. When the consumer stops iterating (or closes the generator),
+        no further model calls are started; calls already running finish in the background.
+        
+        Args:
+            video_path: Path to the video file or URL
+            duration: Known video duration in seconds (skips the duration probe)
+            max_pending: Descriptions buffered for a slow consumer before the run waits for it
+            
+        Yields:
+            Description objects of every level
+        """
+        done = object()
+        descriptions: queue.Queue = queue.Queue(maxsize=max_pending)
+        stop = threading.Event()
+        
+        def _deliver(item) -> bool:
+            # Wait for room in the queue, giving up once the consumer has stopped
+            while not stop.is_set():
+                try:
+                    descriptions.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def _on_description(description: Description):
+            if not _deliver(description):
+                raise _ConsumerStopped(f"Consumer of {video_path} descriptions stopped")
+        
+        def _worker():
+            try:
+                self.process_video(video_path, duration=duration, on_description=_on_description)
+                _deliver(done)
+            except _ConsumerStopped:
+                logger.info(f"Stopped processing {video_path}: its descriptions are no longer consumed")
+            except BaseException as e:
+                _deliver(e)
+        
+        thread = threading.Thread(target=_worker, name=f"iter_process_video:{video_path}", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = descriptions.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Also reached on GeneratorExit when the consumer closes the generator early
+            stop.set()
+        thread.join()
+    
+    def process_videos(self, sources: List[str], max_workers: int = 4,
+                       durations: Optional[List[Optional[float]]] = None,
+                       max_batch_tokens: Optional[int] = None,
+                       max_batch_cost: Optional[float] = None) -> List[Dict[str, any]]:
+        """
+        Process several videos concurrently with one shared backend
+        
+        Args:
+            sources: Video paths or URLs
+            max_workers: Number of videos processed at the same time
+            durations: Optional known durations aligned with sources
+            max_batch_tokens: Do not start further videos once the batch has used this many tokens
+            max_batch_cost: Do not start further videos once the batch's estimated cost reaches this amount
+            
+        Returns:
+            One result per source, in input order. Failed videos produce
+            {"video_path", "error", "error_type"} instead of aborting the batch;
+            videos skipped by the batch budget fail with BudgetExceededError.
+        """
+        if durations is not None and len(durations) != len(sources):
+            raise ValueError("durations must have the same length as sources")
+        durations = durations or [None] * len(sources)
+        
+        # The batch is charged with everything self.usage records while it runs
+        start_tokens = self.usage.total_tokens()
+        start_cost = self.usage.total_cost()
+        
+        def _process(item: Tuple[str, Optional[float]]) -> Dict[str, any]:
+            source, duration = item
+            try:
+                if max_batch_tokens is not None and self.usage.total_tokens() - start_tokens >= max_batch_tokens:
+                    raise BudgetExceededError(f"Token budget of {max_batch_tokens} for this batch exhausted")
+                if max_batch_cost is not None and self.usage.total_cost() - start_cost >= max_batch_cost:
+                    raise BudgetExceededError(f"Cost budget of {max_batch_cost} for this batch exhausted")
+                return self.process_video(source, duration=duration)
+            except Exception as e:
+                logger.error(f"Error processing video {source}: {e}")
+                return {"video_path": source, "error": str(e), "error_type": type(e).__name__}
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_process, zip(sources, durations)))
+        
+        failed = sum(1 for result in results if "error" in result)
+        logger.info(f"Processed {len(results)} videos ({failed} failed)")
+        return results
+    
+    def _prepare_run(self, video_path: str, duration: Optional[float] = None) -> VideoRun:
+        """Resolve the video URI, duration and segments for a new run"""
+        # Get video duration from the original source; an uploaded file URI cannot be probed
+        if duration is None:
+            duration = self._get_video_duration(video_path)
         
         # Handle different input types (file path or URL)
         if video_path.startswith(('http://', 'https://', 'gs://')):
             video_uri = video_path
             logger.info(f"Using direct video URI: {video_uri}")
+        elif self._uses_clips(video_path):
+            # Clips are cut and uploaded while the run executes; the URI of the whole video is set afterwards
+            video_uri = video_path
         else:
             # Upload local video file
             video_uri = self._upload_video(video_path)
         
-        # Get video duration
-        duration = self._get_video_duration(video_uri)
+        return VideoRun(
+            video_path=video_path,
+            video_uri=video_uri,
+            duration=duration,
+            segments=(self._create_scene_segments(video_path, duration) if self.segmentation == "scenes"
+                      else self._create_video_segments(duration)),
+        )
+    
+    def _execute_run(self, run: VideoRun, on_description: Optional[Callable[[Description], None]] = None):
+        """Run every model call of a video as soon as its inputs are ready and store the results on the run"""
+        video_cache = VideoCache(self.backend, self.model_name, run.video_uri, self.video_cache_ttl) if self.video_cache else None
+        
+        # Segments that look like an earlier one copy its description instead of calling the model
+        signatures = self._segment_signatures(run) if self.segment_index is not None else None
+        duplicates = {}
+        if signatures is not None:
+            sources = find_duplicates(signatures, self.segment_index.max_distance)
+            duplicates = {i: j for i, j in enumerate(sources) if i != j}
+            logger.info(f"{len(duplicates)} of {len(run.segments)} segments duplicate an earlier segment")
+        clips = (ClipSet(self.backend, run.video_path, run.duration, self.clip_mode, self.clip_dir,
+                         max_workers=self.max_concurrency, **self.clip_options)
+                 if self._uses_clips(run.video_path) else None)
+        graph = self._build_task_graph(run.video_uri, run.segments, run.duration, video_cache, duplicates, clips)
         
-        # Create segments
-        segments = self._create_video_segments(duration)
+        video_usage = self._new_usage_tracker()
         
-        # Process each segment for Level-1 descriptions
-        for segment in segments:
-            self.generate_level1_description(video_uri, segment)
-            
-            # Generate Level-2 description every 30 seconds
-            current_time = segment.end_time
-            if (segment.segment_index + 1) * self.level1_interval % self.level2_interval == 0 or current_time >= duration - 1:
-                self.generate_level2_description(video_uri, current_time)
-        
-        # Generate Level-3 description
-        self.generate_level3_description(video_uri, duration)
-        
-        # Compile results
-        results = {
-            "video_path": video_path,
-            "video_uri": video_uri,
-            "duration": duration,
+        def _set_time_range(key: Hashable, description: Description):
+            # Level 1 covers its segment, level 2 the time since the previous summary, level 3 the whole video
+            if key[0] in ("level1", "draft"):
+                segment = run.segments[description.segment_index]
+                description.start, description.end = segment.start_time, min(segment.end_time, run.duration)
+            elif key[0] == "level2":
+                description.start = graph.results[("level2", key[1] - 1)].timestamp if key[1] > 0 else 0.0
+                description.end = description.timestamp
+            else:
+                description.start, description.end = 0.0, run.duration
+        
+        # Tasks finished by an interrupted run are restored from the journal and not called again
+        journal = self._open_journal(run)
+        if journal is not None:
+            for key, description in journal.entries.items():
+                if key in graph:
+                    graph.results[key] = description
+            # Level-2 time ranges need the previous summary, so they are set once every result is restored
+            for key, description in graph.results.items():
+                _set_time_range(key, description)
+                if description.reused_from is None:
+                    video_usage.add(key[0], description.usage)
+                if on_description is not None and key[0] != "draft":
+                    on_description(description)
+        
+        # Every call first checks the video budget; calls already running may overshoot it slightly
+        if self.max_video_tokens is not None or self.max_video_cost is not None:
+            for node in graph.nodes.values():
+                node.fn = self._budgeted(node.fn, video_usage)
+        
+        # Level-1 segments seen in earlier videos (e.g. channel intros) are looked up when their task starts
+        if signatures is not None:
+            for segment in run.segments:
+                i = segment.segment_index
+                for key in (("draft", i), ("level1", i)):
+                    if key in graph and i not in duplicates:
+                        graph.nodes[key].fn = self._indexed(graph.nodes[key].fn, signatures[i], segment)
+        
+        def _on_complete(key: Hashable, description: Description):
+            _set_time_range(key, description)
+            if description.reused_from is None:
+                video_usage.add(key[0], description.usage)
+                self.usage.add(key[0], description.usage)
+                if key[0] == "level1" and signatures is not None:
+                    self.segment_index.add(signatures[description.segment_index], description.content,
+                                           run.video_path, description.segment_index)
+            if journal is not None:
+                journal.record(key, description)
+            # Two-pass drafts are intermediate results, only final descriptions are reported
+            if on_description is not None and key[0] != "draft":
+                on_description(description)
+        
+        logger.info(f"Scheduling {len(graph.nodes) - len(graph.results)} model calls (critical path {graph.critical_path_length()})")
+        # Whole-video calls still to run; fewer than MIN_CACHED_CALLS do not pay for a context cache
+        whole_video_calls = sum(1 for key in graph.nodes if key[0] == "level3" and key not in graph.results)
+        if video_cache is not None and whole_video_calls < MIN_CACHED_CALLS:
+            logger.info(f"{whole_video_calls} whole-video call(s) pending, sending the video inline instead of caching it")
+            video_cache = None
+        try:
+            # The context cache and the clips live only while calls are pending
+            pending = len(graph.results) < len(graph.nodes)
+            with contextlib.ExitStack() as stack:
+                if video_cache is not None and pending:
+                    stack.enter_context(video_cache)
+                if clips is not None:
+                    stack.enter_context(clips)
+                    if pending:
+                        # Cut and upload the level-1 clips in segment order, the whole video last
+                        clips.prefetch((segment.start_time, segment.end_time) for segment in run.segments
+                                       if ("level1", segment.segment_index) not in graph.results
+                                       and segment.segment_index not in duplicates)
+                        clips.prefetch([(0.0, run.duration)])
+                results = graph.run(max_workers=self.max_concurrency, on_complete=_on_complete)
+                if clips is not None and pending:
+                    run.video_uri = clips.full_uri()
+        finally:
+            run.usage = video_usage.totals()
+            if self.segment_index is not None:
+                self.segment_index.save()
+        if journal is not None:
+            journal.remove()
+        
+        run.level1_descriptions = [results[("level1", segment.segment_index)] for segment in run.segments]
+        run.level2_descriptions = [results[key] for key in graph.nodes if key[0] == "level2"]
+        run.level3_description = results[("level3", 0)]
+    
+    def _uses_clips(self, video_path: str) -> bool:
+        """Whether a video is cut into clips locally before upload"""
+        # Stream-copied clips add up to the original, which level-2 and level-3 calls need uploaded anyway
+        if self.clip_mode in (None, "copy") or video_path.startswith(('http://', 'https://', 'gs://')) or not os.path.exists(video_path):
+            return False
+        if not ffmpeg_available():
+            logger.warning("ffmpeg not found, uploading the whole video instead of clips")
+            return False
+        return True
+    
+    def _segment_signatures(self, run: VideoRun):
+        """Perceptual hashes of every segment of a local video, or None if it cannot be decoded"""
+        if run.video_path.startswith(('http://', 'https://', 'gs://')) or not os.path.exists(run.video_path):
+            logger.warning(f"Segment deduplication needs a local file, skipping it for {run.video_path}")
+            return None
+        try:
+            return segment_signatures(run.video_path, run.segments)
+        except Exception as e:
+            logger.warning(f"Cannot hash segments of {run.video_path}, skipping deduplication: {e}")
+            return None
+    
+    def _indexed(self, fn: Callable[[], Description], signature, segment: VideoSegment) -> Callable[[], Description]:
+        """Wrap a level-1 task so it reuses the description of a matching segment from another video"""
+        def _task() -> Description:
+            entry = self.segment_index.find(signature)
+            if entry is None:
+                return fn()
+            return Description(
+                level=1,
+                timestamp=segment.start_time,
+                content=entry["content"],
+                segment_index=segment.segment_index,
+                reused_from=f"{entry['video_path']} segment {entry['segment_index']}",
+            )
+        return _task
+    
+    def _new_usage_tracker(self) -> UsageTracker:
+        return UsageTracker(self.input_price_per_million, self.output_price_per_million)
+    
+    def _budgeted(self, fn: Callable[[], Description], video_usage: UsageTracker) -> Callable[[], Description]:
+        """Wrap a task so it refuses to start once the video budget is used up"""
+        def _task() -> Description:
+            video_usage.check_budget(self.max_video_tokens, self.max_video_cost, scope="video")
+            return fn()
+        return _task
+    
+    def _open_journal(self, run: VideoRun) -> Optional[RunJournal]:
+        """Open the journal of a run, or None if journaling is disabled"""
+        if not self.journal_dir:
+            return None
+        header = {
+            "video_path": run.video_path,
+            "duration": run.duration,
+            "level1_interval": self.level1_interval,
+            "level2_interval": self.level2_interval,
+            "level1_mode": self.level1_mode,
+            "anchor_stride": self.anchor_stride,
+            "model_name": self.model_name,
+        }
+        if self.segmentation != "fixed":
+            # Journal keys are segment indices, which only line up for the same segmentation
+            header.update(segmentation=self.segmentation, segments=[[s.start_time, s.end_time] for s in run.segments])
+        return RunJournal(RunJournal.path_for(self.journal_dir, run.video_path, header), header)
+    
+    def _compile_results(self, run: VideoRun) -> Dict[str, any]:
+        """Build the results dictionary for a finished run"""
+        return {
+            "video_path": run.video_path,
+            "video_uri": run.video_uri,
+            "duration": run.duration,
             "processing_timestamp": datetime.now().isoformat(),
             "level1_interval": self.level1_interval,
             "level2_interval": self.level2_interval,
+            "level1_mode": self.level1_mode,
+            "segmentation": self.segmentation,
             "model_name": self.model_name,
-            "level1_descriptions_count": len(self.level1_descriptions),
-            "level2_descriptions_count": len(self.level2_descriptions),
-            "level3_description_exists": self.level3_description is not None,
+            "level1_descriptions_count": len(run.level1_descriptions),
+            "reused_level1_count": sum(1 for desc in run.level1_descriptions if desc.reused_from is not None),
+            "level2_descriptions_count": len(run.level2_descriptions),
+            "level3_description_exists": run.level3_description is not None,
+            "usage": run.usage,
             "level1_descriptions": [
                 {
                     "timestamp": desc.timestamp,
+                    "start": desc.start,
+                    "end": desc.end,
                     "content": desc.content,
-                    "segment_index": desc.segment_index
+                    "segment_index": desc.segment_index,
+                    **({"reused_from": desc.reused_from} if desc.reused_from is not None else {})
                 }
-                for desc in self.level1_descriptions
+                for desc in run.level1_descriptions
             ],
             "level2_descriptions": [
                 {
                     "timestamp": desc.timestamp,
+                    "start": desc.start,
+                    "end": desc.end,
                     "content": desc.content,
                     "segment_index": desc.segment_index
                 }
-                for desc in self.level2_descriptions
+                for desc in run.level2_descriptions
             ],
             "level3_description": {
-                "timestamp": self.level3_description.timestamp,
-                "content": self.level3_description.content
-            } if self.level3_description else None
+                "timestamp": run.level3_description.timestamp,
+                "content": run.level3_description.content
+            } if run.level3_description else None
         }
-        
-        logger.info("Video processing completed successfully")
-        return results
     
     def save_results(self, results: Dict, output_path: str):
         """Save results to JSON file"""
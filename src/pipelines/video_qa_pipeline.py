@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.entities import Description, VideoRun
+from src.pipelines.jobs import video_id
+from src.pipelines.qa_pipeline import QA_LEVELS, QAPipeline, timed_description
+from src.pipelines.video_description_pipeline import VideoDescriptionPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class VideoQAPipeline:
+    """
+    Description and QA generation for a video in one process, without the JSON file hop.
+
+    Descriptions flow from the description pipeline to QA generation through a bounded
+    in-memory queue. Level-1 QA starts as soon as a batch of consecutive level-1
+    descriptions exists, while later segments are still being described; level-2 and
+    level-3 QA start when their descriptions are complete. A full queue blocks the
+    description stage, so it cannot run arbitrarily far ahead of QA generation.
+    """
+
+    def __init__(self,
+                 description_pipeline: VideoDescriptionPipeline,
+                 qa_pipeline: QAPipeline,
+                 level1_batch_size: int = 6,
+                 max_qa_workers: int = 4,
+                 queue_size: int = 64):
+        """
+        Initialize the fused pipeline
+
+        Args:
+            description_pipeline: Pipeline generating the descriptions
+            qa_pipeline: Pipeline generating QA pairs from them
+            level1_batch_size: Consecutive level-1 descriptions per level-1 QA call
+            max_qa_workers: Number of QA calls running at the same time
+            queue_size: Descriptions buffered between the two stages
+        """
+        if level1_batch_size < 1:
+            raise ValueError("level1_batch_size must be at least 1")
+        self.description_pipeline = description_pipeline
+        self.qa_pipeline = qa_pipeline
+        self.level1_batch_size = level1_batch_size
+        self.max_qa_workers = max_qa_workers
+        self.queue_size = queue_size
+
+    def process_video(self, video_path: str, duration: Optional[float] = None,
+                      output_path: Optional[str] = None) -> Dict[str, any]:
+        """
+        Describe a video and generate its QA pairs
+
+        Args:
+            video_path: Path to the video file or URL
+            duration: Known video duration in seconds (skips the duration probe)
+            output_path: JSON file receiving the combined result once the video is done
+
+        Returns:
+            The description results plus "qa": one {"level", "qa_pairs"} entry per level.
+            The level-1 entry also lists its "batches" ({"start", "end", "segment_indices", "qa_pairs"}).
+        """
+        logger.info(f"Starting fused description and QA generation: {video_path}")
+        run = self.description_pipeline._prepare_run(video_path, duration)
+
+        done = object()
+        descriptions: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        def _describe():
+            try:
+                self.description_pipeline._execute_run(run, on_description=descriptions.put)
+                descriptions.put(done)
+            except BaseException as e:
+                descriptions.put(e)
+
+        producer = threading.Thread(target=_describe, name=f"describe:{video_path}", daemon=True)
+        producer.start()
+        executor = ThreadPoolExecutor(max_workers=self.max_qa_workers, thread_name_prefix="qa")
+        try:
+            batches, level_futures = self._consume(run, descriptions, done, executor)
+            level2_text = self._timed_listing(run, run.level2_descriptions, self._level2_bounds(run))
+            if level2_text:
+                level_futures[2] = executor.submit(self.qa_pipeline.process_single_description, level2_text)
+
+            level1_batches = [{**batch, "qa_pairs": future.result()} for batch, future in batches]
+            qa = [{
+                "level": 1,
+                "qa_pairs": [pair for batch in level1_batches for pair in batch["qa_pairs"]],
+                "batches": level1_batches,
+            }]
+            for level in QA_LEVELS[1:]:
+                future = level_futures.get(level)
+                qa.append({"level": level, "qa_pairs": future.result() if future is not None else []})
+        finally:
+            # Unblock the description stage if QA generation stopped early
+            while producer.is_alive():
+                try:
+                    descriptions.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        results = self.description_pipeline._compile_results(run)
+        results["qa"] = qa
+        results["qa_pairs_count"] = sum(len(entry["qa_pairs"]) for entry in qa)
+        if output_path:
+            self._write_results(results, output_path)
+        logger.info(f"Generated {results['qa_pairs_count']} QA pairs for {video_path}")
+        return results
+
+    def process_videos(self, sources: List[str], output_dir: Optional[str] = None,
+                       max_workers: int = 2,
+                       durations: Optional[List[Optional[float]]] = None) -> List[Dict[str, any]]:
+        """
+        Process several videos concurrently
+
+        Args:
+            sources: Video paths or URLs
+            output_dir: Directory receiving one "<video id>.json" per finished video (see jobs.video_id)
+            max_workers: Number of videos processed at the same time
+            durations: Optional known durations aligned with sources
+
+        Returns:
+            One result per source, in input order. Failed videos produce
+            {"video_path", "error", "error_type"} instead of aborting the batch.
+        """
+        if durations is not None and len(durations) != len(sources):
+            raise ValueError("durations must have the same length as sources")
+        durations = durations or [None] * len(sources)
+
+        def _process(item: Tuple[str, Optional[float]]) -> Dict[str, any]:
+            source, duration = item
+            # Named by video id, not file name, so sources sharing a name do not overwrite each other
+            output_path = str(Path(output_dir) / f"{video_id(source)}.json") if output_dir else None
+            try:
+                return self.process_video(source, duration=duration, output_path=output_path)
+            except Exception as e:
+                logger.error(f"Error processing video {source}: {e}")
+                return {"video_path": source, "error": str(e), "error_type": type(e).__name__}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_process, zip(sources, durations)))
+
+        failed = sum(1 for result in results if "error" in result)
+        logger.info(f"Processed {len(results)} videos ({failed} failed)")
+        return results
+
+    def _consume(self, run: VideoRun, descriptions: queue.Queue, done: object,
+                 executor: ThreadPoolExecutor) -> Tuple[List[Tuple[Dict, Future]], Dict[int, Future]]:
+        """Submit QA calls while descriptions arrive, until the description stage finishes"""
+        level1: Dict[int, Description] = {}
+        batches: List[Tuple[Dict, Future]] = []
+        level_futures: Dict[int, Future] = {}
+        next_index = 0
+
+        while True:
+            item = descriptions.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+
+            if item.level == 1:
+                level1[item.segment_index] = item
+                # Level-1 descriptions complete out of order; batches cover consecutive segments
+                while next_index < len(run.segments):
+                    indices = range(next_index, min(next_index + self.level1_batch_size, len(run.segments)))
+                    if any(i not in level1 for i in indices):
+                        break
+                    batches.append(self._submit_level1_batch(run, [level1[i] for i in indices], executor))
+                    next_index = indices[-1] + 1
+            elif item.level == 3 and item.content:
+                level_futures[3] = executor.submit(self.qa_pipeline.process_single_description, item.content)
+        return batches, level_futures
+
+    def _submit_level1_batch(self, run: VideoRun, batch: List[Description],
+                             executor: ThreadPoolExecutor) -> Tuple[Dict, Future]:
+        segments = [run.segments[description.segment_index] for description in batch]
+        text = self._timed_listing(run, batch, [(segment.start_time, segment.end_time) for segment in segments])
+        logger.info(f"Generating level-1 QA for segments {segments[0].segment_index}-{segments[-1].segment_index}")
+        future = executor.submit(self.qa_pipeline.process_single_description, text)
+        return {
+            "start": segments[0].start_time,
+            "end": segments[-1].end_time,
+            "segment_indices": [segment.segment_index for segment in segments],
+        }, future
+
+    @staticmethod
+    def _level2_bounds(run: VideoRun) -> List[Tuple[float, float]]:
+        # A level-2 summary covers the time since the previous one
+        bounds = []
+        start = 0.0
+        for description in run.level2_descriptions:
+            bounds.append((start, description.timestamp))
+            start = description.timestamp
+        return bounds
+
+    @staticmethod
+    def _timed_listing(run: VideoRun, descriptions: List[Description],
+                       bounds: List[Tuple[float, float]]) -> str:
+        """Descriptions in the format QAPipeline.process_video_analysis uses"""
+        return "".join(f"\n{timed_description(start, min(end, run.duration), description.content)}"
+                       for description, (start, end) in zip(descriptions, bounds))
+
+    @staticmethod
+    def _write_results(results: Dict, output_path: str):
+        """Write the combined results atomically"""
+        path = Path(output_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    description_pipeline = VideoDescriptionPipeline(
+        level1_interval=10,
+        level2_interval=30,
+        model_name=os.environ["MODEL_NAME"],
+        google_api_key=os.environ["GOOGLE_API_KEY"],
+        cache_path=os.environ.get("RESPONSE_CACHE_PATH"),
+        upload_registry_path=os.environ.get("UPLOAD_REGISTRY_PATH"),
+        journal_dir=os.environ.get("JOURNAL_DIR"),
+    )
+    qa_pipeline = QAPipeline(
+        model_name=os.environ["MODEL_NAME"],
+        google_api_key=os.environ["GOOGLE_API_KEY"],
+        cache_path=os.environ.get("RESPONSE_CACHE_PATH"),
+    )
+    pipeline = VideoQAPipeline(description_pipeline, qa_pipeline)
+
+    output_path = Path(__file__).parents[2] / "youtube_video_qa.json"
+    results = pipeline.process_video("https://www.youtube.com/shorts/-LcVzSYBDD8", output_path=str(output_path))
+    print(f"Generated {results['qa_pairs_count']} QA pairs, saved to {output_path}")
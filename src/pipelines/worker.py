@@ -0,0 +1,264 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.pipelines.jobs import STAGES, Job, JobQueue, read_manifest
+from src.pipelines.qa_dedupe import QADeduplicator
+from src.pipelines.qa_pipeline import QAPipeline
+from src.pipelines.search import SearchIndex
+from src.pipelines.usage import BudgetExceededError
+from src.pipelines.video_description_pipeline import VideoDescriptionPipeline
+
+logger = logging.getLogger(__name__)
+
+# Failures that another attempt would repeat: a missing input file or a used-up budget
+PERMANENT_ERRORS = (FileNotFoundError, BudgetExceededError)
+
+
+class LeaseLostError(RuntimeError):
+    """Raised inside a stage once its job's lease was lost, so the stage stops calling the model"""
+
+
+class JobWorker:
+    """
+    Worker that takes videos from a JobQueue and runs them through every stage.
+
+    Each stage writes one JSON file under ``<output_dir>/<video_id>/`` atomically, and a
+    stage whose file already exists is not run again. A video whose worker crashed is
+    therefore resumed by the next worker at the first missing output. Within the
+    describe stage, a journal_dir and a response cache on the description pipeline
+    also keep the finished model calls of an interrupted run.
+    """
+
+    def __init__(self,
+                 queue: JobQueue,
+                 description_pipeline: VideoDescriptionPipeline,
+                 qa_pipeline: QAPipeline,
+                 output_dir: str,
+                 worker_id: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None,
+                 poll_interval: float = 10.0,
+                 search_index: Optional[SearchIndex] = None,
+                 qa_deduplicator: Optional[QADeduplicator] = None,
+                 qa_dedupe_mode: str = "flag"):
+        """
+        Initialize the worker
+
+        Args:
+            queue: Queue to take jobs from
+            description_pipeline: Pipeline of the describe stage
+            qa_pipeline: Pipeline of the qa stage
+            output_dir: Directory receiving the stage outputs of every video
+            worker_id: Identifier recorded on leases (host, pid and a random suffix if None)
+            heartbeat_interval: Seconds between lease renewals (a third of the lease if None)
+            poll_interval: Seconds to wait before asking again when the queue is empty
+            search_index: Full-text index updated with each video as soon as its QA pairs exist
+            qa_deduplicator: Near-duplicate detection applied to the QA pairs of each video
+            qa_dedupe_mode: "flag" marks near-duplicate pairs with "duplicate_of", "drop" removes them
+        """
+        self.queue = queue
+        self.description_pipeline = description_pipeline
+        self.qa_pipeline = qa_pipeline
+        self.output_dir = Path(output_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval or queue.lease_seconds / 3
+        self.poll_interval = poll_interval
+        self.search_index = search_index
+        self.qa_deduplicator = qa_deduplicator
+        self.qa_dedupe_mode = qa_dedupe_mode
+
+    def run(self, max_jobs: Optional[int] = None, wait: bool = False) -> int:
+        """
+        Process jobs until the queue is empty
+
+        Args:
+            max_jobs: Stop after this many jobs
+            wait: Keep polling an empty queue instead of returning (other workers may re-queue jobs)
+
+        Returns:
+            Number of jobs processed, finished or not
+        """
+        processed = 0
+        try:
+            while max_jobs is None or processed < max_jobs:
+                job = self.queue.lease(self.worker_id)
+                if job is None:
+                    if not wait:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                self.process(job)
+                processed += 1
+        finally:
+            if self.qa_deduplicator is not None:
+                self.qa_deduplicator.save()
+        logger.info(f"Worker {self.worker_id} processed {processed} jobs")
+        return processed
+
+    def process(self, job: Job) -> bool:
+        """
+        Run the remaining stages of a leased job, renewing its lease meanwhile
+
+        Returns:
+            True if every stage finished
+        """
+        logger.info(f"Processing {job.source} from stage {job.stage} (attempt {job.attempts})")
+        stop = threading.Event()
+        # Set when another worker may own the job; the running stage stops at its next description
+        lost = threading.Event()
+
+        def _heartbeat():
+            while not stop.wait(self.heartbeat_interval):
+                if not self.queue.heartbeat(job):
+                    logger.warning(f"Lost the lease on {job.source}")
+                    lost.set()
+                    return
+
+        heartbeat = threading.Thread(target=_heartbeat, name=f"heartbeat:{job.video_id}", daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                stage = job.stage
+                output = self._run_stage(job, lost)
+                if lost.is_set() or not self.queue.complete_stage(job, output):
+                    return False
+                if stage == STAGES[-1]:
+                    return True
+        except LeaseLostError:
+            logger.warning(f"Stopped stage {job.stage} of {job.source}: its lease was lost")
+            return False
+        except KeyboardInterrupt:
+            self.queue.release(job)
+            raise
+        except Exception as e:
+            state = self.queue.fail(job, f"{type(e).__name__}: {e}", retry=not isinstance(e, PERMANENT_ERRORS))
+            logger.error(f"Stage {job.stage} of {job.source} failed ({state}): {e}")
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def output_path(self, job: Job, stage: str) -> Path:
+        return self.output_dir / job.video_id / f"{stage}.json"
+
+    def _run_stage(self, job: Job, lost: Optional[threading.Event] = None) -> str:
+        """Run the job's current stage unless its output exists, and return the output path"""
+        def _check_lease(*_):
+            if lost is not None and lost.is_set():
+                raise LeaseLostError(f"Lost the lease on {job.source}")
+
+        _check_lease()
+        path = self.output_path(job, job.stage)
+        if path.exists():
+            logger.info(f"Reusing {job.stage} output {path}")
+            if job.stage == "ingest":
+                job.duration = self._read(path)["duration"]
+            elif job.stage == "qa":
+                self._index(job, self._read(path))
+            return str(path)
+
+        if job.stage == "ingest":
+            if job.duration is None:
+                job.duration = self.description_pipeline._get_video_duration(job.source)
+            result = {"source": job.source, "duration": job.duration}
+        elif job.stage == "describe":
+            result = self.description_pipeline.process_video(job.source, duration=job.duration,
+                                                             on_description=_check_lease)
+        else:
+            video_analysis = self._read(self.output_path(job, "describe"))
+            qa = self.qa_pipeline.process_video_analysis_all_levels(video_analysis)
+            _check_lease()
+            # Never mark a video done without QA pairs; the failure is retried and recorded instead
+            if not any(entry["qa_pairs"] for entry in qa):
+                raise RuntimeError("QA stage produced no QA pairs")
+            if self.qa_deduplicator is not None:
+                qa = self.qa_deduplicator.deduplicate_qa(qa, job.video_id, mode=self.qa_dedupe_mode)
+            result = {"source": job.source, "qa": qa}
+        self._write(path, result)
+        if job.stage == "qa":
+            self._index(job, result)
+        return str(path)
+
+    def _index(self, job: Job, qa_result: Dict[str, Any]):
+        # Re-indexing replaces the video's records, so a repeated stage leaves no duplicates
+        if self.search_index is not None:
+            self.search_index.add_video(self._read(self.output_path(job, "describe")), qa_result["qa"], job.video_id)
+
+    @staticmethod
+    def _read(path: Path) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write(path: Path, result: Dict[str, Any]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset-scale job queue")
+    parser.add_argument("--queue", default="jobs.sqlite", help="SQLite file of the job queue")
+    parser.add_argument("--lease-seconds", type=float, default=600.0)
+    parser.add_argument("--max-attempts", type=int, default=3)
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="Queue the videos of a manifest")
+    enqueue.add_argument("manifest", help="Text file with one source per line, or JSONL with source/duration")
+    work = commands.add_parser("work", help="Process queued videos")
+    work.add_argument("--output-dir", default="outputs")
+    work.add_argument("--max-jobs", type=int)
+    work.add_argument("--wait", action="store_true", help="Keep polling when the queue is empty")
+    work.add_argument("--search-index", help="SQLite full-text index updated as each video finishes")
+    work.add_argument("--qa-dedupe-store", help="Signature store enabling near-duplicate QA detection")
+    work.add_argument("--qa-dedupe-threshold", type=float, default=0.8)
+    work.add_argument("--qa-dedupe-mode", choices=("flag", "drop"), default="flag")
+    commands.add_parser("status", help="Print job counts and failures")
+    commands.add_parser("retry-failed", help="Re-queue failed jobs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    queue = JobQueue(args.queue, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    if args.command == "enqueue":
+        print(f"Queued {queue.enqueue(read_manifest(args.manifest))} new videos")
+    elif args.command == "status":
+        print(json.dumps({**queue.stats(), "failures": queue.failures()}, indent=2))
+    elif args.command == "retry-failed":
+        print(f"Re-queued {queue.retry_failed()} failed videos")
+    else:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        description_pipeline = VideoDescriptionPipeline(
+            level1_interval=10,
+            level2_interval=30,
+            model_name=os.environ["MODEL_NAME"],
+            google_api_key=os.environ["GOOGLE_API_KEY"],
+            cache_path=os.environ.get("RESPONSE_CACHE_PATH"),
+            upload_registry_path=os.environ.get("UPLOAD_REGISTRY_PATH"),
+            journal_dir=os.environ.get("JOURNAL_DIR", str(Path(args.output_dir) / "journals")),
+        )
+        qa_pipeline = QAPipeline(
+            model_name=os.environ["MODEL_NAME"],
+            google_api_key=os.environ["GOOGLE_API_KEY"],
+            cache_path=os.environ.get("RESPONSE_CACHE_PATH"),
+        )
+        search_index = SearchIndex(args.search_index) if args.search_index else None
+        qa_deduplicator = (QADeduplicator(threshold=args.qa_dedupe_threshold, store_path=args.qa_dedupe_store)
+                           if args.qa_dedupe_store else None)
+        worker = JobWorker(queue, description_pipeline, qa_pipeline, args.output_dir, search_index=search_index,
+                           qa_deduplicator=qa_deduplicator, qa_dedupe_mode=args.qa_dedupe_mode)
+        worker.run(max_jobs=args.max_jobs, wait=args.wait)
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from typing import List, Optional, Tuple
+
+from src.backends.base import CHARS_PER_TOKEN, estimate_text_tokens
+
+# Marks where fit_text cut a text (with the space separating it from the excerpt)
+_ELISION = " [...]"
+
+
+def fit_text(text: str, max_tokens: int, keep: str = "tail") -> str:
+    """
+    Shorten text to roughly max_tokens, cutting at a word boundary
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token allowance
+        keep: "tail" keeps the end of the text (latest developments), "head" keeps the start
+
+    Returns:
+        The text itself if it fits, otherwise an elided excerpt whose elision marker
+        is counted in max_tokens (empty if not even the marker fits)
+    """
+    if estimate_text_tokens(text) <= max_tokens:
+        return text
+    chars = max_tokens * CHARS_PER_TOKEN - len(_ELISION)
+    if chars <= 0:
+        return ""
+    if keep == "head":
+        excerpt = text[:chars].rsplit(" ", 1)[0]
+        return f"{excerpt}{_ELISION}"
+    excerpt = text[-chars:].split(" ", 1)[-1]
+    return f"{_ELISION.strip()} {excerpt}"
+
+
+class ContextBudget:
+    """
+    Token allowance shared by the context sections of one prompt.
+
+    Sections are taken in priority order; each takes what it needs from the
+    remaining allowance and is elided when it does not fit. A budget of None
+    leaves every section untouched.
+    """
+
+    def __init__(self, max_tokens: Optional[int]):
+        self.max_tokens = max_tokens
+        self.remaining = max_tokens
+
+    def take(self, text: str, keep: str = "tail") -> str:
+        """Fit one section into the remaining allowance"""
+        if self.remaining is not None:
+            text = fit_text(text, self.remaining, keep=keep)
+            self.remaining -= estimate_text_tokens(text)
+        return text
+
+    def take_entries(self, entries: List[str]) -> Tuple[List[str], int]:
+        """
+        Fit a chronological list of entries, keeping the most recent ones
+
+        Returns:
+            The kept entries in their original order and the number of older entries omitted
+        """
+        kept: List[str] = []
+        for entry in reversed(entries):
+            if self.remaining is not None and estimate_text_tokens(entry) > self.remaining:
+                # Always show at least the most recent entry, shortened if needed
+                if not kept and self.remaining > 0:
+                    kept.append(self.take(entry, keep="head"))
+                break
+            kept.append(self.take(entry))
+        kept.reverse()
+        return kept, len(entries) - len(kept)
@@ -1,5 +1,6 @@
 from typing import Dict, List, Optional
 from src.entities import VideoSegment, Description
+from src.prompts.context import ContextBudget
 
 class PromptFactory:
     """
@@ -7,16 +8,21 @@ class PromptFactory:
     - Level 1: Detailed events for specific segments
     - Level 2: Plot summaries at regular intervals
     - Level 3: Complete overview of the entire video
+    
+    Every prompt accepts an optional context_budget: the number of (estimated) tokens its
+    context sections may use. Sections are filled in priority order - the most recent
+    description first, then summaries - and older entries are elided when they do not fit.
     """
     
     @staticmethod
-    def create_level1_prompt(segment: VideoSegment, context: Dict) -> str:
+    def create_level1_prompt(segment: VideoSegment, context: Dict, context_budget: Optional[int] = None) -> str:
         """
         Create prompt for level-1 description (detailed events)
         
         Args:
             segment: VideoSegment to analyze
             context: Dictionary containing previous descriptions context
+            context_budget: Maximum tokens for the context sections (unbounded if None)
             
         Returns:
             Formatted prompt string
@@ -39,11 +45,55 @@ Structure your response as a flowing narrative that captures both the literal ev
 
 """
         
-        if context.get("previous_level1"):
-            prompt += f"Previous segment description: {context['previous_level1']}\n\n"
+        budget = ContextBudget(context_budget)
+        previous_level1 = budget.take(context["previous_level1"]) if context.get("previous_level1") else None
+        anchor_level1 = budget.take(context["anchor_level1"]) if context.get("anchor_level1") else None
+        latest_level2 = budget.take(context["latest_level2"]) if context.get("latest_level2") else None
+        
+        if previous_level1:
+            prompt += f"Previous segment description: {previous_level1}\n\n"
+        
+        if anchor_level1:
+            prompt += f"Reference description of the segment at {context['anchor_timestamp']:.1f}s: {anchor_level1}\n\n"
+        
+        if latest_level2:
+            prompt += f"Overall plot summary so far: {latest_level2}\n\n"
+        
+        prompt += "Describe what happens in the current segment in 3-5 sentences:"
+        
+        return prompt
+    
+    @staticmethod
+    def create_level1_refine_prompt(segment: VideoSegment, context: Dict, context_budget: Optional[int] = None) -> str:
+        """
+        Create prompt for refining a draft level-1 description using neighbouring drafts
+        
+        Args:
+            segment: VideoSegment to analyze
+            context: Dictionary with "current_draft" and optional "previous_draft" / "next_draft"
+            context_budget: Maximum tokens for the drafts (unbounded if None)
+            
+        Returns:
+            Formatted prompt string
+        """
+        prompt = f"""Refine the draft description of the video segment from {segment.start_time:.1f}s to {segment.end_time:.1f}s.
+Watch the segment again, correct anything the draft got wrong, and keep it consistent with the neighbouring segments:
+refer to characters, objects and ongoing actions the same way, and make transitions between segments explicit.
+
+"""
+        
+        budget = ContextBudget(context_budget)
+        current_draft = budget.take(context["current_draft"], keep="head")
+        previous_draft = budget.take(context["previous_draft"]) if context.get("previous_draft") else None
+        next_draft = budget.take(context["next_draft"], keep="head") if context.get("next_draft") else None
+        
+        if previous_draft:
+            prompt += f"Draft of the previous segment: {previous_draft}\n\n"
         
-        if context.get("latest_level2"):
-            prompt += f"Overall plot summary so far: {context['latest_level2']}\n\n"
+        prompt += f"Draft of the current segment: {current_draft}\n\n"
+        
+        if next_draft:
+            prompt += f"Draft of the next segment: {next_draft}\n\n"
         
         prompt += "Describe what happens in the current segment in 3-5 sentences:"
         
@@ -52,7 +102,8 @@ Structure your response as a flowing narrative that captures both the literal ev
     @staticmethod
     def create_level2_prompt(recent_level1: List[Description], 
                            latest_level2: Optional[Description], 
-                           current_time: float) -> str:
+                           current_time: float,
+                           context_budget: Optional[int] = None) -> str:
         """
         Create prompt for level-2 description (plot summary)
         
@@ -60,18 +111,26 @@ Structure your response as a flowing narrative that captures both the literal ev
             recent_level1: Recent level-1 descriptions
             latest_level2: Latest level-2 description if available
             current_time: Current timestamp in the video
+            context_budget: Maximum tokens for the events and previous summary (unbounded if None)
             
         Returns:
             Formatted prompt string
         """
         prompt = f"You are creating a plot summary for a video up to {current_time:.1f} seconds.\n\n"
         
-        if latest_level2:
-            prompt += f"Previous plot summary: {latest_level2.content}\n\n"
+        # New events take priority, the previous summary gets what is left
+        budget = ContextBudget(context_budget)
+        events, omitted = budget.take_entries([f"- At {desc.timestamp:.1f}s: {desc.content}\n" for desc in recent_level1])
+        previous_summary = budget.take(latest_level2.content) if latest_level2 else None
+        
+        if previous_summary:
+            prompt += f"Previous plot summary: {previous_summary}\n\n"
         
         prompt += "Recent events:\n"
-        for desc in recent_level1:
-            prompt += f"- At {desc.timestamp:.1f}s: {desc.content}\n"
+        if omitted:
+            prompt += f"- ({omitted} earlier events omitted)\n"
+        for event in events:
+            prompt += event
         
         prompt += "\nProvide an updated plot summary that incorporates these recent events. Keep it concise but comprehensive (5-7 sentences):"
         
@@ -80,7 +139,8 @@ Structure your response as a flowing narrative that captures both the literal ev
     @staticmethod
     def create_level3_prompt(unsummarized_level1: List[Description], 
                            latest_level2: Optional[Description], 
-                           total_duration: float) -> str:
+                           total_duration: float,
+                           context_budget: Optional[int] = None) -> str:
         """
         Create prompt for level-3 description (complete overview)
         
@@ -88,6 +148,7 @@ Structure your response as a flowing narrative that captures both the literal ev
             unsummarized_level1: Level-1 descriptions not yet summarized
             latest_level2: Latest level-2 description if available
             total_duration: Total duration of the video
+            context_budget: Maximum tokens for the summary and final events (unbounded if None)
             
         Returns:
             Formatted prompt string
@@ -103,13 +164,20 @@ Please analyze the entire video and provide a comprehensive description that cap
 
 """
         
-        if latest_level2:
-            prompt += f"Main plot summary from earlier analysis: {latest_level2.content}\n\n"
+        # The plot summary covers most of the video, so it takes priority over the final events
+        budget = ContextBudget(context_budget)
+        main_summary = budget.take(latest_level2.content) if latest_level2 else None
+        events, omitted = budget.take_entries([f"- At {desc.timestamp:.1f}s: {desc.content}\n" for desc in unsummarized_level1])
+        
+        if main_summary:
+            prompt += f"Main plot summary from earlier analysis: {main_summary}\n\n"
         
         if unsummarized_level1:
             prompt += "Final events not yet summarized:\n"
-            for desc in unsummarized_level1:
-                prompt += f"- At {desc.timestamp:.1f}s: {desc.content}\n"
+            if omitted:
+                prompt += f"- ({omitted} earlier events omitted)\n"
+            for event in events:
+                prompt += event
             prompt += "\n"
         
         prompt += "\nProvide a comprehensive description of the entire video that would serve as a standalone summary (7-10 sentences):"
@@ -0,0 +1,42 @@
+from src.pipelines.qa_dedupe import QADeduplicator
+
+BASE = ("What colour is the car parked next to the red brick building at the start of the video? "
+        "The car is a dark green hatchback with a roof rack.")
+
+
+def test_bucket_collision_below_threshold():
+    deduplicator = QADeduplicator(threshold=0.8)
+    words = BASE.split()
+    words[0], words[11] = "xyz", "qqq"
+    variant = " ".join(words)
+    # The two texts share an LSH bucket but their signatures are not similar enough
+    signatures = deduplicator.signatures([BASE, variant])
+    keys = deduplicator._band_keys(signatures)
+    assert (keys[0] == keys[1]).any()
+    assert (signatures[0] == signatures[1]).mean() < deduplicator.threshold
+
+    assert deduplicator.find([BASE, variant], ["a", "b"]) == [None, None]
+    assert len(deduplicator) == 2
+
+
+def test_near_duplicates_are_flagged():
+    deduplicator = QADeduplicator(threshold=0.8)
+    assert deduplicator.find([BASE, BASE + "!"], ["a", "b"]) == [None, "a"]
+    assert deduplicator.find([BASE.upper()], ["c"]) == ["a"]
+
+
+def test_index_grows_across_calls_and_reloads(tmp_path):
+    deduplicator = QADeduplicator(threshold=0.8, store_path=tmp_path)
+    texts = [f"Question {i}: what happens after event {i * 7919 % 1000}?" for i in range(400)]
+    ids = [str(i) for i in range(len(texts))]
+    for start in range(0, len(texts), 50):
+        deduplicator.find(texts[start:start + 50], ids[start:start + 50])
+    deduplicator.save()
+    assert len(deduplicator) > 1
+
+    reloaded = QADeduplicator(threshold=0.8, store_path=tmp_path)
+    assert reloaded.ids == deduplicator.ids
+    for band in range(deduplicator.bands):
+        assert (reloaded._sorted[band][0] == deduplicator._sorted[band][0]).all()
+        assert (reloaded._sorted[band][1] == deduplicator._sorted[band][1]).all()
+    assert reloaded.find([BASE], ["new"], add=False) == deduplicator.find([BASE], ["new"], add=False)